@@ -1369,6 +1369,7 @@ from flaml import AutoML
 
 from app.utils.llm_clients import llm_generate_json
 from app.utils.run_logger import agent_log
+from app.storage import artifact_path, register_artifact
 
 
 # -----------------------------------------
@@ -1427,12 +1428,33 @@ Return ONLY clean JSON:
 """
 
     try:
-        result = llm_generate_json(prompt)
+        result = llm_generate_json(prompt, site="model_plan")
         return result or {}
     except:
         return {}
 
 
+def suggest_model_plan(run_id: str, ps: dict, dataset_path: str):
+    """
+    _ask_llm_plan from the raw dataset instead of the preprocessed npz, so the LLM
+    call can run while preprocessing is still going. Uses the same target column
+    as prep_agent (the last one).
+    """
+    try:
+        import pandas as pd
+        try:
+            head = pd.read_csv(dataset_path, nrows=10, encoding="utf-8", engine="python")
+        except Exception:
+            head = pd.read_csv(dataset_path, nrows=10, encoding="ISO-8859-1", engine="python")
+        labels = head.iloc[:, -1].tolist()
+    except Exception as e:
+        agent_log(run_id, f"[automl_agent] Could not read labels for model plan: {e}", agent="automl_agent")
+        labels = []
+    plan = _ask_llm_plan(ps, None, labels)
+    agent_log(run_id, f"[automl_agent] LLM plan: {plan}", agent="automl_agent")
+    return plan
+
+
 # -----------------------------------------
 # SANITIZE LLM MODELS
 # -----------------------------------------
@@ -1467,7 +1489,7 @@ def _sanitize_candidate_models(models, task):
 # -----------------------------------------
 # MAIN AUTO ML
 # -----------------------------------------
-def run_automl(run_id: str, train_npz_path: str, ps: dict, preferences: dict):
+def run_automl(run_id: str, train_npz_path: str, ps: dict, preferences: dict, llm_plan: dict = None, n_jobs: int = None):
     agent_log(run_id, f"[automl_agent] Loading train file: {train_npz_path}",
               agent="automl_agent")
 
@@ -1495,10 +1517,11 @@ def run_automl(run_id: str, train_npz_path: str, ps: dict, preferences: dict):
     # ---------------------------
     # TASK TYPE: from LLM or PS agent
     # ---------------------------
-    try:
-        llm_plan = _ask_llm_plan(ps, X_train, y_train)
-    except:
-        llm_plan = {}
+    if llm_plan is None:
+        try:
+            llm_plan = _ask_llm_plan(ps, X_train, y_train)
+        except:
+            llm_plan = {}
 
     task_type = llm_plan.get("task_type") or ps.get("task_type")
     if task_type not in ["classification", "regression"]:
@@ -1554,8 +1577,8 @@ def run_automl(run_id: str, train_npz_path: str, ps: dict, preferences: dict):
         "metric": metric,
         "task": task_type,
         "estimator_list": est_list,
-        "log_file_name": f"artifacts/{run_id}_flaml.log",
-        "n_jobs": -1,  # Use all CPU cores for faster training
+        "log_file_name": artifact_path(run_id, "flaml.log"),
+        "n_jobs": n_jobs or -1,  # core budget from the scheduler (-1 = all cores)
         "eval_method": "cv",  # Use cross-validation for better model selection
         "n_splits": 3,  # 3-fold cross-validation
         "early_stop": True,  # Enable early stopping
@@ -1589,13 +1612,16 @@ def run_automl(run_id: str, train_npz_path: str, ps: dict, preferences: dict):
     # ---------------------------
     # SAVE MODEL
     # ---------------------------
-    model_path = f"artifacts/{run_id}_best_model.pkl"
+    model_path = artifact_path(run_id, "best_model.pkl")
     try:
         joblib.dump(automl.model, model_path)
         agent_log(run_id, f"[automl_agent] Model saved to {model_path}", agent="automl_agent")
     except Exception as e:
         agent_log(run_id, f"[automl_agent] Failed to save automl.model, trying to save entire automl object: {e}", agent="automl_agent")
         joblib.dump(automl, model_path)
+    register_artifact(run_id, model_path)
+    if os.path.exists(settings["log_file_name"]):
+        register_artifact(run_id, settings["log_file_name"], kind="log")
 
     # ---------------------------
     # LEADERBOARD & TRAINED MODELS
@@ -12,6 +12,7 @@ Priority order:
 
 import os
 import json
+import shutil
 import requests
 import pandas as pd
 import numpy as np
@@ -21,6 +22,7 @@ from urllib.parse import urljoin
 
 from app.utils.run_logger import agent_log
 from app.utils.llm_clients import llm_generate_json
+from app.storage import dedupe_file, save_dataset_csv
 
 # Data directory
 DATA_DIR = os.environ.get("DATA_DIR", "data")
@@ -59,7 +61,7 @@ Make queries specific and relevant to the problem domain.
 """
     
     try:
-        result = llm_generate_json(prompt, max_tokens=256)
+        result = llm_generate_json(prompt, max_tokens=256, site="search_queries")
         if result and "queries" in result:
             queries = result["queries"][:5]
             agent_log(run_id, f"[data_agent] LLM generated queries: {queries}", agent="data_agent")
@@ -176,6 +178,9 @@ def _download_kaggle_dataset(run_id: str, dataset_ref: str) -> Optional[str]:
         api.authenticate()
         
         out_dir = os.path.join(DATA_DIR, f"{run_id}_kaggle_{dataset_ref.replace('/', '_')}")
+        # files of an earlier download are hardlinks shared with other runs (dedupe_file
+        # below): unzipping over them would rewrite every copy
+        shutil.rmtree(out_dir, ignore_errors=True)
         os.makedirs(out_dir, exist_ok=True)
         
         agent_log(run_id, f"[data_agent] 📥 Downloading Kaggle dataset: {dataset_ref}", agent="data_agent")
@@ -187,6 +192,11 @@ def _download_kaggle_dataset(run_id: str, dataset_ref: str) -> Optional[str]:
             agent_log(run_id, f"[data_agent] Download error: {download_error}", agent="data_agent", level="ERROR")
             return None
         
+        # Runs downloading the same dataset share one copy of each file (and its inode)
+        for f in Path(out_dir).glob("**/*"):
+            if f.is_file():
+                dedupe_file(str(f))
+        
         # Find CSV files
         csv_files = list(Path(out_dir).glob("**/*.csv"))
         
@@ -289,7 +299,7 @@ def _download_huggingface_dataset(run_id: str, dataset_id: str, max_rows: int =
         # Save to CSV
         safe_name = dataset_id.replace("/", "_").replace(":", "_")
         csv_path = os.path.join(DATA_DIR, f"{run_id}_hf_{safe_name}.csv")
-        df.to_csv(csv_path, index=False)
+        save_dataset_csv(df, csv_path)
         
         agent_log(run_id, f"[data_agent] HuggingFace dataset saved: {csv_path} ({len(df)} rows, {len(df.columns)} columns)", agent="data_agent")
         return csv_path
@@ -359,7 +369,7 @@ def _download_uci_dataset(run_id: str, dataset_url: str, dataset_name: str) -> O
         # Try to parse as CSV
         from io import StringIO
         df = pd.read_csv(StringIO(response.text), header=None)
-        df.to_csv(csv_path, index=False)
+        save_dataset_csv(df, csv_path)
         
         agent_log(run_id, f"[data_agent] UCI dataset saved: {csv_path} ({len(df)} rows)", agent="data_agent")
         return csv_path
@@ -408,7 +418,7 @@ Include 5-10 relevant features for the problem.
 """
     
     try:
-        schema = llm_generate_json(prompt, max_tokens=512)
+        schema = llm_generate_json(prompt, max_tokens=512, site="synthetic_schema")
         if not schema or "columns" not in schema:
             raise ValueError("Invalid schema from LLM")
     except Exception as e:
@@ -457,7 +467,7 @@ Include 5-10 relevant features for the problem.
     
     # Save to CSV
     csv_path = os.path.join(DATA_DIR, f"{run_id}_synthetic.csv")
-    df.to_csv(csv_path, index=False)
+    save_dataset_csv(df, csv_path)
     
     agent_log(run_id, f"[data_agent] Synthetic dataset generated: {csv_path} ({len(df)} rows, {len(df.columns)} columns)", agent="data_agent")
     return csv_path
@@ -509,7 +519,17 @@ def _validate_dataset(run_id: str, csv_path: str, min_rows: int = 50, min_cols:
 # ===============================
 # MAIN ORCHESTRATION FUNCTION
 # ===============================
-def get_or_find_dataset(run_id: str, ps: Dict, user: Dict) -> Dict:
+def plan_dataset_search(run_id: str, ps: Dict, user: Dict) -> List[str]:
+    """
+    Search queries for get_or_find_dataset, as a separate pipeline stage so the
+    LLM call is not hidden inside the download step. Empty if the user uploaded a file.
+    """
+    if user and user.get("upload_path") and os.path.exists(user["upload_path"]):
+        return []
+    return _generate_search_queries(run_id, ps)
+
+
+def get_or_find_dataset(run_id: str, ps: Dict, user: Dict, queries: Optional[List[str]] = None) -> Dict:
     """
     Main entry point for data acquisition.
     
@@ -524,6 +544,7 @@ def get_or_find_dataset(run_id: str, ps: Dict, user: Dict) -> Dict:
         run_id: Unique run identifier
         ps: Problem statement dict
         user: User payload dict (may contain upload_path)
+        queries: Search queries from plan_dataset_search (generated here if not given)
     
     Returns:
         Dict with dataset_path, source, and source_name
@@ -568,8 +589,9 @@ def get_or_find_dataset(run_id: str, ps: Dict, user: Dict) -> Dict:
         else:
             agent_log(run_id, f"[data_agent] User file not found: {upload_path}", agent="data_agent", level="ERROR")
     
-    # Generate search queries
-    queries = _generate_search_queries(run_id, ps)
+    # Generate search queries (unless the pipeline already did)
+    if not queries:
+        queries = _generate_search_queries(run_id, ps)
     agent_log(run_id, f"[data_agent] Search queries: {queries}", agent="data_agent")
     
     # Add well-known public datasets as fallback based on task type
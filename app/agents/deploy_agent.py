@@ -55,6 +55,7 @@
 import os, json
 from app.utils.llm_clients import llm_generate_json
 from app.utils.run_logger import agent_log
+from app.storage import artifact_path, register_artifact
 
 ARTIFACT_DIR = "artifacts"
 os.makedirs(ARTIFACT_DIR, exist_ok=True)
@@ -380,9 +381,10 @@ curl -X POST http://localhost:8080/predict \\
     
     saved_paths = {}
     for filename, content in files.items():
-        path = os.path.join(ARTIFACT_DIR, filename)
+        path = artifact_path(run_id, filename[len(run_id) + 1:])
         with open(path, "w", encoding="utf-8") as f:
             f.write(content)
+        register_artifact(run_id, path)
         saved_paths[filename] = path
         agent_log(run_id, f"[deploy_agent] Generated {filename}", agent="deploy_agent")
     
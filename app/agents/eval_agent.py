@@ -301,7 +301,8 @@
 
 
 # app/agents/eval_agent.py
-import os, json, traceback
+import json, traceback
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
 import joblib
@@ -311,15 +312,14 @@ from sklearn.calibration import calibration_curve
 from sklearn.model_selection import learning_curve
 from app.utils.llm_clients import llm_generate_json
 from app.utils.run_logger import agent_log
-
-ARTIFACT_DIR="artifacts"
-os.makedirs(ARTIFACT_DIR, exist_ok=True)
+from app.storage import artifact_path, register_artifact
 
 def _safe_save_fig(run_id, fig_name):
-    path = os.path.join(ARTIFACT_DIR, f"{run_id}_{fig_name}.png")
+    path = artifact_path(run_id, f"{fig_name}.png")
     plt.tight_layout()
     plt.savefig(path)
     plt.close()
+    register_artifact(run_id, path)
     return path
 
 def _get_model_scores(model, X):
@@ -340,6 +340,16 @@ def _get_model_scores(model, X):
         pass
     return None, False, False
 
+def _model_card(metrics, ps):
+    prompt = f"""
+You are an ML evaluator. Given metrics: {json.dumps(metrics)},
+problem: {ps.get('raw_text') or ps},
+return ONLY JSON:
+{{ "model_name": "", "metrics": {{}}, "strengths": [], "weaknesses": [], "recommended_use":"", "limitations": [], "next_steps": [] }}
+"""
+    return llm_generate_json(prompt, site="model_card") or {}
+
+
 def evaluate_model(run_id, test_npz_path, model_path, transformer_path, ps):
     agent_log(run_id, f"[eval_agent] loading test {test_npz_path} model {model_path}", agent="eval_agent")
     try:
@@ -392,13 +402,18 @@ def evaluate_model(run_id, test_npz_path, model_path, transformer_path, ps):
                     pass
     except Exception:
         pass
+    # the model card only needs the metrics: ask the LLM while predictions and plots are written
+    card_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-card")
+    card_future = card_pool.submit(_model_card, metrics, ps)
+    card_pool.shutdown(wait=False)
     # Save predictions
     try:
         pred_df = pd.DataFrame({"y_true": y_test, "y_pred": y_pred})
         if scores is not None and (not hasattr(scores, "ndim") or scores.ndim==1):
             pred_df["score"] = list(scores)
-        pred_path = os.path.join(ARTIFACT_DIR, f"{run_id}_predictions.csv")
+        pred_path = artifact_path(run_id, "predictions.csv")
         pred_df.to_csv(pred_path, index=False)
+        register_artifact(run_id, pred_path)
     except Exception:
         pred_path = None
     # minimal plots
@@ -413,13 +428,7 @@ def evaluate_model(run_id, test_npz_path, model_path, transformer_path, ps):
         pass
     # LLM model card
     try:
-        prompt = f"""
-You are an ML evaluator. Given metrics: {json.dumps(metrics)},
-problem: {ps.get('raw_text') or ps},
-return ONLY JSON:
-{{ "model_name": "", "metrics": {{}}, "strengths": [], "weaknesses": [], "recommended_use":"", "limitations": [], "next_steps": [] }}
-"""
-        card = llm_generate_json(prompt) or {}
+        card = card_future.result()
     except Exception:
         card = None
     if not card:
@@ -436,9 +445,10 @@ return ONLY JSON:
         "plots": plots, 
         "predictions": pred_path
     }
-    eval_path = os.path.join(ARTIFACT_DIR, f"{run_id}_evaluation.json")
+    eval_path = artifact_path(run_id, "evaluation.json")
     with open(eval_path, "w", encoding="utf-8") as f:
         json.dump(eval_record, f, indent=2, default=str)
+    register_artifact(run_id, eval_path)
     
     agent_log(run_id, f"[eval_agent] Evaluation complete - Best Model: {model_name}", agent="eval_agent")
     
@@ -1127,6 +1127,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OrdinalEncoder
 from sklearn.impute import SimpleImputer
 from app.utils.run_logger import agent_log
+from app.storage import artifact_path, register_artifact
 
 
 # ---------------------------------------
@@ -1218,14 +1219,16 @@ def preprocess_dataset(run_id: str, dataset_path: str, ps: dict):
     )
 
     # Save artifacts
-    train_path = f"artifacts/{run_id}_train.npz"
-    test_path = f"artifacts/{run_id}_test.npz"
-    transformer_path = f"artifacts/{run_id}_transformer.joblib"
+    train_path = artifact_path(run_id, "train.npz")
+    test_path = artifact_path(run_id, "test.npz")
+    transformer_path = artifact_path(run_id, "transformer.joblib")
 
     np.savez_compressed(train_path, X=X_train, y=y_train)
     np.savez_compressed(test_path, X=X_test, y=y_test)
 
     joblib.dump({"imputer": imputer}, transformer_path)
+    for path in (train_path, test_path, transformer_path):
+        register_artifact(run_id, path)
 
     agent_log(
         run_id,
@@ -413,7 +413,7 @@ def parse_problem_or_generate(run_id: str, problem_statement: str, preferences:
         agent_log(run_id, "[ps_agent] No PS provided → generating options", agent="ps_agent")
 
         prompt = _prompt_generate_options(hint, preferences)
-        j = llm_generate_json(prompt)
+        j = llm_generate_json(prompt, site="ps_options")
 
         if j and isinstance(j, dict) and "options" in j:
             agent_log(run_id, "[ps_agent] Generated options via LLM", agent="ps_agent")
@@ -453,7 +453,7 @@ def parse_problem_or_generate(run_id: str, problem_statement: str, preferences:
     agent_log(run_id, "[ps_agent] Parsing user problem statement via LLM", agent="ps_agent")
 
     prompt = _prompt_parse_ps(problem_statement, preferences, hint)
-    parsed = llm_generate_json(prompt)
+    parsed = llm_generate_json(prompt, site="ps_parse")
 
     if parsed and isinstance(parsed, dict):
         # ensure minimum fields
@@ -148,6 +148,7 @@ import numpy as np
 import pandas as pd
 from pathlib import Path
 from faker import Faker
+from app.storage import save_dataset_csv
 fake = Faker()
 Path("data").mkdir(exist_ok=True)
 
@@ -171,5 +172,4 @@ def synthesize_dataset(run_id, schema_hint):
             data[name] = [fake.word() for _ in range(rows)]
     df = pd.DataFrame(data)
     path = f"data/{run_id}_synthetic.csv"
-    df.to_csv(path, index=False)
-    return path
+    return save_dataset_csv(df, path)
@@ -0,0 +1,267 @@
+# app/artifact_http.py
+"""
+HTTP responses for artifact downloads (GET/HEAD /artifacts/{fname}).
+
+- Content-Type from the artifact manifest (or the file extension).
+- ETag / Last-Modified validators and conditional GET (If-None-Match,
+  If-Modified-Since -> 304), so a dashboard re-fetching an unchanged artifact
+  costs one round trip and no body.
+- Single byte ranges (Range / If-Range -> 206, 416 when unsatisfiable), so
+  large downloads can be resumed.
+- gzip (or zstd when the optional `zstandard` package is installed) for text
+  artifacts. Finished artifacts are compressed once into ARTIFACT_DIR/.encoded
+  and served from there afterwards; logs, which keep growing, are compressed
+  on the fly.
+"""
+import os
+import gzip
+import zlib
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+
+from app.artifact_store import encoded_paths
+
+ARTIFACT_COMPRESS_MIN_BYTES = int(os.getenv("ARTIFACT_COMPRESS_MIN_BYTES", "1024"))
+CHUNK_SIZE = 256 * 1024
+
+_TEXT_TYPES = {"application/json", "application/xml", "application/javascript", "application/x-sh", "image/svg+xml"}
+_EXTRA_TYPES = {
+    ".npz": "application/octet-stream",
+    ".pkl": "application/octet-stream",
+    ".joblib": "application/octet-stream",
+    ".jsonl": "application/x-ndjson",
+    ".log": "text/plain",
+    ".yaml": "application/yaml",
+    ".md": "text/markdown",
+}
+
+
+def content_type_for(fname: str, record: Optional[Dict] = None) -> str:
+    if record and record.get("content_type"):
+        return record["content_type"]
+    ext = os.path.splitext(fname)[1].lower()
+    return _EXTRA_TYPES.get(ext) or mimetypes.guess_type(fname)[0] or "application/octet-stream"
+
+
+def is_compressible(content_type: str) -> bool:
+    base = content_type.split(";")[0].strip()
+    return base.startswith("text/") or base in _TEXT_TYPES or base.endswith(("+json", "ndjson", "yaml", "csv"))
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def _accepted_encodings(header: Optional[str]) -> Dict[str, float]:
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = _accepted_encodings(accept_encoding)
+    if accepted.get("zstd", 0) > 0 and _zstd() is not None:
+        return "zstd"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _etag(stat: os.stat_result, record: Optional[Dict]) -> str:
+    # strong validator from the manifest checksum when it describes this file
+    if record and record.get("sha256") and record.get("size") == stat.st_size:
+        return f'"{record["sha256"][:32]}"'
+    return f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    weak = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        # our encoded variants carry a suffix inside the quotes
+        if candidate == weak or candidate.replace("-gzip\"", "\"").replace("-zstd\"", "\"") == weak:
+            return True
+    return False
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return _etag_matches(inm, etag)
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    (start, end) inclusive for a single `bytes=` range. Returns None when the
+    header should be ignored (other units, several ranges, malformed) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = (part.strip() for part in spec.partition("-"))
+    if not sep or not (first or last) or not (first.isdigit() or not first) or not (last.isdigit() or not last):
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("range not satisfiable")
+        return max(0, size - length), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
+
+def _if_range_ok(request: Request, etag: str, mtime: float) -> bool:
+    value = request.headers.get("if-range")
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith(('"', "W/")):
+        # weak validators never match for If-Range
+        return not etag.startswith("W/") and value == etag
+    try:
+        return int(mtime) <= parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def _read_file(path: str, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _compress_stream(path: str, encoding: str) -> Iterator[bytes]:
+    if encoding == "zstd":
+        compressor = _zstd().ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in _read_file(path):
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def cached_encoding(path: str, encoding: str, stat: os.stat_result) -> Optional[str]:
+    """Path of the compressed copy of `path`, building it if missing or older than the file."""
+    gz, zst = encoded_paths(path)
+    target = zst if encoding == "zstd" else gz
+    try:
+        if os.stat(target).st_mtime_ns >= stat.st_mtime_ns:
+            return target
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp = f"{target}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as out:
+            if encoding == "zstd":
+                with _zstd().ZstdCompressor(level=10).stream_writer(out, closefd=False) as writer:
+                    for chunk in _read_file(path):
+                        writer.write(chunk)
+            else:
+                with gzip.GzipFile(filename="", mode="wb", fileobj=out, compresslevel=9, mtime=0) as writer:
+                    for chunk in _read_file(path):
+                        writer.write(chunk)
+        os.replace(tmp, target)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    return target
+
+
+def artifact_response(request: Request, path: str, fname: str, record: Optional[Dict] = None) -> Response:
+    """The response for one artifact file, honouring conditional, range and encoding headers."""
+    stat = os.stat(path)
+    size = stat.st_size
+    content_type = content_type_for(fname, record)
+    etag = _etag(stat, record)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f'attachment; filename="{fname}"',
+    }
+    compressible = is_compressible(content_type) and size >= ARTIFACT_COMPRESS_MIN_BYTES
+    if compressible:
+        headers["Vary"] = "Accept-Encoding"
+    head = request.method == "HEAD"
+
+    if _not_modified(request, etag, stat.st_mtime):
+        headers["ETag"] = etag
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if range_header and _if_range_ok(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers.update({"ETag": etag, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+            body = iter(()) if head else _read_file(path, start, end - start + 1)
+            return StreamingResponse(body, status_code=206, media_type=content_type, headers=headers)
+
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if compressible else None
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = etag[:-1] + f'-{encoding}"'
+        is_log = (record or {}).get("kind") == "log" or fname.endswith("_log.txt")
+        encoded = None if is_log else cached_encoding(path, encoding, stat)
+        if encoded is not None:
+            headers["Content-Length"] = str(os.path.getsize(encoded))
+            body = iter(()) if head else _read_file(encoded)
+        else:
+            body = iter(()) if head else _compress_stream(path, encoding)
+        return StreamingResponse(body, media_type=content_type, headers=headers)
+
+    headers.update({"ETag": etag, "Content-Length": str(size)})
+    body = iter(()) if head else _read_file(path)
+    return StreamingResponse(body, media_type=content_type, headers=headers)
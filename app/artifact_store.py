@@ -0,0 +1,335 @@
+# app/artifact_store.py
+"""
+Artifact store backends.
+
+Agents keep working with local file paths (FLAML, joblib and numpy write to
+paths, and stage results carry paths). An ArtifactStore decides where a run's
+artifact is written (path_for) and takes it over once written (put):
+
+  LocalCASStore  - content-addressed: every file is hashed and linked to a blob
+                   under <root>/.blobs/<sha[:2]>/<sha>. The run's file
+                   (<root>/<run_id>_<name>) is a hardlink to that blob, so runs
+                   producing byte-identical files (the same dataset's train/test
+                   split, the same CSV) share one copy on disk. A blob's link
+                   count is its reference count.
+  S3ArtifactStore - the local CAS as a cache, plus every blob uploaded once to an
+                   S3-compatible bucket (AWS, MinIO, ...), from where missing
+                   local files are restored.
+
+The per-run name -> blob mapping is the run store's artifact manifest
+(run_id, name, path, sha256, ...).
+
+Files in the store may be shared with other runs: never write into an existing
+artifact path in place. path_for() unlinks the old file before handing the
+path out, and blobs are read-only.
+"""
+import os
+import abc
+import time
+import hashlib
+import mimetypes
+import threading
+from typing import Any, Dict, List, Optional
+
+from app.run_store import (
+    artifact_blob_refs,
+    delete_artifact_records,
+    find_artifact_by_path,
+    list_run_artifacts,
+    record_artifact,
+)
+
+ARTIFACT_STORE = os.getenv("ARTIFACT_STORE", "local").lower()
+ARTIFACT_S3_BUCKET = os.getenv("ARTIFACT_S3_BUCKET", "")
+ARTIFACT_S3_PREFIX = os.getenv("ARTIFACT_S3_PREFIX", "automl-artifacts/")
+ARTIFACT_S3_ENDPOINT_URL = os.getenv("ARTIFACT_S3_ENDPOINT_URL") or None
+
+_KIND_BY_EXT = {
+    ".pkl": "model", ".joblib": "model", ".onnx": "model",
+    ".npz": "data", ".csv": "data", ".parquet": "data",
+    ".png": "plot", ".jpg": "plot", ".svg": "plot",
+    ".json": "report", ".md": "report", ".html": "report",
+    ".log": "log",
+}
+
+
+def artifact_kind(fname: str) -> str:
+    if fname.endswith("_log.txt") or fname.endswith("_events.jsonl"):
+        return "log"
+    return _KIND_BY_EXT.get(os.path.splitext(fname)[1].lower(), "other")
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactStore(abc.ABC):
+    """Interface of an artifact backend. Paths handed out are always local."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, run_id: str, name: str) -> str:
+        """
+        Local path to write artifact `name` of `run_id` to. Any previous file there
+        (possibly a link shared with other runs) and its compressed copies are unlinked.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, f"{run_id}_{name}")
+        for old in [path] + encoded_paths(path):
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+        return path
+
+    def put(self, run_id: str, path: str, kind: Optional[str] = None) -> Dict[str, Any]:
+        """Take over a file written for `run_id` and record it in the manifest."""
+        fname = os.path.basename(path)
+        kind = kind or artifact_kind(fname)
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        sha = None
+        # logs keep growing: recorded, but neither hashed nor shared
+        if size is not None and kind != "log":
+            sha = file_sha256(path)
+            self.store_blob(path, sha)
+        content_type = mimetypes.guess_type(fname)[0] or ("text/plain" if kind == "log" else "application/octet-stream")
+        record_artifact(run_id, fname, path, size, sha, content_type, kind)
+        return {"name": fname, "path": path, "size": size, "sha256": sha, "content_type": content_type, "kind": kind}
+
+    def put_bytes(self, run_id: str, name: str, data: bytes, kind: Optional[str] = None) -> Dict[str, Any]:
+        path = self.path_for(run_id, name)
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return self.put(run_id, path, kind)
+
+    def dedupe(self, path: str) -> Optional[str]:
+        """Share storage for a file that is not a run artifact (e.g. a dataset). Returns its sha256."""
+        sha = file_sha256(path)
+        self.store_blob(path, sha)
+        return sha
+
+    def fetch(self, path: str) -> bool:
+        """Make sure an artifact file exists locally; remote backends restore it. True if it does."""
+        return os.path.exists(path)
+
+    def list(self, run_id: str) -> List[Dict[str, Any]]:
+        return list_run_artifacts(run_id)
+
+    def delete_run(self, run_id: str, names: Optional[List[str]] = None) -> int:
+        """Remove a run's artifact files (all, or `names`) and their manifest rows. Blobs are left to gc()."""
+        removed = 0
+        for artifact in self.list(run_id):
+            if names is not None and artifact["name"] not in names:
+                continue
+            for path in [artifact["path"]] + encoded_paths(artifact["path"]):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error deleting {path}: {e}")
+        delete_artifact_records(run_id, names)
+        return removed
+
+    @abc.abstractmethod
+    def store_blob(self, path: str, sha: str):
+        """Keep the content of `path` (hash `sha`) as a blob; `path` may become a link to it."""
+
+    @abc.abstractmethod
+    def gc(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Remove blobs nothing refers to any more."""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "root": self.root}
+
+
+def encoded_paths(path: str) -> List[str]:
+    """Cached compressed copies of an artifact, kept next to it in .encoded (see app.artifact_http)."""
+    base = os.path.join(os.path.dirname(path), ".encoded", os.path.basename(path))
+    return [base + ".gz", base + ".zst"]
+
+
+class LocalCASStore(ArtifactStore):
+    """Content-addressed local store: one blob per distinct content, run files are hardlinks to it."""
+
+    def __init__(self, root: str):
+        super().__init__(root)
+        self.blob_root = os.path.join(root, ".blobs")
+        self.linked = 0
+        self.bytes_saved = 0
+
+    def blob_path(self, sha: str) -> str:
+        return os.path.join(self.blob_root, sha[:2], sha)
+
+    def store_blob(self, path: str, sha: str):
+        blob = self.blob_path(sha)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        try:
+            # first copy of this content: the blob becomes another name for the file
+            os.link(path, blob)
+            os.chmod(blob, 0o444)
+            return
+        except FileExistsError:
+            pass
+        except OSError:
+            # no hardlinks here (other filesystem, unsupported): keep the file as it is
+            return
+        st = os.stat(path)
+        if os.stat(blob).st_ino == st.st_ino:
+            return
+        # the content is already stored: replace the file by a link to the blob
+        tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.link"
+        try:
+            os.link(blob, tmp)
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.linked += 1
+        self.bytes_saved += st.st_size
+
+    def gc(self, dry_run: bool = False) -> Dict[str, Any]:
+        removed, freed = 0, 0
+        if not os.path.isdir(self.blob_root):
+            return {"blobs_removed": 0, "bytes_freed": 0}
+        for shard in os.scandir(self.blob_root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if "." in entry.name:
+                    # a download or link still in progress
+                    continue
+                st = entry.stat()
+                # only the blob's own name is left
+                if st.st_nlink <= 1:
+                    removed += 1
+                    freed += st.st_size
+                    if not dry_run:
+                        os.remove(entry.path)
+        return {"blobs_removed": removed, "bytes_freed": freed}
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), files_linked=self.linked, bytes_saved=self.bytes_saved)
+
+
+class S3ArtifactStore(LocalCASStore):
+    """
+    Local CAS cache plus one object per blob in an S3-compatible bucket, under
+    <prefix>blobs/<sha256>. Works with any boto3-compatible client (AWS S3, MinIO).
+    """
+
+    def __init__(self, root: str, bucket: str, prefix: str = ARTIFACT_S3_PREFIX, client: Any = None, endpoint_url: Optional[str] = ARTIFACT_S3_ENDPOINT_URL):
+        super().__init__(root)
+        if not bucket:
+            raise ValueError("ARTIFACT_S3_BUCKET must be set for ARTIFACT_STORE=s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.endpoint_url = endpoint_url
+        self._client = client
+        self._uploaded: set = set()
+        self.uploads = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("s3", endpoint_url=self.endpoint_url)
+        return self._client
+
+    def key(self, sha: str) -> str:
+        return f"{self.prefix}blobs/{sha}"
+
+    def _exists(self, sha: str) -> bool:
+        if sha in self._uploaded:
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(sha))
+        except Exception as e:
+            # botocore ClientError; anything but "not found" is a real failure
+            code = str((getattr(e, "response", None) or {}).get("Error", {}).get("Code", ""))
+            if code in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        self._uploaded.add(sha)
+        return True
+
+    def store_blob(self, path: str, sha: str):
+        super().store_blob(path, sha)
+        if not self._exists(sha):
+            self.client.upload_file(path, self.bucket, self.key(sha))
+            self._uploaded.add(sha)
+            self.uploads += 1
+
+    def dedupe(self, path: str) -> Optional[str]:
+        # files outside the manifest are only shared locally, never uploaded
+        sha = file_sha256(path)
+        LocalCASStore.store_blob(self, path, sha)
+        return sha
+
+    def fetch(self, path: str) -> bool:
+        if os.path.exists(path):
+            return True
+        record = find_artifact_by_path(path)
+        if not record or not record.get("sha256"):
+            return False
+        blob = self.blob_path(record["sha256"])
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{os.getpid()}-{threading.get_ident()}.part"
+            try:
+                self.client.download_file(self.bucket, self.key(record["sha256"]), tmp)
+            except Exception as e:
+                print(f"Error restoring {path} from s3://{self.bucket}/{self.key(record['sha256'])}: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return False
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, blob)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            os.link(blob, path)
+        except FileExistsError:
+            pass
+        return True
+
+    def gc(self, dry_run: bool = False) -> Dict[str, Any]:
+        """Local blobs without links, plus bucket objects no manifest row refers to."""
+        result = super().gc(dry_run)
+        referenced = artifact_blob_refs()
+        removed, freed = 0, 0
+        paginator = self.client.get_paginator("list_objects_v2")
+        cutoff = time.time() - 3600
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=f"{self.prefix}blobs/"):
+            for obj in page.get("Contents", []):
+                sha = obj["Key"].rsplit("/", 1)[-1]
+                modified = obj.get("LastModified")
+                # leave objects of uploads still being recorded alone
+                if sha in referenced or (modified is not None and modified.timestamp() > cutoff):
+                    continue
+                removed += 1
+                freed += obj.get("Size", 0)
+                if not dry_run:
+                    self.client.delete_object(Bucket=self.bucket, Key=obj["Key"])
+                    self._uploaded.discard(sha)
+        result.update(remote_blobs_removed=removed, remote_bytes_freed=freed)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(super().stats(), bucket=self.bucket, prefix=self.prefix, uploads=self.uploads)
+
+
+def make_artifact_store(root: str, backend: str = ARTIFACT_STORE) -> ArtifactStore:
+    if backend == "local":
+        return LocalCASStore(root)
+    if backend == "s3":
+        return S3ArtifactStore(root, ARTIFACT_S3_BUCKET)
+    raise ValueError(f"Unknown ARTIFACT_STORE {backend!r}; expected 'local' or 's3'")
@@ -0,0 +1,102 @@
+# app/checkpoints.py
+"""
+Stage checkpoints for orchestrate_run.
+
+When a stage finishes, its result (small and JSON-able: agents return artifact
+paths, not data) is recorded under state["checkpoints"][stage] as an ordinary
+state patch. A retried or reclaimed run reuses every checkpoint that is present
+and whose output files still exist. When a stage has to run again, the
+checkpoints of all stages downstream of it are dropped first, since they were
+built from the old output.
+"""
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.run_store import update_run_state
+from app.storage import get_artifact_store
+from app.utils.run_logger import agent_log, log_event
+
+STAGES = ("ps_agent", "search_queries", "data_agent", "model_plan", "prep_agent", "automl_agent", "eval_agent")
+
+
+def _required_files(stage: str, result: Any) -> List[Optional[str]]:
+    """Files a stage's checkpoint is useless without."""
+    if not isinstance(result, dict):
+        return []
+    if stage == "data_agent":
+        return [result.get("dataset_path")]
+    if stage == "prep_agent":
+        return [result.get("train_path"), result.get("test_path"), result.get("transformer_path")]
+    if stage == "automl_agent":
+        return [result.get("model_path")]
+    return []
+
+
+class StageCheckpoints:
+    """Checkpoints of one run, loaded from its state at the start of orchestrate_run."""
+
+    def __init__(
+        self,
+        run_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        guard: Optional[Callable[[], None]] = None,
+        downstream: Optional[Callable[[str], List[str]]] = None,
+    ):
+        self.run_id = run_id
+        self.saved = dict((state or {}).get("checkpoints") or {})
+        # called before every state write, e.g. LeaseHeartbeat.check
+        self.guard = guard
+        # stages invalidated when a stage re-runs (Pipeline.downstream); default: all later STAGES
+        self.downstream = downstream or (lambda stage: list(STAGES[STAGES.index(stage) + 1:]) if stage in STAGES else [])
+        self._lock = threading.Lock()
+
+    def _write(self, patch: Dict[str, Any]):
+        if self.guard:
+            self.guard()
+        update_run_state(self.run_id, "running", {"checkpoints": patch})
+
+    def _invalidate(self, stage: str):
+        with self._lock:
+            stale = [s for s in [stage] + self.downstream(stage) if self.saved.get(s)]
+            for s in stale:
+                self.saved.pop(s, None)
+        if stale:
+            self._write({s: None for s in stale})
+
+    def load(self, stage: str) -> Any:
+        """The saved result of `stage` if it can be reused, else None."""
+        with self._lock:
+            cp = self.saved.get(stage)
+        if not isinstance(cp, dict) or cp.get("result") is None:
+            self._invalidate(stage)
+            return None
+        # fetch() restores files the artifact store still has (e.g. from S3)
+        store = get_artifact_store()
+        missing = [p for p in _required_files(stage, cp["result"]) if not p or not store.fetch(p)]
+        if missing:
+            agent_log(self.run_id, f"Checkpoint for {stage} is stale (missing {missing}); re-running it", agent="orchestrator")
+            self._invalidate(stage)
+            return None
+        log_event(self.run_id, "stage_reused", stage=stage,
+                  message=f"Resuming: reusing {stage} checkpoint from {cp.get('ts')}", checkpoint_ts=cp.get("ts"))
+        return cp["result"]
+
+    def save(self, stage: str, result: Any):
+        cp = {"result": result, "ts": time.time()}
+        with self._lock:
+            self.saved[stage] = cp
+        self._write({stage: cp})
+
+    def run(self, stage: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Return the checkpointed result of `stage`, or call fn(*args, **kwargs) and checkpoint it."""
+        result = self.load(stage)
+        if result is not None:
+            return result
+        result = fn(*args, **kwargs)
+        self.save(stage, result)
+        return result
+
+    def completed(self) -> List[str]:
+        with self._lock:
+            return [s for s in self.saved if self.saved.get(s)]
@@ -192,10 +192,36 @@ async function startRun(){
 }
 
 let poller;
+let source;
 function pollStart(id){
   if(poller) clearInterval(poller);
+  if(source) source.close();
   updateStatus(id);
-  poller = setInterval(()=> updateStatus(id), 2500);
+  if(!window.EventSource){
+    poller = setInterval(()=> updateStatus(id), 2500);
+    return;
+  }
+  // push updates: state patches and new log lines; the browser resumes via Last-Event-ID
+  let logLines = null;
+  source = new EventSource(`/runs/${id}/events?logs_from=end`);
+  source.addEventListener("state", ev=>{
+    const e = JSON.parse(ev.data);
+    document.getElementById("status").innerText = e.status;
+    if(e.patch && e.patch.phase) document.getElementById("phase").innerText = e.patch.phase;
+    if(e.patch && e.patch.error) document.getElementById("lasterr").innerText = e.patch.error;
+  });
+  source.addEventListener("log", ev=>{
+    const e = JSON.parse(ev.data);
+    const logEl = document.getElementById("log");
+    if(logLines === null) logLines = (logEl.innerText === "-" ? "" : logEl.innerText).split("\n").filter(l=>l);
+    e.lines.forEach(l=> logLines.push(e.agent === "orchestrator" ? l : `[${e.agent}] ${l}`));
+    logLines = logLines.slice(-200);
+    logEl.innerText = logLines.join("\n");
+  });
+  source.addEventListener("end", ()=>{
+    source.close();
+    updateStatus(id);
+  });
 }
 
 async function updateStatus(id){
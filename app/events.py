@@ -0,0 +1,73 @@
+# app/events.py
+"""
+In-process notifications for run event streams.
+
+update_run_state() and agent_log() call notify(run_id) after writing. SSE
+handlers (see /runs/{run_id}/events) wait on an asyncio.Event per subscriber
+and then read what is new from the run store and log files, using their own
+cursors. Notifications are only a wake-up hint: writes from other processes
+(stage worker processes, other API workers) are picked up by the handler's
+periodic re-check.
+"""
+import asyncio
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+
+class RunEventBus:
+    """Wakes the async subscribers of a run when something is written for it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def notify(self, run_id: str):
+        with self._lock:
+            waiters = list(self._waiters.get(run_id, ()))
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # the subscriber's loop has closed
+                pass
+
+    @contextmanager
+    def subscribe(self, run_id: str) -> Iterator[asyncio.Event]:
+        """Register an asyncio.Event (on the running loop) that is set on every notify(run_id)."""
+        key = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(run_id, set()).add(key)
+        try:
+            yield key[1]
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(run_id)
+                if waiters is not None:
+                    waiters.discard(key)
+                    if not waiters:
+                        del self._waiters[run_id]
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(w) for w in self._waiters.values())
+
+
+event_bus = RunEventBus()
+
+# called synchronously with the run id whenever this process writes a run's state
+_state_listeners: List[Callable[[str], None]] = []
+
+
+def on_state_change(callback: Callable[[str], None]):
+    """Register `callback(run_id)` for state writes (not log output), e.g. to invalidate caches."""
+    _state_listeners.append(callback)
+
+
+def notify(run_id: str, state_changed: bool = False):
+    """Signal that run `run_id` has new state or log output. Cheap when nobody listens."""
+    if run_id:
+        if state_changed:
+            for callback in _state_listeners:
+                callback(run_id)
+        event_bus.notify(run_id)
@@ -0,0 +1,115 @@
+# app/executors.py
+"""
+Execution backends for CPU-heavy pipeline stages.
+
+orchestrate_run itself always runs on the orchestrator's thread pool. Stages that
+hold the GIL for long stretches (pandas preprocessing, FLAML training, evaluation)
+are sent through run_stage(), which runs them according to EXECUTION_BACKEND:
+
+  thread   - inline on the calling orchestrator thread (default, previous behaviour)
+  process  - in a pool of worker processes started via forkserver where available
+  spawn    - in a pool of freshly spawned interpreters (safest, slowest start-up)
+
+Stage functions must be module-level and take/return only small picklable values:
+the agents exchange artifact paths, never arrays or models.
+
+A stage may be given a core budget (cores=...). In worker processes the BLAS/OpenMP
+pools are capped to that budget for the duration of the stage; in thread mode the
+cap is process-wide and set once at startup (see app.scheduler).
+"""
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from app.utils.run_logger import agent_log, flush_logs
+from app.scheduler import CORES_PER_RUN, limit_native_threads
+from app.retry import TransientStageError
+
+EXECUTION_BACKENDS = ("thread", "process", "spawn")
+EXECUTION_BACKEND = os.getenv("EXECUTION_BACKEND", "thread").lower()
+STAGE_WORKERS = int(os.getenv("STAGE_WORKERS", os.getenv("THREAD_POOL_SIZE", "2")))
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context(backend: str):
+    if backend == "spawn":
+        return multiprocessing.get_context("spawn")
+    # forking a multi-threaded server is unsafe; forkserver forks from a clean helper
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+def get_stage_executor() -> Optional[Executor]:
+    """
+    The shared process pool for the configured backend, created on first use.
+    Returns None for the in-thread backend.
+    """
+    global _pool
+    if EXECUTION_BACKEND not in EXECUTION_BACKENDS:
+        raise ValueError(f"Unknown EXECUTION_BACKEND {EXECUTION_BACKEND!r}; expected one of {EXECUTION_BACKENDS}")
+    if EXECUTION_BACKEND == "thread":
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=STAGE_WORKERS,
+                mp_context=_mp_context(EXECUTION_BACKEND),
+                initializer=limit_native_threads,
+                initargs=(CORES_PER_RUN,),
+            )
+        return _pool
+
+
+def _reset_pool(pool: Executor):
+    """Drop `pool` after a worker died in it; a no-op if another stage already replaced it."""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            # shutting down the replacement would cancel other runs' stages
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _call_with_cores(fn: Callable[..., Any], cores: Optional[int], args, kwargs) -> Any:
+    """Worker-process entry point: run `fn` with native thread pools capped to `cores`."""
+    limiter = limit_native_threads(cores) if cores else None
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # worker processes never run atexit hooks: hand back the stage's log lines now
+        flush_logs()
+        if limiter is not None:
+            limiter.restore_original_limits()
+
+
+def run_stage(fn: Callable[..., Any], *args, cores: Optional[int] = None, **kwargs) -> Any:
+    """
+    Run one pipeline stage on the configured backend and return its result.
+    Blocks the calling orchestrator thread (not the GIL) while a worker process runs it.
+    """
+    pool = get_stage_executor()
+    if pool is None:
+        return fn(*args, **kwargs)
+    try:
+        return pool.submit(_call_with_cores, fn, cores, args, kwargs).result()
+    except BrokenProcessPool as e:
+        # a worker died (e.g. OOM-killed); start a fresh pool for the next stage
+        run_id = args[0] if args and isinstance(args[0], str) else "system"
+        agent_log(run_id, f"Stage worker process died in {getattr(fn, '__name__', fn)}: {e}", agent="orchestrator", level="ERROR")
+        _reset_pool(pool)
+        raise TransientStageError(f"stage worker process died: {e}") from e
+
+
+def shutdown_stage_executor(wait: bool = True):
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait, cancel_futures=True)
@@ -736,52 +736,107 @@ load_dotenv()
 import os
 import uuid
 import json
-import sqlite3
 import time
+import asyncio
 import threading
 import traceback
+import socket
 from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, Optional
 
-from fastapi import FastAPI, HTTPException, Body
+from fastapi import FastAPI, HTTPException, Body, Header, Query, Request
 from pydantic import BaseModel
-from fastapi.responses import HTMLResponse, FileResponse
-
-from app.storage import ensure_dirs, save_artifact
-from app.utils.run_logger import agent_log
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from app.artifact_http import artifact_response
+from app.storage import ensure_dirs, get_artifact_store, list_artifact_details, migrate_flat_artifacts, save_artifact
+from app.run_store import (
+    init_db,
+    write_run_db,
+    update_run_state,
+    read_run,
+    read_run_events,
+    read_run_status,
+    fetch_claimable_runs,
+    claim_run,
+    renew_lease,
+    requeue_run,
+    defer_run,
+    release_worker_runs,
+    find_artifact,
+    query_events,
+    stage_stats,
+    set_run_pinned,
+    list_runs as list_runs_db,
+    RUN_LIST_FIELDS,
+    close_all as close_run_store,
+)
+from app.utils.run_logger import (
+    RUN_LOG_AGENTS,
+    agent_log,
+    get_log_since,
+    log_event,
+    log_writer,
+    read_log_from,
+    shutdown_logging,
+    tail_file,
+)
+from app.events import event_bus
+from app.checkpoints import StageCheckpoints
+from app.status_cache import status_cache
+from app.utils.hf_worker import HF_PRELOAD, hf_worker
+from app.utils.llm_async import llm_loop
+from app.utils.llm_cache import llm_cache
+from app.utils.llm_policy import llm_policy
+from app.pipeline import Pipeline, Stage
+from app.retry import RETRY_INLINE_MAX_DELAY, RetryLater, RetryTracker
+from app.retention import RETENTION_INTERVAL, retention_loop, retention_status, run_retention
+from app.executors import EXECUTION_BACKEND, run_stage, shutdown_stage_executor
+from app.scheduler import DEFAULT_PRIORITY, CoreScheduler, FairShareQueue, limit_native_threads, run_priority
 
 from app.agents.ps_agent import parse_problem_or_generate
-from app.agents.data_agent import get_or_find_dataset
+from app.agents.data_agent import get_or_find_dataset, plan_dataset_search
 from app.agents.prep_agent import preprocess_dataset
-from app.agents.automl_agent import run_automl
+from app.agents.automl_agent import run_automl, suggest_model_plan
 from app.agents.eval_agent import evaluate_model
 
 from app.dashboard_html import DASHBOARD_HTML
 
 ensure_dirs()
 
-DB = os.getenv("DB_PATH", "runs.db")
 ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
 os.makedirs(ARTIFACT_DIR, exist_ok=True)
 
-executor = ThreadPoolExecutor(max_workers=int(os.getenv("THREAD_POOL_SIZE", "2")))
-MAX_STEP_RETRIES = 1
-STEP_RETRY_BACKOFF = 2
-
-
-def init_db():
-    conn = sqlite3.connect(DB)
-    conn.execute(
-        """CREATE TABLE IF NOT EXISTS runs (
-            run_id TEXT PRIMARY KEY,
-            created_at REAL,
-            status TEXT,
-            last_error TEXT,
-            state_json TEXT
-        )"""
-    )
-    conn.commit()
-    conn.close()
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", "2"))
+executor = ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE)
+# Free executor slots. A run is only claimed when a slot is available, so a claimed
+# run never sits in the executor's backlog while its lease runs out.
+run_slots = threading.BoundedSemaphore(THREAD_POOL_SIZE)
+# Core budgets for admitted runs; runs wait in 'queued' until cores are free
+core_scheduler = CoreScheduler()
+if EXECUTION_BACKEND == "thread":
+    # stages share this process, so the BLAS cap is process-wide (one run's budget)
+    limit_native_threads(core_scheduler.cores_per_run)
+# In-process queue of run_ids ordered by priority class and per-user fair share.
+# SQLite remains the durable source of truth (priority and user_key are stored
+# on the run), so the queue can be rebuilt by recover_queued_runs().
+run_queue = FairShareQueue(
+    concurrency=max(1, min(THREAD_POOL_SIZE, core_scheduler.total_cores // core_scheduler.cores_per_run))
+)
+
+# Lease-based run ownership so several API/worker processes can share one runs.db
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+RUN_LEASE_SECONDS = float(os.getenv("RUN_LEASE_SECONDS", "60"))
+# Periodic scan for queued / lease-expired runs submitted to other processes.
+# 0 disables it (single process: the in-process queue sees every run).
+RUN_SWEEP_INTERVAL = float(os.getenv("RUN_SWEEP_INTERVAL", "0"))
+# Event streams are woken by every write in this process; as a fallback for
+# writes from other processes (which do not notify this one) they re-check the
+# DB and log files this often
+SSE_RECHECK_SECONDS = float(os.getenv("SSE_RECHECK_SECONDS", "15"))
+SSE_KEEPALIVE_SECONDS = 15
 
 
 init_db()
@@ -799,11 +854,12 @@ app.add_middleware(
 
 
 @app.get("/checkllm")
-def check_llm():
+def check_llm(fresh: bool = False):
+    """Probe the configured LLM. Answers are cached for a minute; fresh=true always calls it."""
     from app.utils.llm_clients import llm_generate
 
     try:
-        out = llm_generate("say OK in one word")
+        out = llm_generate("say OK in one word", site="checkllm", cache=not fresh)
         # Some LLM backends return stuff with line breaks/JSON; normalize to short string
         if isinstance(out, str):
             out_s = out.strip().splitlines()[0] if out.strip() else ""
@@ -822,64 +878,45 @@ class RunRequest(BaseModel):
     preferences: Dict[str, Any] = {}
 
 
-# ----------------------
-# DB helpers
-# ----------------------
-def write_run_db(run_id: str, status: str, state: Optional[Dict[str, Any]] = None):
-    conn = sqlite3.connect(DB)
-    conn.execute(
-        "INSERT OR REPLACE INTO runs (run_id, created_at, status, last_error, state_json) VALUES (?,?,?,?,?)",
-        (run_id, time.time(), status, "", json.dumps(state or {})),
-    )
-    conn.commit()
-    conn.close()
+class LeaseLost(RuntimeError):
+    """Raised when another worker has taken over a run this worker was executing."""
 
 
-def update_run_state(run_id: str, status: str, state: Optional[Dict[str, Any]] = None, last_error: Optional[str] = None):
-    conn = sqlite3.connect(DB)
-    conn.execute(
-        "UPDATE runs SET status=?, last_error=?, state_json=? WHERE run_id=?",
-        (status, last_error or "", json.dumps(state or {}), run_id),
-    )
-    conn.commit()
-    conn.close()
-
-
-def read_run(run_id: str):
-    conn = sqlite3.connect(DB)
-    cur = conn.execute(
-        "SELECT run_id, created_at, status, last_error, state_json FROM runs WHERE run_id=?",
-        (run_id,),
-    )
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {
-        "run_id": row[0],
-        "created_at": row[1],
-        "status": row[2],
-        "last_error": row[3],
-        "state": json.loads(row[4] or "{}"),
-    }
-
+class LeaseHeartbeat:
+    """
+    Renews a run's lease in the background while orchestrate_run works on it.
+    If renewal fails the run was reclaimed elsewhere and check() raises LeaseLost.
+    """
 
-def fetch_queued_runs(limit: int = 10):
-    conn = sqlite3.connect(DB)
-    cur = conn.execute(
-        "SELECT run_id, state_json FROM runs WHERE status='queued' ORDER BY created_at ASC LIMIT ?",
-        (limit,),
-    )
-    rows = cur.fetchall()
-    conn.close()
-    out = []
-    for r in rows:
-        try:
-            state = json.loads(r[1] or "{}")
-        except Exception:
-            state = {}
-        out.append((r[0], state))
-    return out
+    def __init__(self, run_id: str, worker_id: str = WORKER_ID, lease_seconds: float = RUN_LEASE_SECONDS):
+        self.run_id = run_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.interval = max(1.0, lease_seconds / 3)
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True, name=f"lease-{run_id[:8]}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def check(self):
+        if self.lost.is_set():
+            raise LeaseLost(f"lease on run {self.run_id} lost by worker {self.worker_id}")
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not renew_lease(self.run_id, self.worker_id, self.lease_seconds):
+                    self.lost.set()
+                    agent_log(self.run_id, f"Lease lost by worker {self.worker_id}", agent="orchestrator", level="WARNING")
+                    return
+            except Exception as e:
+                agent_log(self.run_id, f"Lease renewal error: {e}", agent="orchestrator", level="WARNING")
 
 
 # ----------------------
@@ -902,58 +939,90 @@ def fetch_queued_runs(limit: int = 10):
 #     raise last_exc
 
 def safe_step(step_fn, *args, run_id: str = None, step_name: str = "step",
-              retries: int = MAX_STEP_RETRIES, **kwargs):
+              retries: Optional[RetryTracker] = None, **kwargs):
     """
-    Safely executes a step with retry + logging.
+    Safely executes a step with error-aware retries + logging.
+    Permanent errors are raised at once. Transient ones are retried according to
+    the stage's RetryPolicy: short backoffs inline, longer ones (when the run's
+    RetryTracker is given) by raising RetryLater so the run is requeued instead
+    of sleeping in an executor slot.
     Ensures no unexpected kwargs (like run_id) are forwarded to step_fn.
     """
-    last_exc = None
+    tracker = retries if retries is not None else RetryTracker()
 
     # Remove orchestrator-only kwargs from forwarded args
-    safe_kwargs = {k: v for k, v in kwargs.items() if k not in ("run_id", "step_name")}
+    safe_kwargs = {k: v for k, v in kwargs.items() if k not in ("run_id", "step_name", "retries")}
 
-    for attempt in range(1, retries + 2):
+    attempt = 1
+    while True:
+        start = time.time()
         try:
-            agent_log(run_id, f"START {step_name} attempt={attempt}", agent="orchestrator")
+            log_event(run_id, "stage_start", stage=step_name, message=f"START {step_name} attempt={attempt}", attempt=attempt)
 
             # <-- IMPORTANT: only pass *args and safe_kwargs
             res = step_fn(*args, **safe_kwargs)
 
-            agent_log(run_id, f"OK {step_name}", agent="orchestrator")
+            log_event(run_id, "stage_end", stage=step_name, duration=time.time() - start,
+                      message=f"OK {step_name}", attempt=attempt)
             return res
 
+        except (LeaseLost, RetryLater):
+            raise
         except Exception as e:
-            last_exc = e
             tb = traceback.format_exc()
+            decision = tracker.next_delay(step_name, e)
             agent_log(run_id,
-                      f"ERROR {step_name} attempt={attempt}: {e}\n{tb}",
+                      f"ERROR {step_name} attempt={attempt} ({decision['kind']}): {e}\n{tb}",
                       agent="orchestrator")
-            time.sleep(STEP_RETRY_BACKOFF * attempt)
-
-    raise last_exc
+            if not decision["retry"]:
+                log_event(run_id, "stage_failed", stage=step_name, level="ERROR", duration=time.time() - start,
+                          message=f"Not retrying {step_name}: {decision['reason']}",
+                          attempt=attempt, kind=decision["kind"], error=str(e)[:500])
+                raise
+            log_event(run_id, "stage_retry", stage=step_name, level="WARNING", duration=time.time() - start,
+                      message=f"Retrying {step_name} in {decision['delay']:.1f}s ({decision['reason']})",
+                      attempt=attempt, kind=decision["kind"], delay=round(decision["delay"], 3), error=str(e)[:500])
+            if retries is not None and decision["delay"] > RETRY_INLINE_MAX_DELAY:
+                raise RetryLater(step_name, decision["delay"], e) from e
+            time.sleep(decision["delay"])
+            attempt += 1
 
 
 
 # ----------------------
 # Core orchestrator
 # ----------------------
-def orchestrate_run(run_id: str, payload: Dict[str, Any]):
+def _with_task_type(ps: Dict[str, Any], train_res: Dict[str, Any]) -> Dict[str, Any]:
+    """The PS with the task type AutoML actually trained for."""
+    auto_task = train_res.get("automl_settings", {}).get("task") or train_res.get("task_type")
+    return dict(ps, task_type=auto_task) if auto_task else ps
+
+
+def build_run_pipeline(
+    run_id: str,
+    payload: Dict[str, Any],
+    preferences: Dict[str, Any],
+    cores: Optional[int],
+    checkpoints: StageCheckpoints,
+    retries: RetryTracker,
+    heartbeat: "LeaseHeartbeat",
+) -> Pipeline:
     """
-    Runs the pipeline for a single run_id and payload.
+    The stage DAG of one run. Every node is checkpointed under its name.
+    model_plan (an LLM call) only needs the raw dataset, so it runs alongside
+    preprocessing instead of inside run_automl.
     """
-    try:
-        agent_log(run_id, "Orchestration started", agent="orchestrator")
-        update_run_state(run_id, "running", {"phase": "ps_parse"})
+    problem_statement = payload.get("problem_statement", "") if payload else ""
 
-        problem_statement = payload.get("problem_statement", "") if payload else ""
-        preferences = payload.get("preferences", {}) if payload else {}
-        # accept hint in root payload
-        if payload.get("hint"):
-            preferences["hint"] = payload.get("hint")
+    def set_phase(patch: Dict[str, Any]):
+        heartbeat.check()
+        update_run_state(run_id, "running", patch)
 
-        # ---------------- PS agent ----------------
+    def ps_stage():
         # parse_problem_or_generate signature: (run_id, problem_statement, preferences)
-        ps_res = safe_step(parse_problem_or_generate, run_id, problem_statement, preferences, step_name="ps_agent")
+        ps_res = checkpoints.run(
+            "ps_agent", safe_step, parse_problem_or_generate, run_id, problem_statement, preferences, step_name="ps_agent", run_id=run_id, retries=retries
+        )
 
         # If PS agent returned options, choose the first option
         if isinstance(ps_res, dict) and "options" in ps_res and ps_res["options"]:
@@ -968,71 +1037,142 @@ def orchestrate_run(run_id: str, payload: Dict[str, Any]):
             ps = ps_res if isinstance(ps_res, dict) else {"raw_text": str(ps_res)}
 
         agent_log(run_id, f"PS prepared: {str(ps)[:400]}", agent="orchestrator")
-        update_run_state(run_id, "running", {"phase": "dataset_search", "ps_preview": str(ps)[:300]})
-
-        # ---------------- Data agent ----------------
-        ds_res = safe_step(get_or_find_dataset, run_id, ps, payload.get("user", {}), step_name="data_agent")
-        dataset_path = None
-        dataset_source = "Unknown"
-        dataset_source_name = "Unknown"
-        dataset_source_url = ""
-        
+        set_phase({"phase": "dataset_search", "ps_preview": str(ps)[:300]})
+        return ps
+
+    def search_stage(ps, user):
+        return checkpoints.run(
+            "search_queries", safe_step, plan_dataset_search, run_id, ps, user, step_name="search_queries", run_id=run_id, retries=retries
+        )
+
+    def data_stage(ps, user, queries):
+        ds_res = checkpoints.run(
+            "data_agent", safe_step, get_or_find_dataset, run_id, ps, user, queries, step_name="data_agent", run_id=run_id, retries=retries
+        )
+        dataset = {"path": None, "source": "Unknown", "source_name": "Unknown", "source_url": ""}
         if isinstance(ds_res, dict):
-            dataset_path = ds_res.get("dataset_path") or ds_res.get("dataset_uri") or ds_res.get("downloaded_to")
-            dataset_source = ds_res.get("source", "Unknown")
-            dataset_source_name = ds_res.get("source_name", "Unknown")
-            dataset_source_url = ds_res.get("source_url", "")
+            dataset["path"] = ds_res.get("dataset_path") or ds_res.get("dataset_uri") or ds_res.get("downloaded_to")
+            dataset["source"] = ds_res.get("source", "Unknown")
+            dataset["source_name"] = ds_res.get("source_name", "Unknown")
+            dataset["source_url"] = ds_res.get("source_url", "")
         elif isinstance(ds_res, str):
-            dataset_path = ds_res
+            dataset["path"] = ds_res
         else:
-            dataset_path = str(ds_res)
+            dataset["path"] = str(ds_res)
 
-        if not dataset_path:
+        if not dataset["path"]:
             raise RuntimeError("Data agent did not return dataset path")
 
-        agent_log(run_id, f"Dataset selected: {dataset_path} from {dataset_source}: {dataset_source_name}", agent="orchestrator")
-        update_run_state(run_id, "running", {
-            "phase": "preprocessing", 
-            "dataset": dataset_path,
-            "dataset_source": dataset_source,
-            "dataset_source_name": dataset_source_name,
-            "dataset_source_url": dataset_source_url
+        agent_log(run_id, f"Dataset selected: {dataset['path']} from {dataset['source']}: {dataset['source_name']}", agent="orchestrator")
+        set_phase({
+            "phase": "preprocessing",
+            "dataset": dataset["path"],
+            "dataset_source": dataset["source"],
+            "dataset_source_name": dataset["source_name"],
+            "dataset_source_url": dataset["source_url"],
         })
+        return dataset
 
-        # ---------------- Preprocess ----------------
-        prep_res = safe_step(preprocess_dataset, run_id, dataset_path, ps, step_name="prep_agent")
+    def plan_stage(ps, dataset):
+        return checkpoints.run(
+            "model_plan", safe_step, suggest_model_plan, run_id, ps, dataset["path"], step_name="model_plan", run_id=run_id, retries=retries
+        )
 
+    def prep_stage(ps, dataset):
+        # CPU-heavy stages go through run_stage so they can run in worker processes
+        prep_res = checkpoints.run(
+            "prep_agent", safe_step, run_stage, preprocess_dataset, run_id, dataset["path"], ps, cores=cores, step_name="prep_agent", run_id=run_id, retries=retries
+        )
         if not isinstance(prep_res, dict) or "train_path" not in prep_res:
             raise RuntimeError("Preprocessing agent returned invalid result")
 
         agent_log(run_id, f"Preprocessing complete: train={prep_res.get('train_path')}", agent="orchestrator")
-        update_run_state(run_id, "running", {"phase": "training", "prep": {"train": prep_res.get("train_path")}})
-
-        # ---------------- AutoML ----------------
-        train_res = safe_step(run_automl, run_id, prep_res["train_path"], ps, preferences, step_name="automl_agent")
+        set_phase({"phase": "training", "prep": {"train": prep_res.get("train_path")}})
+        return prep_res
 
+    def train_stage(ps, prep, llm_plan):
+        train_res = checkpoints.run(
+            "automl_agent", safe_step, run_stage, run_automl, run_id, prep["train_path"], ps, preferences, llm_plan,
+            n_jobs=cores, cores=cores, step_name="automl_agent", run_id=run_id, retries=retries,
+        )
         if not isinstance(train_res, dict) or "model_path" not in train_res:
             raise RuntimeError("AutoML agent returned invalid result")
 
-        auto_task = train_res.get("automl_settings", {}).get("task") or train_res.get("task_type")
-        if auto_task:
-            ps["task_type"] = auto_task
-
-        agent_log(run_id, f"Training complete: model={train_res.get('model_path')}, task={ps.get('task_type')}", agent="orchestrator")
-        update_run_state(run_id, "running", {"phase": "evaluation", "train": {"model": train_res.get("model_path")}})
+        agent_log(run_id, f"Training complete: model={train_res.get('model_path')}, task={_with_task_type(ps, train_res).get('task_type')}", agent="orchestrator")
+        set_phase({"phase": "evaluation", "train": {"model": train_res.get("model_path")}})
+        return train_res
 
-        # ---------------- Evaluate ----------------
-        eval_res = safe_step(
+    def eval_stage(ps, prep, train):
+        eval_res = checkpoints.run(
+            "eval_agent",
+            safe_step,
+            run_stage,
             evaluate_model,
             run_id,
-            prep_res["test_path"],
-            train_res["model_path"],
-            prep_res["transformer_path"],
-            ps,
-            step_name="eval_agent",
+            prep["test_path"],
+            train["model_path"],
+            prep["transformer_path"],
+            _with_task_type(ps, train),
+            cores=cores,
+            step_name="eval_agent", run_id=run_id, retries=retries,
         )
-
         agent_log(run_id, f"Evaluation complete: metrics={str(eval_res.get('metrics'))[:400]}", agent="orchestrator")
+        return eval_res
+
+    return Pipeline([
+        Stage("ps_agent", ps_stage, outputs=("ps",)),
+        Stage("search_queries", search_stage, inputs=("ps", "user"), outputs=("queries",)),
+        Stage("data_agent", data_stage, inputs=("ps", "user", "queries"), outputs=("dataset",)),
+        Stage("model_plan", plan_stage, inputs=("ps", "dataset"), outputs=("llm_plan",)),
+        Stage("prep_agent", prep_stage, inputs=("ps", "dataset"), outputs=("prep",)),
+        Stage("automl_agent", train_stage, inputs=("ps", "prep", "llm_plan"), outputs=("train",)),
+        Stage("eval_agent", eval_stage, inputs=("ps", "prep", "train"), outputs=("evaluation",)),
+    ])
+
+
+def orchestrate_run(run_id: str, payload: Dict[str, Any], cores: Optional[int] = None) -> Optional[float]:
+    """
+    Runs the pipeline for a single run_id and payload.
+    The caller must have claimed the run; its lease is renewed until we return.
+    `cores` is the run's core budget from the scheduler (FLAML n_jobs, BLAS threads).
+    Stages with a valid checkpoint in the run state are skipped (retry / reclaim).
+    Returns the time the run should be retried at if a stage asked to back off
+    (the run is then back in 'queued'), else None.
+    """
+    heartbeat = LeaseHeartbeat(run_id).start()
+    retries = RetryTracker()
+    try:
+        run_start = time.time()
+        log_event(run_id, "run_start", message=f"Orchestration started on worker {WORKER_ID}", worker_id=WORKER_ID, cores=cores)
+        # a copy: the payload is the user's request and stays as it was submitted
+        preferences = dict(payload.get("preferences") or {}) if payload else {}
+        # accept hint in root payload
+        if payload.get("hint"):
+            preferences["hint"] = payload.get("hint")
+
+        current = read_run(run_id) or {}
+        checkpoints = StageCheckpoints(run_id, current.get("state"), guard=heartbeat.check)
+        retries = RetryTracker((current.get("state") or {}).get("retries"))
+        pipeline = build_run_pipeline(run_id, payload, preferences, cores, checkpoints, retries, heartbeat)
+        checkpoints.downstream = pipeline.downstream
+        if checkpoints.completed():
+            agent_log(run_id, f"Found checkpoints for {checkpoints.completed()}", agent="orchestrator")
+        update_run_state(run_id, "running", {"phase": "ps_parse"})
+
+        def record_timing(stage: str, timing: Dict[str, float]):
+            heartbeat.check()
+            update_run_state(run_id, "running", {"timings": {stage: timing}})
+
+        out = pipeline.run({"user": payload.get("user") or {}}, on_stage_done=record_timing)
+        critical_path = pipeline.critical_path()
+        agent_log(run_id, f"Critical path: {' -> '.join(critical_path['stages'])} ({critical_path['seconds']}s)", agent="orchestrator")
+
+        ps = _with_task_type(out["ps"], out["train"])
+        dataset_path = out["dataset"]["path"]
+        dataset_source = out["dataset"]["source"]
+        dataset_source_name = out["dataset"]["source_name"]
+        dataset_source_url = out["dataset"]["source_url"]
+        prep_res, train_res, eval_res = out["prep"], out["train"], out["evaluation"]
 
         # Save artifacts
         plan_path = save_artifact(run_id, "plan.json", json.dumps(ps, indent=2))
@@ -1130,59 +1270,177 @@ def orchestrate_run(run_id: str, payload: Dict[str, Any]):
         
         agent_log(run_id, f"[orchestrator] Extracted {len(trained_models)} trained models: {[m['name'] for m in trained_models]}", agent="orchestrator")
         
+        heartbeat.check()
         update_run_state(run_id, "completed", {
+            "phase": "completed",
             "artifacts": artifacts, 
             "metrics": eval_res.get("metrics"),
             "best_model": eval_res.get("best_model", "Unknown"),
             "trained_models": trained_models,
             "dataset_source": dataset_source,
             "dataset_source_name": dataset_source_name,
-            "dataset_source_url": dataset_source_url
+            "dataset_source_url": dataset_source_url,
+            "critical_path": critical_path,
         })
-        agent_log(run_id, f"Orchestration completed - Best Model: {eval_res.get('best_model', 'Unknown')}", agent="orchestrator")
-
+        log_event(run_id, "run_end", duration=time.time() - run_start,
+                  message=f"Orchestration completed - Best Model: {eval_res.get('best_model', 'Unknown')}",
+                  best_model=eval_res.get("best_model"), critical_path=critical_path["stages"])
+
+    except LeaseLost as e:
+        # another worker owns the run now; leave its state alone
+        agent_log(run_id, f"Run abandoned: {e}", agent="orchestrator", level="WARNING")
+    except RetryLater as e:
+        # back off without holding the executor slot; the run resumes from its checkpoints
+        retry_at = time.time() + e.delay
+        deferred = defer_run(run_id, WORKER_ID, retry_at, {
+            "phase": "retry_wait",
+            "retry_at": retry_at,
+            "retry_stage": e.stage,
+            "retries": retries.snapshot(),
+        })
+        if deferred:
+            log_event(run_id, "run_deferred", stage=e.stage, message=f"Requeued: {e}", retry_at=retry_at)
+            return retry_at
+        agent_log(run_id, f"Could not requeue run after {e}: lease lost", agent="orchestrator", level="WARNING")
     except Exception as e:
         tb = traceback.format_exc()
-        agent_log(run_id, f"Run FAILED: {e}\n{tb}", agent="orchestrator")
-        update_run_state(run_id, "failed", {"error": str(e)}, last_error=str(e))
+        log_event(run_id, "run_failed", level="ERROR", message=f"Run FAILED: {e}\n{tb}", error=str(e)[:500])
+        update_run_state(run_id, "failed", {"phase": "failed", "error": str(e), "retries": retries.snapshot()}, last_error=str(e))
+    finally:
+        heartbeat.stop()
+    return None
 
 
 # ----------------------
 # Background worker loop
 # ----------------------
-def background_worker_loop(poll_interval: float = 3.0):
+def recover_queued_runs() -> int:
+    """
+    Enqueue runs persisted as claimable: queued, or running under an expired lease.
+    Called at startup, and periodically when RUN_SWEEP_INTERVAL is set.
+    """
+    runs = fetch_claimable_runs()
+    for r in runs:
+        run_queue.put(r["run_id"], r["priority"], r["user_key"], r["created_at"], not_before=r["not_before"])
+    return len(runs)
+
+
+def dispatch_run(run_id: str, cores: Optional[int] = None, user_key: str = "anonymous", priority: int = DEFAULT_PRIORITY) -> bool:
+    """
+    Claim a run for this worker and hand it to the executor with its core budget.
+    Returns False if another worker got it first (or it is no longer claimable).
+    The executor slot and cores are released when the run finishes.
+    """
+    if not claim_run(run_id, WORKER_ID, RUN_LEASE_SECONDS):
+        return False
+    current = read_run(run_id)
+    state = (current or {}).get("state") or {}
+    payload = state.get("payload", {}) if isinstance(state, dict) else {}
+    update_run_state(run_id, "running", {"phase": "queued->running", "worker_id": WORKER_ID})
+    agent_log(run_id, f"Dispatching run from background worker {WORKER_ID} with {cores} cores", agent="orchestrator")
+    started = time.time()
+    run_queue.started(user_key)
+    future = executor.submit(orchestrate_run, run_id, payload, cores)
+
+    def _release(f):
+        run_queue.finished(user_key, time.time() - started)
+        core_scheduler.release(cores or 0)
+        run_slots.release()
+        retry_at = None if f.cancelled() or f.exception() else f.result()
+        if retry_at:
+            run_queue.put(run_id, priority, user_key, not_before=retry_at)
+
+    future.add_done_callback(_release)
+    return True
+
+
+def background_worker_loop():
     """
-    Continuously scan the DB for queued runs and dispatch them to executor.
+    Block on the in-process run queue and dispatch runs as soon as they are signalled.
+    An idle worker does no DB work; the DB is only consulted when a run_id arrives.
     """
     agent_log("system", "Background worker started", agent="orchestrator")
+    try:
+        # runs still 'running' under our own id were orphaned by our previous process
+        orphaned = release_worker_runs(WORKER_ID, {"phase": "orphaned->queued"})
+        if orphaned:
+            agent_log("system", f"Reclaimed {len(orphaned)} orphaned runs of {WORKER_ID}", agent="orchestrator")
+        recovered = recover_queued_runs()
+        if recovered:
+            agent_log("system", f"Recovered {recovered} queued runs from DB", agent="orchestrator")
+    except Exception as e:
+        agent_log("system", f"Queued run recovery failed: {e}", agent="orchestrator")
+
     while True:
+        run_queue.wait()
+        # admission: wait for an executor slot and a core budget, then pick the run
+        # that should go next *now* (a high-priority run may have arrived meanwhile)
+        run_slots.acquire()
+        cores = core_scheduler.acquire()
+        entry = run_queue.get()
+        run_id = entry["run_id"]
+        dispatched = False
         try:
-            queued = fetch_queued_runs(limit=10)
-            if queued:
-                for run_id, state in queued:
-                    # re-check status and claim the run
-                    current = read_run(run_id)
-                    if not current or current.get("status") != "queued":
-                        continue
-                    try:
-                        update_run_state(run_id, "running", {"phase": "queued->running", "payload": state.get("payload")})
-                        agent_log(run_id, "Dispatching run from background worker", agent="orchestrator")
-                        payload = state.get("payload", {}) if isinstance(state, dict) else {}
-                        executor.submit(orchestrate_run, run_id, payload)
-                    except Exception as e:
-                        agent_log(run_id, f"Failed to dispatch run: {e}", agent="orchestrator")
-            time.sleep(poll_interval)
+            dispatched = dispatch_run(run_id, cores, entry["user_key"], entry["priority"])
         except Exception as e:
-            agent_log("system", f"Background worker loop error: {e}", agent="orchestrator")
-            time.sleep(poll_interval)
+            agent_log(run_id, f"Failed to dispatch run: {e}", agent="orchestrator")
+        finally:
+            if not dispatched:
+                core_scheduler.release(cores)
+                run_slots.release()
+
+
+def run_sweeper_loop(interval: float):
+    """
+    Periodically enqueue claimable runs so that runs accepted by another process,
+    or abandoned by a dead worker, are picked up here.
+    """
+    while True:
+        time.sleep(interval)
+        try:
+            recover_queued_runs()
+        except Exception as e:
+            agent_log("system", f"Run sweep failed: {e}", agent="orchestrator")
+
+
+def index_existing_artifacts():
+    """Record files written before the artifact manifest existed (runs once per database)."""
+    try:
+        count = migrate_flat_artifacts()
+        if count:
+            agent_log("system", f"Indexed {count} existing artifact files", agent="orchestrator")
+    except Exception as e:
+        agent_log("system", f"Artifact index migration failed: {e}", agent="orchestrator")
 
 
 # Start background worker when app starts
 @app.on_event("startup")
 def start_background_worker():
+    threading.Thread(target=index_existing_artifacts, daemon=True, name="artifact-index").start()
+    if HF_PRELOAD and os.getenv("LLM_MODE", "").lower() == "hf":
+        # load the local model now rather than in the first run that needs it
+        hf_worker.warm_up()
+    if RETENTION_INTERVAL > 0:
+        threading.Thread(target=retention_loop, args=(RETENTION_INTERVAL,), daemon=True, name="retention").start()
     t = threading.Thread(target=background_worker_loop, daemon=True, name="orchestrator-worker")
     t.start()
-    agent_log("system", "Background worker thread launched", agent="orchestrator")
+    if RUN_SWEEP_INTERVAL > 0:
+        threading.Thread(target=run_sweeper_loop, args=(RUN_SWEEP_INTERVAL,), daemon=True, name="run-sweeper").start()
+    else:
+        # one more sweep once the leases of a crashed previous process have lapsed
+        sweep = threading.Timer(RUN_LEASE_SECONDS + 1, recover_queued_runs)
+        sweep.daemon = True
+        sweep.start()
+    agent_log("system", f"Background worker thread launched (worker_id={WORKER_ID})", agent="orchestrator")
+
+
+@app.on_event("shutdown")
+def stop_background_worker():
+    shutdown_stage_executor(wait=False)
+    # drain buffered log lines before the run store they register with is closed
+    shutdown_logging()
+    llm_loop.close()
+    close_run_store()
 
 
 # ----------------------
@@ -1191,65 +1449,270 @@ def start_background_worker():
 @app.post("/run")
 def kick_off_run(req: RunRequest):
     """
-    Accept a run request and queue it. The background worker will pick it up shortly.
+    Accept a run request, persist it and signal the background worker.
     """
     run_id = req.run_id or str(uuid.uuid4())
-    write_run_db(run_id, "queued", {"payload": req.dict()})
+    priority, user_key = run_priority(req.user, req.preferences)
+    write_run_db(run_id, "queued", {"payload": req.dict()}, priority=priority, user_key=user_key)
     agent_log(run_id, f"Received run request: {str(req.dict())[:400]}", agent="orchestrator")
-    return {"run_id": run_id, "status": "queued"}
+    run_queue.put(run_id, priority, user_key)
+    return {"run_id": run_id, "status": "queued", "priority": priority, "queue": run_queue.position(run_id)}
 
 
-@app.get("/status/{run_id}")
-def get_status(run_id: str):
+@app.post("/runs/{run_id}/retry")
+def retry_run(run_id: str, from_scratch: bool = False):
+    """
+    Requeue a failed (or orphaned) run. It resumes at its first incomplete stage
+    unless from_scratch is set, which discards its checkpoints.
+    """
     r = read_run(run_id)
     if not r:
         raise HTTPException(status_code=404, detail="not found")
+    patch: Dict[str, Any] = {"phase": "queued", "error": None, "retries": None, "retried_at": time.time()}
+    if from_scratch:
+        patch["checkpoints"] = None
+    if not requeue_run(run_id, patch):
+        raise HTTPException(status_code=409, detail=f"run is {r['status']}; only failed or orphaned runs can be retried")
+    payload = r["state"].get("payload") or {}
+    priority, user_key = run_priority(payload.get("user"), payload.get("preferences"))
+    agent_log(run_id, f"Retry requested (from_scratch={from_scratch})", agent="orchestrator")
+    run_queue.put(run_id, priority, user_key)
+    return {"run_id": run_id, "status": "queued", "queue": run_queue.position(run_id)}
 
-    # read run log tail
-    log_path = os.path.join(ARTIFACT_DIR, f"{run_id}_log.txt")
-    log_tail = ""
-    if os.path.exists(log_path):
-        with open(log_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-            log_tail = "".join(lines[-200:])
 
-    # return artifact file NAMES (not full paths)
-    artifacts = []
-    if os.path.exists(ARTIFACT_DIR):
-        for fname in os.listdir(ARTIFACT_DIR):
-            if fname.startswith(run_id + "_"):
-                artifacts.append(fname)
+# ----------------------
+# Run event stream (Server-Sent Events)
+# ----------------------
+def _parse_event_cursor(cursor: str):
+    """'s<seq>;<agent>:<offset>;...' -> (seq, {agent: offset})"""
+    seq, offsets = 0, {}
+    for part in (cursor or "").split(";"):
+        try:
+            if part.startswith("s"):
+                seq = int(part[1:])
+            elif ":" in part:
+                agent, off = part.split(":", 1)
+                if agent in RUN_LOG_AGENTS:
+                    offsets[agent] = int(off)
+        except ValueError:
+            continue
+    return seq, offsets
+
+
+def _format_event_cursor(seq: int, offsets: Dict[str, int]) -> str:
+    return ";".join([f"s{seq}"] + [f"{a}:{o}" for a, o in offsets.items() if o])
+
+
+def _sse(event: str, data: Any, event_id: Optional[str] = None) -> str:
+    msg = f"event: {event}\n"
+    if event_id is not None:
+        msg += f"id: {event_id}\n"
+    return msg + f"data: {json.dumps(data, default=str)}\n\n"
+
+
+def _collect_run_events(run_id: str, seq: int, offsets: Dict[str, int], agents=RUN_LOG_AGENTS):
+    """New state patches and log lines (of `agents`) after the cursor, plus the run's status."""
+    events = read_run_events(run_id, after_seq=seq, limit=500)
+    logs = {}
+    for agent in agents:
+        lines, new_offset = read_log_from(run_id, agent, offsets.get(agent, 0))
+        if lines:
+            logs[agent] = (lines, new_offset)
+    return events, logs, read_run_status(run_id)
+
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(
+    run_id: str,
+    request: Request,
+    after_seq: int = 0,
+    logs_from: str = "start",
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events for one run: "state" (each update_run_state patch) and
+    "log" (new agent_log lines), then "end" once the run is completed or failed.
+    Every message id is a cursor; a reconnecting EventSource sends it back as
+    Last-Event-ID and the stream resumes after it. Without one, state starts
+    after `after_seq` and logs at the start of the files (or their current end
+    with logs_from=end). logs_from=none streams state only and never reads the
+    log files.
+    """
+    if read_run_status(run_id) is None:
+        raise HTTPException(status_code=404, detail="not found")
+    log_agents = () if logs_from == "none" else RUN_LOG_AGENTS
+    if last_event_id:
+        seq, offsets = _parse_event_cursor(last_event_id)
+    else:
+        seq, offsets = after_seq, {}
+        if logs_from == "end":
+            for agent in RUN_LOG_AGENTS:
+                path = os.path.join(ARTIFACT_DIR, f"{run_id}_{agent}_log.txt")
+                if os.path.exists(path):
+                    offsets[agent] = os.path.getsize(path)
+
+    async def event_source():
+        nonlocal seq
+        with event_bus.subscribe(run_id) as wake:
+            yield "retry: 2000\n\n"
+            last_sent = time.time()
+            while not await request.is_disconnected():
+                wake.clear()
+                events, logs, status = await run_in_threadpool(_collect_run_events, run_id, seq, dict(offsets), log_agents)
+                chunks = []
+                for agent, (lines, new_offset) in logs.items():
+                    offsets[agent] = new_offset
+                    chunks.append(_sse("log", {"agent": agent, "lines": lines}, _format_event_cursor(seq, offsets)))
+                for e in events:
+                    seq = e["seq"]
+                    chunks.append(_sse("state", e, _format_event_cursor(seq, offsets)))
+                if chunks:
+                    yield "".join(chunks)
+                    last_sent = time.time()
+                    continue  # drain anything still pending before waiting
+                if status in ("completed", "failed", None):
+                    yield _sse("end", {"status": status}, _format_event_cursor(seq, offsets))
+                    return
+                if time.time() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.time()
+                try:
+                    await asyncio.wait_for(wake.wait(), timeout=SSE_RECHECK_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/status/{run_id}")
+def get_status(run_id: str, request: Request, log_offset: Optional[int] = None):
+    """
+    Run status, state and orchestrator log. Without log_offset, log_tail is the
+    last 200 lines; with it, only what was appended after that byte offset.
+    Either way log_offset in the response is the cursor for the next call.
+    Responses carry an ETag; polling with If-None-Match gets a 304 while
+    neither the run, its log nor its place in the queue has changed.
+    """
+    doc = status_cache.get(run_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="not found")
+
+    log_path = os.path.join(ARTIFACT_DIR, f"{run_id}_orchestrator_log.txt")
+    try:
+        log_size = os.path.getsize(log_path)
+    except OSError:
+        log_size = -1
+    # position in this worker's queue; None if the run is queued on another process
+    queue = run_queue.position(run_id) if doc["status"] == "queued" else None
+    # only the place in the queue: the wait estimate changes on every call and would defeat the 304
+    position = queue["position"] if queue else 0
+    etag = f'W/"{doc["state_version"]:x}-{log_size + 1:x}-{len(doc["artifacts"]):x}-{doc["status"]}-{position:x}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and any(tag.strip() == etag for tag in inm.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    # read run log tail (seek-based: cost does not grow with the log size)
+    log_tail = ""
+    next_offset = log_offset or 0
+    if log_size >= 0:
+        if log_offset is None:
+            cached = status_cache.cached_tail(run_id, log_size)
+            if cached is None:
+                log_tail, next_offset = tail_file(log_path, 200)
+                status_cache.store_tail(run_id, log_size, log_tail, next_offset)
+            else:
+                log_tail, next_offset = cached
+        else:
+            log_tail, next_offset = get_log_since(run_id, "orchestrator", log_offset)
 
-    r["log_tail"] = log_tail
-    r["artifacts"] = artifacts
-    return r
+    r = dict(doc, log_tail=log_tail, log_offset=next_offset)
+    if doc["status"] == "queued":
+        r["queue"] = queue
+    return JSONResponse(jsonable_encoder(r), headers=headers)
 
 
-@app.get("/artifacts/{fname}")
-def serve_artifact(fname: str):
+@app.api_route("/artifacts/{fname}", methods=["GET", "HEAD"])
+def serve_artifact(fname: str, request: Request):
     """
-    Serve artifact files saved under ARTIFACT_DIR.
+    Serve artifact files saved under ARTIFACT_DIR, with conditional GET, byte
+    ranges and gzip/zstd for text artifacts (see app.artifact_http).
     Prevent path traversal by forbidding path separators in fname.
     """
-    if ".." in fname or "/" in fname or "\\" in fname:
+    if ".." in fname or "/" in fname or "\\" in fname or fname.startswith("."):
         raise HTTPException(status_code=400, detail="invalid filename")
     fpath = os.path.join(ARTIFACT_DIR, fname)
-    if not os.path.exists(fpath):
+    if not os.path.isfile(fpath):
         raise HTTPException(status_code=404, detail="not found")
-    return FileResponse(fpath, media_type="application/octet-stream", filename=fname)
+    return artifact_response(request, fpath, fname, find_artifact(fname))
+
+
+@app.get("/runs/{run_id}/artifacts")
+def get_run_artifacts(run_id: str):
+    """The run's artifact manifest: name, size, sha256, content type and kind of each file."""
+    if not read_run_status(run_id):
+        raise HTTPException(status_code=404, detail="not found")
+    artifacts = []
+    for a in list_artifact_details(run_id):
+        artifacts.append({k: a[k] for k in ("name", "size", "sha256", "content_type", "kind", "created_at")})
+        artifacts[-1]["url"] = f"/artifacts/{a['name']}"
+    return {"run_id": run_id, "artifacts": artifacts}
+
+
+@app.post("/runs/{run_id}/pin")
+def pin_run(run_id: str):
+    """Keep all files of a run: retention never deletes them."""
+    if not set_run_pinned(run_id, True):
+        raise HTTPException(status_code=404, detail="not found")
+    return {"run_id": run_id, "pinned": True}
+
+
+@app.delete("/runs/{run_id}/pin")
+def unpin_run(run_id: str):
+    if not set_run_pinned(run_id, False):
+        raise HTTPException(status_code=404, detail="not found")
+    return {"run_id": run_id, "pinned": False}
+
+
+@app.get("/retention")
+def get_retention():
+    """Retention policy and the report of the last pass on this worker."""
+    return retention_status()
+
+
+@app.post("/retention")
+def trigger_retention(dry_run: bool = True):
+    """Run a retention pass now. Dry runs (the default) only report what would be deleted."""
+    return run_retention(dry_run=dry_run)
 
 
 @app.get("/runs")
-def list_runs(limit: int = 20):
-    conn = sqlite3.connect(DB)
-    cur = conn.execute(
-        "SELECT run_id, created_at, status FROM runs ORDER BY created_at DESC LIMIT ?",
-        (limit,),
-    )
-    rows = cur.fetchall()
-    conn.close()
-    runs = [{"run_id": r[0], "created_at": r[1], "status": r[2]} for r in rows]
-    return {"runs": runs}
+def list_runs(
+    limit: int = Query(20, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    user: Optional[str] = None,
+    dataset_source: Optional[str] = None,
+    best_model: Optional[str] = None,
+    fields: Optional[str] = Query(None, description=f"comma-separated, any of: {', '.join(RUN_LIST_FIELDS)}"),
+):
+    """
+    Runs, newest first. Pass `next_cursor` from a response as `cursor` for the
+    next page. Filters match exactly; `fields` adds summary fields to each run.
+    """
+    selected = [f.strip() for f in (fields or "").split(",") if f.strip()]
+    unknown = [f for f in selected if f not in RUN_LIST_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"unknown fields: {unknown}")
+    try:
+        return list_runs_db(limit, cursor, selected, status=status, user=user,
+                            dataset_source=dataset_source, best_model=best_model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 # ---------- Interactive Problem Statement endpoint ----------
@@ -1296,6 +1759,48 @@ def health_check():
     return {"status": "ok", "service": "AutoML Platform"}
 
 
+@app.get("/events")
+def get_indexed_events(
+    run_id: Optional[str] = None,
+    stage: Optional[str] = None,
+    event: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=5000),
+):
+    """
+    Structured events across runs from the event index (stage_start / stage_end /
+    stage_retry / stage_failed / stage_reused / run_start / run_end / run_deferred /
+    run_failed, and ERROR log lines), newest first.
+    """
+    return {"events": query_events(run_id, stage, event, level, since, until, limit)}
+
+
+@app.get("/events/stages")
+def get_stage_stats(last_runs: int = Query(1000, ge=0), since: Optional[float] = None, stage: Optional[str] = None):
+    """Per-stage latency (mean / p50 / p95 / max) and failure counts over the most recent runs (0 = all)."""
+    return {"last_runs": last_runs or None, "since": since, "stages": stage_stats(last_runs or None, since, stage)}
+
+
+@app.get("/scheduler")
+def scheduler_stats():
+    """Core allocation and run queue state on this worker"""
+    return {
+        "worker_id": WORKER_ID,
+        "execution_backend": EXECUTION_BACKEND,
+        **core_scheduler.stats(),
+        "queue": run_queue.stats(),
+        "log_writer": log_writer.stats(),
+        "artifact_store": get_artifact_store().stats(),
+        "status_cache": status_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_http": llm_loop.stats(),
+        "llm_providers": llm_policy.stats(),
+        "hf_worker": hf_worker.stats(),
+    }
+
+
 @app.get("/dashboard", response_class=HTMLResponse)
 def dashboard_ui():
     return HTMLResponse(content=DASHBOARD_HTML, status_code=200)
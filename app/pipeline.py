@@ -0,0 +1,168 @@
+# app/pipeline.py
+"""
+Run pipeline as a dependency DAG.
+
+A Stage declares the named values it reads (inputs) and the ones it produces
+(outputs). Pipeline.run() starts every stage whose inputs are available, so
+stages that do not depend on each other (e.g. an LLM call next to a CPU-bound
+step) run concurrently on a small thread pool. Per-stage timings are kept, and
+critical_path() reports the chain of stages that determined the total time.
+"""
+import os
+import time
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+PIPELINE_MAX_PARALLEL = int(os.getenv("PIPELINE_MAX_PARALLEL", "3"))
+
+
+class Stage:
+    """One node: fn(**inputs) returns the single output, or a dict with every declared output."""
+
+    def __init__(self, name: str, fn: Callable[..., Any], inputs: Sequence[str] = (), outputs: Optional[Sequence[str]] = None):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs) if outputs else (name,)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, inputs={self.inputs}, outputs={self.outputs})"
+
+
+class Pipeline:
+    """A validated DAG of stages. Build one per run; timings are kept on the instance."""
+
+    def __init__(self, stages: Sequence[Stage], max_parallel: int = PIPELINE_MAX_PARALLEL):
+        self.stages: Dict[str, Stage] = {}
+        self.producer: Dict[str, str] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"duplicate stage {stage.name!r}")
+            self.stages[stage.name] = stage
+            for out in stage.outputs:
+                if out in self.producer:
+                    raise ValueError(f"{out!r} is produced by both {self.producer[out]!r} and {stage.name!r}")
+                self.producer[out] = stage.name
+        self.max_parallel = max(1, max_parallel)
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self.order = self._topological_order()
+
+    def upstream(self, name: str) -> List[str]:
+        """Stages that produce the direct inputs of `name`."""
+        return sorted({self.producer[i] for i in self.stages[name].inputs if i in self.producer})
+
+    def downstream(self, name: str) -> List[str]:
+        """Every stage that depends on `name`, directly or transitively, in run order."""
+        seen = {name}
+        for stage in self.order:
+            if stage not in seen and any(u in seen for u in self.upstream(stage)):
+                seen.add(stage)
+        return [s for s in self.order if s in seen and s != name]
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        state: Dict[str, int] = {}
+
+        def visit(name: str, path: List[str]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"cycle in pipeline: {' -> '.join(path + [name])}")
+            state[name] = 1
+            for dep in self.upstream(name):
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def run(self, context: Optional[Dict[str, Any]] = None, on_stage_done: Optional[Callable[[str, Dict[str, float]], None]] = None) -> Dict[str, Any]:
+        """
+        Execute all stages and return the context extended with their outputs.
+        `context` supplies the external inputs. The first stage error cancels
+        stages not yet started and is re-raised once running stages finish.
+        """
+        ctx = dict(context or {})
+        missing = {i for s in self.stages.values() for i in s.inputs if i not in self.producer and i not in ctx}
+        if missing:
+            raise ValueError(f"pipeline inputs not provided: {sorted(missing)}")
+
+        t0 = time.time()
+        lock = threading.Lock()
+        done: set = set()
+        running: Dict[Future, str] = {}
+        error: Optional[BaseException] = None
+
+        def call(stage: Stage):
+            start = time.time()
+            try:
+                return stage.fn(**{i: ctx[i] for i in stage.inputs})
+            finally:
+                end = time.time()
+                with lock:
+                    self.timings[stage.name] = {
+                        "start": round(start - t0, 3),
+                        "end": round(end - t0, 3),
+                        "seconds": round(end - start, 3),
+                    }
+
+        def ready(stage: Stage) -> bool:
+            return all(self.producer.get(i) in done or i not in self.producer for i in stage.inputs)
+
+        with ThreadPoolExecutor(max_workers=self.max_parallel, thread_name_prefix="stage") as pool:
+            pending = list(self.order)
+            while pending or running:
+                if error is None:
+                    for name in [n for n in pending if ready(self.stages[n])]:
+                        pending.remove(name)
+                        running[pool.submit(call, self.stages[name])] = name
+                if not running:
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    name = running.pop(fut)
+                    exc = fut.exception()
+                    if exc is not None:
+                        error = error or exc
+                        continue
+                    result = fut.result()
+                    stage = self.stages[name]
+                    if len(stage.outputs) == 1:
+                        ctx[stage.outputs[0]] = result
+                    else:
+                        for out in stage.outputs:
+                            ctx[out] = result[out]
+                    done.add(name)
+                    if on_stage_done:
+                        on_stage_done(name, self.timings[name])
+        if error is not None:
+            raise error
+        return ctx
+
+    def critical_path(self) -> Dict[str, Any]:
+        """
+        The chain of dependent stages with the largest summed duration.
+        Shortening anything off this path does not shorten the run.
+        """
+        finish: Dict[str, float] = {}
+        prev: Dict[str, Optional[str]] = {}
+        for name in self.order:
+            if name not in self.timings:
+                continue
+            deps = [d for d in self.upstream(name) if d in finish]
+            best = max(deps, key=lambda d: (finish[d], self.order.index(d))) if deps else None
+            prev[name] = best
+            finish[name] = self.timings[name]["seconds"] + (finish[best] if best else 0.0)
+        if not finish:
+            return {"stages": [], "seconds": 0.0}
+        # on ties prefer the later stage, so the path runs through to the end
+        node: Optional[str] = max(finish, key=lambda n: (finish[n], self.order.index(n)))
+        total = finish[node]
+        path = []
+        while node:
+            path.append(node)
+            node = prev[node]
+        return {"stages": list(reversed(path)), "seconds": round(total, 3)}
@@ -0,0 +1,362 @@
+# app/retention.py
+"""
+Retention and garbage collection for ARTIFACT_DIR and DATA_DIR.
+
+A pass plans what to delete and, unless it is a dry run, deletes it:
+
+1. Protected runs are never touched: runs that are queued or running, pinned
+   runs (POST /runs/{run_id}/pin) and the RETENTION_KEEP_LAST_RUNS newest runs.
+   The RETENTION_KEEP_BEST best completed runs per dataset keep their model
+   and report files whatever their age.
+2. TTLs per artifact kind (RETENTION_TTL_<KIND>_DAYS, 0 = keep forever) apply
+   to the files of all other runs. Datasets in DATA_DIR (CSVs and the Kaggle
+   `<run_id>_kaggle_*` directories) use RETENTION_TTL_DATASET_DAYS.
+3. Watermarks: when the artifact disk would still be above
+   RETENTION_DISK_HIGH_PERCENT used (or RETENTION_INODE_HIGH_PERCENT of its
+   inodes) after that, whole unprotected runs are deleted, oldest first, until
+   the estimate is below the low watermarks.
+
+Freed space is estimated per inode: a file hard-linked into the artifact store
+only gives its blocks back when every name for it goes, after which the
+store's gc() drops the blob.
+"""
+import os
+import time
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from app import storage
+from app.artifact_store import encoded_paths
+from app.run_store import TERMINAL_STATUSES, artifact_run_ids, claim_periodic, list_run_artifacts, retention_runs
+from app.utils.run_logger import agent_log
+
+RETENTION_INTERVAL = float(os.getenv("RETENTION_INTERVAL", "3600"))
+RETENTION_KEEP_LAST_RUNS = int(os.getenv("RETENTION_KEEP_LAST_RUNS", "50"))
+RETENTION_KEEP_BEST = int(os.getenv("RETENTION_KEEP_BEST", "1"))
+RETENTION_DISK_HIGH_PERCENT = float(os.getenv("RETENTION_DISK_HIGH_PERCENT", "85"))
+RETENTION_DISK_LOW_PERCENT = float(os.getenv("RETENTION_DISK_LOW_PERCENT", "75"))
+RETENTION_INODE_HIGH_PERCENT = float(os.getenv("RETENTION_INODE_HIGH_PERCENT", "90"))
+RETENTION_INODE_LOW_PERCENT = float(os.getenv("RETENTION_INODE_LOW_PERCENT", "80"))
+
+_DEFAULT_TTL_DAYS = {"log": 30, "plot": 30, "data": 14, "model": 90, "report": 90, "other": 30, "dataset": 7}
+RETENTION_TTL_DAYS = {
+    kind: float(os.getenv(f"RETENTION_TTL_{kind.upper()}_DAYS", str(days))) for kind, days in _DEFAULT_TTL_DAYS.items()
+}
+
+# kept for the best runs of each dataset: enough to serve or compare the model
+BEST_RUN_KINDS = ("model", "report")
+# run ids that own files but are not runs (the service log)
+_SERVICE_RUN_IDS = {"system"}
+REPORT_MAX_ITEMS = 500
+
+_pass_lock = threading.Lock()
+last_report: Optional[Dict[str, Any]] = None
+
+
+def policy() -> Dict[str, Any]:
+    return {
+        "interval_seconds": RETENTION_INTERVAL,
+        "keep_last_runs": RETENTION_KEEP_LAST_RUNS,
+        "keep_best_per_dataset": RETENTION_KEEP_BEST,
+        "ttl_days": dict(RETENTION_TTL_DAYS),
+        "disk_watermarks_percent": [RETENTION_DISK_LOW_PERCENT, RETENTION_DISK_HIGH_PERCENT],
+        "inode_watermarks_percent": [RETENTION_INODE_LOW_PERCENT, RETENTION_INODE_HIGH_PERCENT],
+    }
+
+
+def retention_status() -> Dict[str, Any]:
+    """The policy in force and the report of the last pass in this process."""
+    return {"policy": policy(), "last_report": last_report}
+
+
+def _score(metrics: Dict[str, Any]) -> Optional[float]:
+    # the metric the orchestrator ranks models by
+    for key in ("f1", "r2", "accuracy"):
+        value = metrics.get(key)
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
+
+
+def best_runs(runs: List[Dict[str, Any]], keep: int = RETENTION_KEEP_BEST) -> Set[str]:
+    """The `keep` best-scoring completed runs of each dataset."""
+    by_dataset: Dict[str, List] = {}
+    for run in runs:
+        score = _score(run["metrics"]) if run["status"] == "completed" else None
+        if score is not None:
+            by_dataset.setdefault(run["dataset"] or "", []).append((score, run["created_at"], run["run_id"]))
+    best = set()
+    for ranked in by_dataset.values():
+        ranked.sort(reverse=True)
+        best.update(run_id for _, _, run_id in ranked[:keep])
+    return best
+
+
+class _Freed:
+    """Bytes and inodes a set of deletions gives back, counting each inode once."""
+
+    def __init__(self):
+        self._unlinks: Dict[tuple, int] = {}
+        self.bytes = 0
+        self.inodes = 0
+
+    def add(self, st: os.stat_result, in_store: bool) -> int:
+        key = (st.st_dev, st.st_ino)
+        self._unlinks[key] = self._unlinks.get(key, 0) + 1
+        # the blob's own name goes with gc() once it is the last one left
+        if self._unlinks[key] < st.st_nlink - (1 if in_store else 0):
+            return 0
+        return self.add_dir(st)
+
+    def add_dir(self, st: os.stat_result) -> int:
+        size = getattr(st, "st_blocks", 0) * 512 or st.st_size
+        self.bytes += size
+        self.inodes += 1
+        return size
+
+
+def _stat(path: str) -> Optional[os.stat_result]:
+    try:
+        return os.lstat(path)
+    except OSError:
+        return None
+
+
+class _Plan:
+    def __init__(self, store):
+        self.store = store
+        self.freed = _Freed()
+        self.items: List[Dict[str, Any]] = []
+        self._planned: Set[str] = set()
+
+    def _in_store(self, st: os.stat_result, sha: Optional[str]) -> bool:
+        blob_path = getattr(self.store, "blob_path", None)
+        if blob_path is None or not sha:
+            return False
+        blob = _stat(blob_path(sha))
+        return blob is not None and (blob.st_dev, blob.st_ino) == (st.st_dev, st.st_ino)
+
+    def add_artifact(self, run_id: str, artifact: Dict[str, Any], reason: str):
+        if artifact["path"] in self._planned:
+            return
+        self._planned.add(artifact["path"])
+        freed = 0
+        st = _stat(artifact["path"])
+        if st is not None:
+            freed += self.freed.add(st, self._in_store(st, artifact.get("sha256")))
+        for path in encoded_paths(artifact["path"]):
+            enc = _stat(path)
+            if enc is not None:
+                freed += self.freed.add(enc, False)
+        self.items.append({"type": "artifact", "run_id": run_id, "name": artifact["name"], "path": artifact["path"],
+                           "kind": artifact["kind"], "reason": reason, "bytes": freed})
+
+    def add_dataset(self, run_id: Optional[str], path: str, reason: str):
+        if path in self._planned:
+            return
+        self._planned.add(path)
+        freed = 0
+        st = _stat(path)
+        if st is not None and os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                for name in dirs:
+                    sub = _stat(os.path.join(root, name))
+                    if sub is not None:
+                        freed += self.freed.add_dir(sub)
+                for name in files:
+                    sub = _stat(os.path.join(root, name))
+                    if sub is not None:
+                        # files with more than one name were linked into the store by dedupe_file()
+                        freed += self.freed.add(sub, sub.st_nlink > 1)
+            freed += self.freed.add_dir(st)
+        elif st is not None:
+            freed += self.freed.add(st, st.st_nlink > 1)
+        self.items.append({"type": "dataset", "run_id": run_id, "name": os.path.basename(path), "path": path,
+                           "kind": "dataset", "reason": reason, "bytes": freed})
+
+
+def _expired(kind: str, ts: Optional[float], now: float) -> bool:
+    ttl = RETENTION_TTL_DAYS.get(kind, RETENTION_TTL_DAYS["other"])
+    return ttl > 0 and ts is not None and now - ts > ttl * 86400
+
+
+def _artifact_ts(artifact: Dict[str, Any]) -> Optional[float]:
+    # logs keep growing: their age is the time of the last write
+    if artifact["kind"] == "log":
+        st = _stat(artifact["path"])
+        return st.st_mtime if st is not None else artifact["created_at"]
+    return artifact["created_at"]
+
+
+def _datasets_by_run(known: List[str]) -> Dict[Optional[str], List[str]]:
+    """DATA_DIR entries named after a run; entries that do not look like run output are left alone."""
+    by_run: Dict[Optional[str], List[str]] = {}
+    if not os.path.isdir(storage.DATA_DIR):
+        return by_run
+    with os.scandir(storage.DATA_DIR) as entries:
+        for entry in entries:
+            run_id = storage.run_id_for_file(entry.name, known)
+            if run_id:
+                by_run.setdefault(run_id, []).append(entry.path)
+    return by_run
+
+
+def _above(usage: Dict[str, Any], freed: _Freed, disk: float, inodes: float) -> bool:
+    total = usage["total_gb"] * 1024 ** 3
+    if total and (usage["used_gb"] * 1024 ** 3 - freed.bytes) / total * 100 > disk:
+        return True
+    if usage.get("inodes_total"):
+        used = usage["inodes_total"] - usage["inodes_free"] - freed.inodes
+        return used / usage["inodes_total"] * 100 > inodes
+    return False
+
+
+def _estimate(usage: Dict[str, Any], freed: _Freed) -> Dict[str, Any]:
+    estimate: Dict[str, Any] = {}
+    if usage.get("total_gb"):
+        estimate["percent_used"] = (usage["used_gb"] * 1024 ** 3 - freed.bytes) / (usage["total_gb"] * 1024 ** 3) * 100
+    if usage.get("inodes_total"):
+        estimate["inodes_percent_used"] = (usage["inodes_total"] - usage["inodes_free"] - freed.inodes) / usage["inodes_total"] * 100
+    return estimate
+
+
+def plan_retention(now: Optional[float] = None) -> Dict[str, Any]:
+    """Decide what a retention pass deletes, without deleting anything."""
+    now = now or time.time()
+    store = storage.get_artifact_store()
+    runs = retention_runs()
+    active = {r["run_id"] for r in runs if r["status"] not in TERMINAL_STATUSES}
+    pinned = {r["run_id"] for r in runs if r["pinned"]}
+    recent = {r["run_id"] for r in runs[:RETENTION_KEEP_LAST_RUNS]}
+    best = best_runs(runs)
+    protected = active | pinned | recent
+
+    known = sorted((r["run_id"] for r in runs), key=len, reverse=True)
+    datasets = _datasets_by_run(known)
+    run_ids = {r["run_id"] for r in runs}
+    orphans = [r for r in artifact_run_ids() if r not in run_ids and r not in _SERVICE_RUN_IDS]
+    # deletable runs, oldest first; files of runs that no longer exist go first
+    candidates = orphans + [r["run_id"] for r in reversed(runs) if r["run_id"] not in protected]
+    candidates += [r for r in datasets if r not in run_ids and r not in candidates]
+
+    plan = _Plan(store)
+    artifacts = {run_id: list_run_artifacts(run_id) for run_id in candidates}
+
+    def keeps(run_id: str, artifact: Dict[str, Any]) -> bool:
+        return run_id in best and artifact["kind"] in BEST_RUN_KINDS
+
+    for run_id in sorted(_SERVICE_RUN_IDS):
+        artifacts[run_id] = list_run_artifacts(run_id)
+
+    for run_id in list(artifacts):
+        for artifact in artifacts[run_id]:
+            if not keeps(run_id, artifact) and _expired(artifact["kind"], _artifact_ts(artifact), now):
+                plan.add_artifact(run_id, artifact, f"ttl:{artifact['kind']}")
+        if run_id in _SERVICE_RUN_IDS:
+            continue
+        for path in datasets.get(run_id, []):
+            st = _stat(path)
+            if st is not None and _expired("dataset", st.st_mtime, now):
+                plan.add_dataset(run_id, path, "ttl:dataset")
+
+    usage = storage.get_disk_usage()
+    triggered = "error" not in usage and _above(usage, plan.freed, RETENTION_DISK_HIGH_PERCENT, RETENTION_INODE_HIGH_PERCENT)
+    if triggered:
+        for run_id in candidates:
+            if not _above(usage, plan.freed, RETENTION_DISK_LOW_PERCENT, RETENTION_INODE_LOW_PERCENT):
+                break
+            for artifact in artifacts[run_id]:
+                if not keeps(run_id, artifact):
+                    plan.add_artifact(run_id, artifact, "watermark")
+            for path in datasets.get(run_id, []):
+                plan.add_dataset(run_id, path, "watermark")
+
+    return {
+        "items": plan.items,
+        "freed": plan.freed,
+        "disk": usage,
+        "watermark_triggered": triggered,
+        "protected": {"active": len(active), "pinned": len(pinned), "recent": len(recent), "best": len(best)},
+    }
+
+
+def _delete(items: List[Dict[str, Any]], store) -> List[str]:
+    errors = []
+    names: Dict[str, List[str]] = {}
+    for item in items:
+        if item["type"] == "artifact":
+            names.setdefault(item["run_id"], []).append(item["name"])
+            continue
+        try:
+            if os.path.isdir(item["path"]) and not os.path.islink(item["path"]):
+                shutil.rmtree(item["path"])
+            else:
+                os.remove(item["path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append(f"{item['path']}: {e}")
+    for run_id, run_names in names.items():
+        try:
+            store.delete_run(run_id, run_names)
+        except Exception as e:
+            errors.append(f"{run_id}: {e}")
+    return errors
+
+
+def run_retention(dry_run: bool = False) -> Dict[str, Any]:
+    """One retention pass; returns its report (also kept in `last_report`)."""
+    global last_report
+    with _pass_lock:
+        started = time.time()
+        store = storage.get_artifact_store()
+        plan = plan_retention(started)
+        items = plan["items"]
+        errors = [] if dry_run else _delete(items, store)
+        gc = store.gc(dry_run=dry_run)
+
+        by_reason: Dict[str, int] = {}
+        by_kind: Dict[str, int] = {}
+        for item in items:
+            by_reason[item["reason"]] = by_reason.get(item["reason"], 0) + 1
+            by_kind[item["kind"]] = by_kind.get(item["kind"], 0) + 1
+        report = {
+            "dry_run": dry_run,
+            "started_at": started,
+            "duration_seconds": round(time.time() - started, 3),
+            "policy": policy(),
+            "disk": plan["disk"],
+            "estimated_after": _estimate(plan["disk"], plan["freed"]) if "error" not in plan["disk"] else {},
+            "watermark_triggered": plan["watermark_triggered"],
+            "protected_runs": plan["protected"],
+            "deleted": {
+                "items": len(items),
+                "runs": len({i["run_id"] for i in items if i["run_id"]}),
+                "bytes": plan["freed"].bytes,
+                "inodes": plan["freed"].inodes,
+                "by_reason": by_reason,
+                "by_kind": by_kind,
+            },
+            "gc": gc,
+            "errors": errors,
+            "items": items[:REPORT_MAX_ITEMS],
+            "items_truncated": len(items) > REPORT_MAX_ITEMS,
+        }
+        last_report = report
+        return report
+
+
+def retention_loop(interval: float = RETENTION_INTERVAL):
+    """Background retention: one pass per `interval` seconds across all workers sharing the run store."""
+    while True:
+        time.sleep(min(interval, 300))
+        try:
+            if claim_periodic("retention_last_pass", interval):
+                report = run_retention()
+                if report["deleted"]["items"] or report["errors"]:
+                    agent_log("system", f"Retention: deleted {report['deleted']['items']} items, "
+                              f"{report['deleted']['bytes'] / 1024 ** 2:.1f} MB, {report['deleted']['inodes']} inodes"
+                              + (f"; errors: {report['errors'][:5]}" if report["errors"] else ""), agent="orchestrator")
+        except Exception as e:
+            agent_log("system", f"Retention pass failed: {e}", agent="orchestrator", level="ERROR")
@@ -0,0 +1,158 @@
+# app/retry.py
+"""
+Retry policies for pipeline stages.
+
+Failures are classified as transient (network errors, timeouts, rate limits,
+5xx responses, a crashed stage worker) or permanent (everything else, e.g. a
+pandas parse error, which would fail the same way again). Only transient errors
+are retried, with full-jitter exponential backoff, within the stage's attempt
+limit and deadline and the run's overall retry budget.
+
+Short backoffs are slept inline. Longer ones raise RetryLater: the orchestrator
+gives back the run's executor slot and cores and puts the run back in the queue
+with a not-before time, and it resumes from its checkpoints.
+"""
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+RUN_RETRY_BUDGET = int(os.getenv("RUN_RETRY_BUDGET", "6"))
+RETRY_INLINE_MAX_DELAY = float(os.getenv("RETRY_INLINE_MAX_DELAY", "2"))
+
+TRANSIENT_HTTP_STATUS = {408, 425, 429, 500, 502, 503, 504}
+_TRANSIENT_NAME_HINTS = ("timeout", "ratelimit", "serviceunavailable", "apiconnection", "internalserver", "overloaded")
+_TRANSIENT_MESSAGE_HINTS = ("timed out", "timeout", "rate limit", "temporarily", "connection reset", "connection aborted", "try again")
+
+
+class TransientStageError(RuntimeError):
+    """Raised (or used as __cause__) to mark a failure as worth retrying."""
+
+
+class RetryLater(Exception):
+    """A stage should be retried after `delay` seconds without holding a worker."""
+
+    def __init__(self, stage: str, delay: float, cause: BaseException):
+        super().__init__(f"{stage} will be retried in {delay:.1f}s: {cause}")
+        self.stage = stage
+        self.delay = delay
+        self.cause = cause
+
+
+class RetryPolicy:
+    """Attempt limit, backoff curve and deadline for one stage."""
+
+    def __init__(self, max_attempts: int = 2, base_delay: float = 2.0, max_delay: float = 60.0, deadline: Optional[float] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # seconds from the stage's first failure after which no retry is started
+        self.deadline = deadline
+
+    def backoff(self, failures: int) -> float:
+        """Full-jitter exponential backoff after the `failures`-th failure."""
+        cap = min(self.max_delay, self.base_delay * (2 ** max(0, failures - 1)))
+        return random.uniform(0, cap)
+
+    def __repr__(self):
+        return f"RetryPolicy(max_attempts={self.max_attempts}, base_delay={self.base_delay}, max_delay={self.max_delay}, deadline={self.deadline})"
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy(max_attempts=2, base_delay=2.0, max_delay=30.0)
+
+STAGE_RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    # LLM-bound stages: rate limits and provider hiccups
+    "ps_agent": RetryPolicy(max_attempts=3, base_delay=2.0, max_delay=30.0, deadline=300),
+    "search_queries": RetryPolicy(max_attempts=3, base_delay=2.0, max_delay=30.0, deadline=300),
+    "model_plan": RetryPolicy(max_attempts=2, base_delay=2.0, max_delay=30.0, deadline=300),
+    # dataset search/download: flaky remote APIs, worth waiting for
+    "data_agent": RetryPolicy(max_attempts=4, base_delay=5.0, max_delay=120.0, deadline=1800),
+    # CPU stages: only retried if the stage worker died
+    "prep_agent": RetryPolicy(max_attempts=2, base_delay=1.0, max_delay=10.0),
+    "automl_agent": RetryPolicy(max_attempts=2, base_delay=5.0, max_delay=60.0, deadline=3600),
+    "eval_agent": RetryPolicy(max_attempts=2, base_delay=2.0, max_delay=30.0),
+}
+
+
+def policy_for(stage: str) -> RetryPolicy:
+    return STAGE_RETRY_POLICIES.get(stage, DEFAULT_RETRY_POLICY)
+
+
+def _is_transient(exc: BaseException) -> bool:
+    if isinstance(exc, (TransientStageError, TimeoutError, ConnectionError)):
+        return True
+    try:
+        import requests
+        if isinstance(exc, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+            return True
+    except ImportError:
+        pass
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_HTTP_STATUS
+    # provider SDK errors (openai / anthropic / google) without importing the SDKs
+    name = type(exc).__name__.lower()
+    if any(h in name for h in _TRANSIENT_NAME_HINTS):
+        return True
+    message = str(exc).lower()
+    return any(h in message for h in _TRANSIENT_MESSAGE_HINTS)
+
+
+def classify_error(exc: BaseException) -> str:
+    """
+    'transient' if this error, or one it was explicitly raised from
+    (`raise ... from e`), is worth retrying; else 'permanent'. An error merely
+    raised while another was being handled (__context__) is judged on its own.
+    """
+    seen = set()
+    while exc is not None and id(exc) not in seen:
+        seen.add(id(exc))
+        if _is_transient(exc):
+            return "transient"
+        exc = exc.__cause__
+    return "permanent"
+
+
+class RetryTracker:
+    """
+    Failure history of one run's stages, kept in state["retries"] so attempt
+    counts, deadlines and the run budget survive a requeue.
+    """
+
+    def __init__(self, saved: Optional[Dict[str, Any]] = None, budget: int = RUN_RETRY_BUDGET):
+        self.stages: Dict[str, Dict[str, Any]] = {k: dict(v) for k, v in (saved or {}).items() if isinstance(v, dict)}
+        self.budget = budget
+        self._lock = threading.Lock()
+
+    def retries_used(self) -> int:
+        return sum(max(0, s.get("failures", 0)) for s in self.stages.values())
+
+    def next_delay(self, stage: str, exc: BaseException) -> Dict[str, Any]:
+        """
+        Record a failure of `stage` and decide what to do with it.
+        Returns {"retry": bool, "delay": seconds, "reason": str, "kind": ...}.
+        """
+        policy = policy_for(stage)
+        kind = classify_error(exc)
+        now = time.time()
+        with self._lock:
+            used = self.retries_used()
+            info = self.stages.setdefault(stage, {"failures": 0, "first_failure_at": now})
+            info["failures"] += 1
+            info["last_error"] = str(exc)[:300]
+            info["kind"] = kind
+            if kind == "permanent":
+                return {"retry": False, "kind": kind, "reason": "permanent error"}
+            if info["failures"] >= policy.max_attempts:
+                return {"retry": False, "kind": kind, "reason": f"{policy.max_attempts} attempts used"}
+            if used >= self.budget:
+                return {"retry": False, "kind": kind, "reason": f"run retry budget of {self.budget} used"}
+            delay = policy.backoff(info["failures"])
+            if policy.deadline is not None and now + delay - info["first_failure_at"] > policy.deadline:
+                return {"retry": False, "kind": kind, "reason": f"deadline of {policy.deadline}s passed"}
+            return {"retry": True, "kind": kind, "delay": delay, "reason": f"attempt {info['failures'] + 1}/{policy.max_attempts}"}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {k: dict(v) for k, v in self.stages.items()}
@@ -0,0 +1,813 @@
+# app/run_store.py
+"""
+SQLite-backed run store.
+
+Each thread keeps one long-lived connection (per database path and process)
+instead of opening a new connection for every statement. The database runs in
+WAL mode so status reads never block on the orchestrator's writes.
+
+Run state is stored as a base document (runs.state_json) plus an append-only
+run_events table of small patches. update_run_state() appends a patch; read_run()
+merges the patches over the base on demand. When a run reaches a terminal status
+the merged state is folded back into state_json so later reads skip the merge.
+"""
+import os
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.events import notify
+
+DB_PATH = os.getenv("DB_PATH", "runs.db")
+
+# Connection settings applied to every pooled connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))
+
+_local = threading.local()
+_all_conns: List[sqlite3.Connection] = []
+_all_conns_lock = threading.Lock()
+_generation = 0
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+# ----------------------
+# Connection pool
+# ----------------------
+def _open(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # NORMAL is durable across application crashes in WAL mode; only an OS crash
+    # can lose the last few commits, which the lease/recovery logic tolerates.
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA foreign_keys=ON")
+    with _all_conns_lock:
+        _all_conns.append(conn)
+    return conn
+
+
+def get_conn(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Return this thread's connection to the run DB, opening it on first use.
+    Connections are never shared across processes: a forked child reconnects.
+    """
+    path = path or DB_PATH
+    conns = getattr(_local, "conns", None)
+    if conns is None or getattr(_local, "key", None) != (os.getpid(), _generation):
+        conns = _local.conns = {}
+        _local.key = (os.getpid(), _generation)
+    conn = conns.get(path)
+    if conn is None:
+        conn = conns[path] = _open(path)
+    return conn
+
+
+@contextmanager
+def transaction(path: Optional[str] = None):
+    """Run several statements atomically on this thread's connection."""
+    conn = get_conn(path)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    else:
+        conn.execute("COMMIT")
+
+
+def close_all():
+    """Close every pooled connection (used on shutdown and in benchmarks)."""
+    global _generation
+    with _all_conns_lock:
+        conns = list(_all_conns)
+        _all_conns.clear()
+        # threads holding a closed connection reopen on their next get_conn()
+        _generation += 1
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+# ----------------------
+# Schema
+# ----------------------
+# bump when init_db() gains a migration step
+SCHEMA_VERSION = 1
+
+# meta key of artifact_generation()
+ARTIFACT_GENERATION_KEY = "artifact_generation"
+
+# columns added to runs after the first release, migrated by init_db()
+_RUN_COLUMNS = (
+    ("worker_id", "TEXT"),
+    ("lease_expires", "REAL"),
+    ("state_version", "INTEGER DEFAULT 0"),
+    ("state_seq", "INTEGER DEFAULT 0"),
+    ("priority", "INTEGER DEFAULT 1"),
+    ("user_key", "TEXT"),
+    ("not_before", "REAL"),
+    ("pinned", "INTEGER DEFAULT 0"),
+    ("finished_at", "REAL"),
+    ("best_model", "TEXT"),
+    ("dataset_source", "TEXT"),
+    ("metrics_json", "TEXT"),
+)
+
+
+def init_db(path: Optional[str] = None):
+    conn = get_conn(path)
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            created_at REAL,
+            status TEXT,
+            last_error TEXT,
+            state_json TEXT,
+            worker_id TEXT,
+            lease_expires REAL,
+            state_version INTEGER DEFAULT 0,
+            state_seq INTEGER DEFAULT 0,
+            priority INTEGER DEFAULT 1,
+            user_key TEXT,
+            not_before REAL,
+            pinned INTEGER DEFAULT 0,
+            finished_at REAL,
+            best_model TEXT,
+            dataset_source TEXT,
+            metrics_json TEXT
+        )"""
+    )
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS run_events (
+            run_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ts REAL,
+            status TEXT,
+            patch_json TEXT,
+            PRIMARY KEY (run_id, seq)
+        ) WITHOUT ROWID"""
+    )
+    # artifact manifest: listing a run's files is a primary-key range scan
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS artifacts (
+            run_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER,
+            sha256 TEXT,
+            content_type TEXT,
+            kind TEXT,
+            created_at REAL,
+            PRIMARY KEY (run_id, name)
+        ) WITHOUT ROWID"""
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    # index of structured run events (stage timings, retries, failures); the full
+    # record stream, log lines included, lives in artifacts/<run_id>_events.jsonl
+    conn.execute(
+        """CREATE TABLE IF NOT EXISTS event_index (
+            run_id TEXT NOT NULL,
+            ts REAL NOT NULL,
+            agent TEXT,
+            stage TEXT,
+            event TEXT NOT NULL,
+            level TEXT,
+            duration REAL,
+            payload_json TEXT
+        )"""
+    )
+    _migrate(conn, path)
+    # /runs pages newest first by (created_at, run_id), optionally filtered by one column
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_created_id ON runs(created_at, run_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_status_created_id ON runs(status, created_at, run_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_user_created_id ON runs(user_key, created_at, run_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_source_created_id ON runs(dataset_source, created_at, run_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_model_created_id ON runs(best_model, created_at, run_id)")
+    # /artifacts/{fname} looks artifacts up by file name alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_artifacts_name ON artifacts(name)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_index_event_stage ON event_index(event, stage, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_event_index_run ON event_index(run_id, ts)")
+
+
+def _migrate(conn: sqlite3.Connection, path: Optional[str]):
+    """
+    Bring a database created by an older version up to SCHEMA_VERSION, in one
+    transaction: a failure leaves it untouched and the next start retries.
+    """
+    with transaction(path):
+        row = conn.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone()
+        if row is not None and int(row[0]) >= SCHEMA_VERSION:
+            return
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(runs)")}
+        for col, decl in _RUN_COLUMNS:
+            if col not in cols:
+                conn.execute(f"ALTER TABLE runs ADD COLUMN {col} {decl}")
+        # summary columns of runs that finished before they existed
+        conn.execute(
+            """UPDATE runs SET best_model=json_extract(state_json, '$.best_model'),
+                   dataset_source=json_extract(state_json, '$.dataset_source'),
+                   metrics_json=json_extract(state_json, '$.metrics'),
+                   finished_at=COALESCE((SELECT MAX(ts) FROM run_events e WHERE e.run_id=runs.run_id), created_at)
+               WHERE status IN ('completed', 'failed') AND finished_at IS NULL"""
+        )
+        # superseded by the (..., created_at, run_id) indexes
+        conn.execute("DROP INDEX IF EXISTS idx_runs_created")
+        conn.execute("DROP INDEX IF EXISTS idx_runs_status_created")
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),)
+        )
+
+
+# ----------------------
+# State patches
+# ----------------------
+def merge_state(base: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """Recursively merge `patch` into `base` (in place) and return it."""
+    for key, value in patch.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_state(base[key], value)
+        else:
+            base[key] = value
+    return base
+
+
+def _materialize(conn: sqlite3.Connection, run_id: str, state_json: Optional[str], state_seq: int) -> Dict[str, Any]:
+    state = json.loads(state_json or "{}")
+    rows = conn.execute(
+        "SELECT patch_json FROM run_events WHERE run_id=? AND seq>? ORDER BY seq",
+        (run_id, state_seq or 0),
+    ).fetchall()
+    for (patch_json,) in rows:
+        merge_state(state, json.loads(patch_json or "{}"))
+    return state
+
+
+# ----------------------
+# Run helpers
+# ----------------------
+def write_run_db(
+    run_id: str,
+    status: str,
+    state: Optional[Dict[str, Any]] = None,
+    priority: int = 1,
+    user_key: Optional[str] = None,
+):
+    """Create (or reset) a run with `state` as its base document."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM run_events WHERE run_id=?", (run_id,))
+        conn.execute(
+            """INSERT OR REPLACE INTO runs
+               (run_id, created_at, status, last_error, state_json, state_version, state_seq, priority, user_key)
+               VALUES (?,?,?,?,?,0,0,?,?)""",
+            (run_id, time.time(), status, "", json.dumps(state or {}), priority, user_key),
+        )
+    notify(run_id, state_changed=True)
+
+
+def update_run_state(run_id: str, status: str, state: Optional[Dict[str, Any]] = None, last_error: Optional[str] = None) -> int:
+    """
+    Set the run's status and append `state` as a patch over its current state.
+    Earlier fields are kept unless the patch overwrites them.
+    Returns the new state version (0 if the run does not exist).
+    """
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE runs SET status=?, last_error=?, state_version=state_version+1 WHERE run_id=?",
+            (status, last_error or "", run_id),
+        )
+        if cur.rowcount != 1:
+            return 0
+        seq = _append_event(conn, run_id, status, state)
+    notify(run_id, state_changed=True)
+    return seq
+
+
+def _summary(state: Dict[str, Any]) -> tuple:
+    """
+    (best_model, dataset_source, metrics_json) of a finished run: pulled out of
+    its folded state into columns so that listing and filtering runs never
+    parses state_json.
+    """
+    best_model, source, metrics = state.get("best_model"), state.get("dataset_source"), state.get("metrics")
+    return (
+        best_model if isinstance(best_model, str) else None,
+        source if isinstance(source, str) else None,
+        json.dumps(metrics, default=str) if isinstance(metrics, dict) else None,
+    )
+
+
+def _append_event(conn: sqlite3.Connection, run_id: str, status: str, state: Optional[Dict[str, Any]]) -> int:
+    """Record the patch for the state_version just bumped on `run_id` (inside a transaction)."""
+    seq = conn.execute("SELECT state_version FROM runs WHERE run_id=?", (run_id,)).fetchone()[0]
+    conn.execute(
+        "INSERT INTO run_events (run_id, seq, ts, status, patch_json) VALUES (?,?,?,?,?)",
+        (run_id, seq, time.time(), status, json.dumps(state or {}, default=str)),
+    )
+    if status in TERMINAL_STATUSES:
+        # fold the history into the base document; events stay for the timeline
+        row = conn.execute("SELECT state_json, state_seq FROM runs WHERE run_id=?", (run_id,)).fetchone()
+        merged = _materialize(conn, run_id, row[0], row[1])
+        conn.execute(
+            "UPDATE runs SET state_json=?, state_seq=?, finished_at=?, best_model=?, dataset_source=?, metrics_json=? WHERE run_id=?",
+            (json.dumps(merged, default=str), seq, time.time(), *_summary(merged), run_id),
+        )
+    return seq
+
+
+def read_run(run_id: str):
+    conn = get_conn()
+    row = conn.execute(
+        "SELECT run_id, created_at, status, last_error, state_json, state_seq, state_version FROM runs WHERE run_id=?",
+        (run_id,),
+    ).fetchone()
+    if not row:
+        return None
+    return {
+        "run_id": row[0],
+        "created_at": row[1],
+        "status": row[2],
+        "last_error": row[3],
+        "state": _materialize(conn, row[0], row[4], row[5]),
+        "state_version": row[6] or 0,
+    }
+
+
+def read_run_version(run_id: str) -> Optional[Tuple[str, int]]:
+    """(status, state_version) without merging any state; None if the run does not exist."""
+    row = get_conn().execute("SELECT status, state_version FROM runs WHERE run_id=?", (run_id,)).fetchone()
+    return (row[0], row[1] or 0) if row else None
+
+
+def read_run_status(run_id: str) -> Optional[str]:
+    """Just the status column (no state merge); None if the run does not exist."""
+    row = get_conn().execute("SELECT status FROM runs WHERE run_id=?", (run_id,)).fetchone()
+    return row[0] if row else None
+
+
+def read_run_events(run_id: str, after_seq: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """State patches appended after `after_seq`, oldest first (the run's phase history)."""
+    rows = get_conn().execute(
+        "SELECT seq, ts, status, patch_json FROM run_events WHERE run_id=? AND seq>? ORDER BY seq LIMIT ?",
+        (run_id, after_seq, limit if limit is not None else -1),
+    ).fetchall()
+    return [{"seq": r[0], "ts": r[1], "status": r[2], "patch": json.loads(r[3] or "{}")} for r in rows]
+
+
+def fetch_queued_runs(limit: Optional[int] = 10):
+    rows = get_conn().execute(
+        "SELECT run_id, state_json FROM runs WHERE status='queued' ORDER BY created_at ASC LIMIT ?",
+        (limit if limit is not None else -1,),
+    ).fetchall()
+    out = []
+    for r in rows:
+        try:
+            state = json.loads(r[1] or "{}")
+        except Exception:
+            state = {}
+        out.append((r[0], state))
+    return out
+
+
+def fetch_claimable_runs(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Runs that a worker may claim: queued runs and running runs whose lease expired,
+    with the scheduling fields needed to re-enqueue them.
+    Both branches of the OR are served by the (status, created_at) index.
+    """
+    now = time.time()
+    rows = get_conn().execute(
+        """SELECT run_id, created_at, priority, user_key, not_before FROM runs WHERE status='queued'
+           UNION ALL
+           SELECT run_id, created_at, priority, user_key, NULL FROM runs WHERE status='running' AND lease_expires < ?
+           ORDER BY created_at ASC LIMIT ?""",
+        (now, limit if limit is not None else -1),
+    ).fetchall()
+    return [
+        {
+            "run_id": r[0],
+            "created_at": r[1],
+            "priority": 1 if r[2] is None else r[2],
+            "user_key": r[3] or "anonymous",
+            # a queued run backing off after a transient failure is not claimable before this
+            "not_before": r[4],
+        }
+        for r in rows
+    ]
+
+
+def claim_run(run_id: str, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Atomically claim a run with a single conditional UPDATE.
+    Succeeds only if the run is still queued (and past its not_before time), or
+    running under an expired lease (its worker died). Exactly one worker wins
+    when several race for the same run.
+    """
+    now = time.time()
+    cur = get_conn().execute(
+        """UPDATE runs SET status='running', worker_id=?, lease_expires=?, not_before=NULL
+           WHERE run_id=? AND ((status='queued' AND (not_before IS NULL OR not_before <= ?))
+                               OR (status='running' AND lease_expires < ?))""",
+        (worker_id, now + lease_seconds, run_id, now, now),
+    )
+    return cur.rowcount == 1
+
+
+def renew_lease(run_id: str, worker_id: str, lease_seconds: float) -> bool:
+    """
+    Extend the lease on a run we own. Returns False if the run is no longer ours.
+    """
+    cur = get_conn().execute(
+        "UPDATE runs SET lease_expires=? WHERE run_id=? AND worker_id=? AND status='running'",
+        (time.time() + lease_seconds, run_id, worker_id),
+    )
+    return cur.rowcount == 1
+
+
+def requeue_run(run_id: str, state: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Put a failed run, or a running run whose lease expired, back to 'queued'
+    and append `state` as a patch. Its checkpoints are kept so it resumes.
+    Returns the new state version, or 0 if the run is not in a retryable state.
+    """
+    with transaction() as conn:
+        cur = conn.execute(
+            """UPDATE runs SET status='queued', last_error='', worker_id=NULL, lease_expires=NULL,
+                   not_before=NULL, finished_at=NULL, state_version=state_version+1
+               WHERE run_id=? AND (status='failed' OR (status='running' AND lease_expires < ?))""",
+            (run_id, time.time()),
+        )
+        if cur.rowcount != 1:
+            return 0
+        seq = _append_event(conn, run_id, "queued", state)
+    notify(run_id, state_changed=True)
+    return seq
+
+
+def defer_run(run_id: str, worker_id: str, not_before: float, state: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Give a run we own back to the queue, claimable again from `not_before`
+    (backoff after a transient failure). Returns the new state version, or 0 if
+    the run is no longer ours.
+    """
+    with transaction() as conn:
+        cur = conn.execute(
+            """UPDATE runs SET status='queued', worker_id=NULL, lease_expires=NULL, not_before=?,
+                   state_version=state_version+1
+               WHERE run_id=? AND worker_id=? AND status='running'""",
+            (not_before, run_id, worker_id),
+        )
+        if cur.rowcount != 1:
+            return 0
+        seq = _append_event(conn, run_id, "queued", state)
+    notify(run_id, state_changed=True)
+    return seq
+
+
+def release_worker_runs(worker_id: str, state: Optional[Dict[str, Any]] = None) -> List[str]:
+    """
+    Requeue runs left 'running' under `worker_id` by a previous incarnation of this
+    worker. Only safe at startup, before this worker has claimed anything.
+    """
+    with transaction() as conn:
+        run_ids = [
+            r[0]
+            for r in conn.execute(
+                "SELECT run_id FROM runs WHERE status='running' AND worker_id=?", (worker_id,)
+            ).fetchall()
+        ]
+        for run_id in run_ids:
+            conn.execute(
+                """UPDATE runs SET status='queued', worker_id=NULL, lease_expires=NULL,
+                       state_version=state_version+1 WHERE run_id=?""",
+                (run_id,),
+            )
+            _append_event(conn, run_id, "queued", state)
+    return run_ids
+
+
+def record_artifact(
+    run_id: str,
+    name: str,
+    path: str,
+    size: Optional[int] = None,
+    sha256: Optional[str] = None,
+    content_type: Optional[str] = None,
+    kind: Optional[str] = None,
+):
+    get_conn().execute(
+        """INSERT OR REPLACE INTO artifacts (run_id, name, path, size, sha256, content_type, kind, created_at)
+           VALUES (?,?,?,?,?,?,?,?)""",
+        (run_id, name, path, size, sha256, content_type, kind, time.time()),
+    )
+
+
+def list_run_artifacts(run_id: str) -> List[Dict[str, Any]]:
+    rows = get_conn().execute(
+        """SELECT name, path, size, sha256, content_type, kind, created_at
+           FROM artifacts WHERE run_id=? ORDER BY name""",
+        (run_id,),
+    ).fetchall()
+    keys = ("name", "path", "size", "sha256", "content_type", "kind", "created_at")
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def find_artifact(name: str) -> Optional[Dict[str, Any]]:
+    """Manifest row of the artifact stored under file name `name`, if any."""
+    row = get_conn().execute(
+        """SELECT run_id, name, path, size, sha256, content_type, kind, created_at
+           FROM artifacts WHERE name=? LIMIT 1""",
+        (name,),
+    ).fetchone()
+    if not row:
+        return None
+    return dict(zip(("run_id", "name", "path", "size", "sha256", "content_type", "kind", "created_at"), row))
+
+
+def find_artifact_by_path(path: str) -> Optional[Dict[str, Any]]:
+    rows = get_conn().execute(
+        """SELECT run_id, name, path, size, sha256, content_type, kind, created_at
+           FROM artifacts WHERE name=?""",
+        (os.path.basename(path),),
+    ).fetchall()
+    for row in rows:
+        if row[2] == path:
+            return dict(zip(("run_id", "name", "path", "size", "sha256", "content_type", "kind", "created_at"), row))
+    return None
+
+
+def artifact_blob_refs() -> set:
+    """Checksums of every artifact in the manifest (blobs still referenced)."""
+    return {r[0] for r in get_conn().execute("SELECT DISTINCT sha256 FROM artifacts WHERE sha256 IS NOT NULL")}
+
+
+def delete_artifact_records(run_id: str, names: Optional[List[str]] = None):
+    """Drop manifest rows of a run (all of them, or just `names`) and bump the artifact generation."""
+    with transaction() as conn:
+        if names is None:
+            conn.execute("DELETE FROM artifacts WHERE run_id=?", (run_id,))
+        else:
+            conn.executemany("DELETE FROM artifacts WHERE run_id=? AND name=?", [(run_id, n) for n in names])
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, '0')", (ARTIFACT_GENERATION_KEY,))
+        conn.execute("UPDATE meta SET value=CAST(value AS INTEGER) + 1 WHERE key=?", (ARTIFACT_GENERATION_KEY,))
+    notify(run_id, state_changed=True)
+
+
+def artifact_generation() -> int:
+    """Counter bumped whenever manifest rows are deleted, for caches of finished runs in any process."""
+    return int(get_meta(ARTIFACT_GENERATION_KEY) or 0)
+
+
+def get_meta(key: str) -> Optional[str]:
+    row = get_conn().execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_meta(key: str, value: str):
+    get_conn().execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?,?)", (key, value))
+
+
+def all_run_ids() -> List[str]:
+    return [r[0] for r in get_conn().execute("SELECT run_id FROM runs")]
+
+
+def artifact_run_ids() -> List[str]:
+    """Every run id with files in the manifest, including ids the runs table does not know."""
+    return [r[0] for r in get_conn().execute("SELECT DISTINCT run_id FROM artifacts")]
+
+
+def claim_periodic(key: str, interval: float) -> bool:
+    """
+    True for exactly one caller per `interval` seconds across processes sharing
+    the database (the timestamp of the last claim is kept in meta).
+    """
+    now = time.time()
+    with transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, '0')", (key,))
+        cur = conn.execute(
+            "UPDATE meta SET value=? WHERE key=? AND CAST(value AS REAL) <= ?",
+            (repr(now), key, now - interval),
+        )
+        return cur.rowcount == 1
+
+
+# ----------------------
+# Retention
+# ----------------------
+def set_run_pinned(run_id: str, pinned: bool) -> bool:
+    """Pin (or unpin) a run so retention never deletes its files. False if the run does not exist."""
+    cur = get_conn().execute("UPDATE runs SET pinned=? WHERE run_id=?", (1 if pinned else 0, run_id))
+    return cur.rowcount == 1
+
+
+def retention_runs() -> List[Dict[str, Any]]:
+    """
+    All runs, newest first, with what retention decides on: status, pin, and
+    for finished runs the metrics and dataset from their folded state.
+    """
+    rows = get_conn().execute(
+        """SELECT run_id, created_at, status, pinned, metrics_json,
+                  CASE WHEN status IN ('completed', 'failed') THEN json_extract(state_json, '$.dataset_source_name') END
+           FROM runs ORDER BY created_at DESC"""
+    ).fetchall()
+    return [
+        {
+            "run_id": r[0],
+            "created_at": r[1] or 0,
+            "status": r[2],
+            "pinned": bool(r[3]),
+            "metrics": json.loads(r[4]) if r[4] else {},
+            "dataset": r[5],
+        }
+        for r in rows
+    ]
+
+
+# ----------------------
+# Event index
+# ----------------------
+_EVENT_COLUMNS = ("run_id", "ts", "agent", "stage", "event", "level", "duration")
+
+
+def index_events(records: List[Dict[str, Any]]):
+    """Insert structured event records (see run_logger.log_event) in one transaction."""
+    rows = [
+        tuple(r.get(c) for c in _EVENT_COLUMNS) + (json.dumps(r["payload"], default=str) if r.get("payload") else None,)
+        for r in records
+    ]
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO event_index (run_id, ts, agent, stage, event, level, duration, payload_json) VALUES (?,?,?,?,?,?,?,?)",
+            rows,
+        )
+
+
+def query_events(
+    run_id: Optional[str] = None,
+    stage: Optional[str] = None,
+    event: Optional[str] = None,
+    level: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Indexed events matching every given filter, newest first."""
+    where, args = [], []
+    for col, value in (("run_id", run_id), ("stage", stage), ("event", event), ("level", level)):
+        if value is not None:
+            where.append(f"{col}=?")
+            args.append(value)
+    if since is not None:
+        where.append("ts>=?")
+        args.append(since)
+    if until is not None:
+        where.append("ts<?")
+        args.append(until)
+    sql = "SELECT run_id, ts, agent, stage, event, level, duration, payload_json FROM event_index"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    rows = get_conn().execute(sql + " ORDER BY ts DESC LIMIT ?", args + [limit]).fetchall()
+    return [
+        dict(zip(_EVENT_COLUMNS, r[:7]), payload=json.loads(r[7]) if r[7] else {})
+        for r in rows
+    ]
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    k = (len(values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(values) - 1)
+    return round(values[lo] + (values[hi] - values[lo]) * (k - lo), 3)
+
+
+def stage_stats(last_runs: Optional[int] = 1000, since: Optional[float] = None, stage: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Per-stage latency and failure summary over the `last_runs` most recent runs
+    (and/or events since `since`): executions, failures, mean / p50 / p95 / max seconds.
+    """
+    where, args = ["e.event IN ('stage_end', 'stage_failed')"], []
+    if stage is not None:
+        where.append("e.stage=?")
+        args.append(stage)
+    if since is not None:
+        where.append("e.ts>=?")
+        args.append(since)
+    sql = "SELECT e.stage, e.event, e.duration, e.run_id FROM event_index e"
+    if last_runs:
+        # walk the recent runs and look their events up by run, rather than
+        # scanning every stage event ever recorded (CROSS JOIN fixes the order)
+        sql = (
+            "SELECT e.stage, e.event, e.duration, e.run_id"
+            " FROM (SELECT run_id FROM runs ORDER BY created_at DESC LIMIT ?) r"
+            " CROSS JOIN event_index e ON e.run_id = r.run_id"
+        )
+        args.insert(0, last_runs)
+    rows = get_conn().execute(sql + " WHERE " + " AND ".join(where), args).fetchall()
+    by_stage: Dict[str, Dict[str, Any]] = {}
+    for name, event, duration, rid in rows:
+        s = by_stage.setdefault(name, {"durations": [], "failures": 0, "runs": set()})
+        s["runs"].add(rid)
+        if event == "stage_failed":
+            s["failures"] += 1
+        elif duration is not None:
+            s["durations"].append(duration)
+    stats = {}
+    for name, s in sorted(by_stage.items(), key=lambda kv: str(kv[0])):
+        d = sorted(s["durations"])
+        stats[name] = {
+            "runs": len(s["runs"]),
+            "completed": len(d),
+            "failures": s["failures"],
+            "mean_seconds": round(sum(d) / len(d), 3) if d else None,
+            "p50_seconds": _percentile(d, 0.5),
+            "p95_seconds": _percentile(d, 0.95),
+            "max_seconds": round(d[-1], 3) if d else None,
+        }
+    return stats
+
+
+# ----------------------
+# Run listing
+# ----------------------
+# optional summary fields of list_runs -> the columns they are read from
+RUN_LIST_FIELDS = {
+    "metrics": "metrics_json",
+    "best_model": "best_model",
+    "dataset_source": "dataset_source",
+    "duration": "finished_at - created_at",
+    "finished_at": "finished_at",
+    "user": "user_key",
+    "priority": "priority",
+    "pinned": "pinned",
+    "last_error": "last_error",
+}
+# filters of list_runs -> the indexed column they match
+RUN_LIST_FILTERS = {"status": "status", "user": "user_key", "dataset_source": "dataset_source", "best_model": "best_model"}
+
+
+def format_run_cursor(created_at: float, run_id: str) -> str:
+    return f"{created_at!r}:{run_id}"
+
+
+def parse_run_cursor(cursor: str) -> tuple:
+    """'<created_at>:<run_id>' -> (created_at, run_id); ValueError if malformed."""
+    created_at, sep, run_id = cursor.partition(":")
+    if not sep or not run_id:
+        raise ValueError(f"invalid cursor {cursor!r}")
+    return float(created_at), run_id
+
+
+def list_runs(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    **filters: Optional[str],
+) -> Dict[str, Any]:
+    """
+    One page of runs, newest first, with keyset pagination: pass the returned
+    next_cursor to get the following page (None on the last one). `filters`
+    (status, user, dataset_source, best_model) match exactly; each is served by
+    a (column, created_at, run_id) index. `fields` adds RUN_LIST_FIELDS to
+    run_id, created_at and status.
+    """
+    fields = [f for f in (fields or []) if f in RUN_LIST_FIELDS]
+    unknown = set(filters) - set(RUN_LIST_FILTERS)
+    if unknown:
+        raise ValueError(f"unknown filters: {sorted(unknown)}")
+    where, args = [], []
+    for name, value in filters.items():
+        if value is not None:
+            where.append(f"{RUN_LIST_FILTERS[name]}=?")
+            args.append(value)
+    if cursor:
+        where.append("(created_at, run_id) < (?, ?)")
+        args.extend(parse_run_cursor(cursor))
+    columns = ["run_id", "created_at", "status"] + [RUN_LIST_FIELDS[f] for f in fields]
+    rows = get_conn().execute(
+        f"SELECT {', '.join(columns)} FROM runs"
+        + (f" WHERE {' AND '.join(where)}" if where else "")
+        + " ORDER BY created_at DESC, run_id DESC LIMIT ?",
+        (*args, limit + 1),
+    ).fetchall()
+    runs = []
+    for r in rows[:limit]:
+        run = {"run_id": r[0], "created_at": r[1], "status": r[2]}
+        for name, value in zip(fields, r[3:]):
+            if name == "metrics":
+                value = json.loads(value) if value else None
+            elif name == "pinned":
+                value = bool(value)
+            run[name] = value
+        runs.append(run)
+    next_cursor = format_run_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    return {"runs": runs, "next_cursor": next_cursor}
@@ -0,0 +1,238 @@
+# app/scheduler.py
+"""
+CPU-aware admission control for concurrent runs.
+
+Every dispatched run is granted an explicit core budget. The budget is passed to
+FLAML as n_jobs and to the BLAS/OpenMP thread pools, so concurrent runs no longer
+all try to use every core. A run is only claimed once its cores are free; until
+then it stays 'queued' in the DB.
+
+Queued runs wait in a FairShareQueue: higher priority classes go first, and
+within a class the user with the fewest runs in flight goes first, so one user
+submitting a batch of runs cannot block everyone else. Waiting runs are aged
+up one class every PRIORITY_AGING_SECONDS so low-priority work still finishes.
+"""
+import os
+import math
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+TOTAL_CORES = int(os.getenv("SCHEDULER_CORES", str(os.cpu_count() or 1)))
+_default_per_run = max(1, TOTAL_CORES // max(1, int(os.getenv("THREAD_POOL_SIZE", "2"))))
+CORES_PER_RUN = max(1, min(TOTAL_CORES, int(os.getenv("CORES_PER_RUN", str(_default_per_run)))))
+
+# Priority classes: lower value is served first
+PRIORITY_CLASSES = {"high": 0, "normal": 1, "low": 2}
+DEFAULT_PRIORITY = PRIORITY_CLASSES["normal"]
+PRIORITY_AGING_SECONDS = float(os.getenv("PRIORITY_AGING_SECONDS", "300"))
+
+
+class CoreScheduler:
+    """Counts cores handed out to running runs and blocks admission when none are free."""
+
+    def __init__(self, total_cores: int = TOTAL_CORES, cores_per_run: int = CORES_PER_RUN):
+        self.total_cores = max(1, total_cores)
+        self.cores_per_run = max(1, min(cores_per_run, self.total_cores))
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, cores: Optional[int] = None, timeout: Optional[float] = None) -> int:
+        """
+        Block until `cores` (default: the per-run budget) are free, then reserve them.
+        Returns the number of cores granted, or 0 on timeout.
+        """
+        cores = max(1, min(cores or self.cores_per_run, self.total_cores))
+        with self._cond:
+            ok = self._cond.wait_for(lambda: self._in_use + cores <= self.total_cores, timeout=timeout)
+            if not ok:
+                return 0
+            self._in_use += cores
+            return cores
+
+    def release(self, cores: int):
+        with self._cond:
+            self._in_use = max(0, self._in_use - cores)
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "total_cores": self.total_cores,
+                "cores_per_run": self.cores_per_run,
+                "cores_in_use": self._in_use,
+                "cores_free": self.total_cores - self._in_use,
+            }
+
+
+def parse_priority(value: Any) -> int:
+    """Map 'high' / 'normal' / 'low' (or 0-2) to a priority class; anything else is normal."""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in PRIORITY_CLASSES:
+            return PRIORITY_CLASSES[value]
+    try:
+        return max(0, min(int(value), max(PRIORITY_CLASSES.values())))
+    except (TypeError, ValueError):
+        return DEFAULT_PRIORITY
+
+
+def run_priority(user: Optional[Dict[str, Any]], preferences: Optional[Dict[str, Any]]) -> Tuple[int, str]:
+    """
+    Priority class and fair-share key for a run request.
+    preferences["priority"] wins over user["priority"]; the user key is the first
+    of user id / name / email, or 'anonymous'.
+    """
+    user = user or {}
+    preferences = preferences or {}
+    priority = parse_priority(preferences.get("priority", user.get("priority")))
+    user_key = next((str(user[k]) for k in ("id", "name", "email") if user.get(k)), "anonymous")
+    return priority, user_key
+
+
+class FairShareQueue:
+    """
+    In-process queue of run ids ordered by (aged priority, user's runs in flight, enqueue time).
+    get() picks the best entry at the moment capacity is available, not when it was put.
+    An entry with a not_before time (a run backing off) is held until then.
+    """
+
+    def __init__(self, aging_seconds: float = PRIORITY_AGING_SECONDS, concurrency: int = 1):
+        self.aging_seconds = aging_seconds
+        self.concurrency = max(1, concurrency)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._running: Dict[str, int] = {}
+        self._avg_run_seconds: Optional[float] = None
+        self._cond = threading.Condition()
+
+    def put(
+        self,
+        run_id: str,
+        priority: int = DEFAULT_PRIORITY,
+        user_key: str = "anonymous",
+        enqueued_at: Optional[float] = None,
+        not_before: Optional[float] = None,
+    ):
+        """Add a run; putting a run that is already queued is a no-op (recovery re-enqueues)."""
+        with self._cond:
+            if run_id in self._entries:
+                return
+            self._entries[run_id] = {
+                "run_id": run_id,
+                "priority": priority,
+                "user_key": user_key,
+                "enqueued_at": enqueued_at or time.time(),
+                "not_before": not_before,
+            }
+            self._cond.notify_all()
+
+    def _sort_key(self, entry: Dict[str, Any], now: float):
+        waited = now - entry["enqueued_at"]
+        aged = entry["priority"] - (waited / self.aging_seconds if self.aging_seconds > 0 else 0)
+        return (math.floor(aged), self._running.get(entry["user_key"], 0), entry["enqueued_at"])
+
+    def _ordered(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        return sorted(self._entries.values(), key=lambda e: self._sort_key(e, now))
+
+    def _due(self, now: float) -> List[Dict[str, Any]]:
+        return [e for e in self._entries.values() if not e["not_before"] or e["not_before"] <= now]
+
+    def _wait_due(self, timeout: Optional[float]) -> bool:
+        # called with the lock held; sleeps until an entry is due, a put() or the timeout
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            now = time.time()
+            if self._due(now):
+                return True
+            waits = [e["not_before"] - now for e in self._entries.values()]
+            if deadline is not None:
+                if now >= deadline:
+                    return False
+                waits.append(deadline - now)
+            self._cond.wait(min(waits) if waits else None)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until at least one run is queued and due."""
+        with self._cond:
+            return self._wait_due(timeout)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Remove and return the due entry that should run next, or None on timeout."""
+        with self._cond:
+            if not self._wait_due(timeout):
+                return None
+            now = time.time()
+            entry = min(self._due(now), key=lambda e: self._sort_key(e, now))
+            del self._entries[entry["run_id"]]
+            return entry
+
+    def started(self, user_key: str):
+        with self._cond:
+            self._running[user_key] = self._running.get(user_key, 0) + 1
+
+    def finished(self, user_key: str, duration: Optional[float] = None):
+        """Mark one of the user's runs done; `duration` feeds the wait estimate."""
+        with self._cond:
+            left = self._running.get(user_key, 0) - 1
+            if left > 0:
+                self._running[user_key] = left
+            else:
+                self._running.pop(user_key, None)
+            if duration is not None:
+                # exponential moving average of run wall time
+                prev = self._avg_run_seconds
+                self._avg_run_seconds = duration if prev is None else 0.8 * prev + 0.2 * duration
+
+    def position(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Current place of a queued run (1 = next) and a rough wait estimate, or None
+        if it is not queued here. The estimate assumes runs ahead take the average
+        run time and `concurrency` of them run at once.
+        """
+        with self._cond:
+            if run_id not in self._entries:
+                return None
+            ordered = self._ordered()
+            ahead = next(i for i, e in enumerate(ordered) if e["run_id"] == run_id)
+            entry = self._entries[run_id]
+            estimate = None
+            if self._avg_run_seconds is not None:
+                estimate = round(self._avg_run_seconds * (ahead // self.concurrency), 1)
+            if entry["not_before"]:
+                estimate = max(estimate or 0.0, round(entry["not_before"] - time.time(), 1))
+            return {
+                "position": ahead + 1,
+                "queued": len(ordered),
+                "priority": entry["priority"],
+                "user_key": entry["user_key"],
+                "estimated_wait_seconds": estimate,
+                "not_before": entry["not_before"],
+            }
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": len(self._entries),
+                "running_by_user": dict(self._running),
+                "avg_run_seconds": self._avg_run_seconds,
+            }
+
+
+def limit_native_threads(cores: int):
+    """
+    Cap BLAS/OpenMP thread pools for the current process.
+    Uses threadpoolctl (installed with scikit-learn) when available; the env vars
+    cover libraries that have not been loaded yet.
+    """
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(cores)
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        return None
+    return threadpool_limits(limits=cores)
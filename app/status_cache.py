@@ -0,0 +1,112 @@
+# app/status_cache.py
+"""
+Cache of the run documents behind GET /status/{run_id}.
+
+An entry holds what get_status builds from the run store (merged state, phase
+history, artifact names) for one (status, state_version) of a run. Every
+lookup first reads the run's current (status, state_version), a primary-key
+lookup without any JSON, so an entry is never served once the run has moved
+on, whichever process wrote the change.
+
+- Finished runs do not change: their entries stay until evicted (LRU,
+  STATUS_CACHE_MAX_ENTRIES), or until retention deletes artifacts of any run
+  (artifact_generation() in the run store, which every process sees).
+- Entries of runs in flight also expire after STATUS_CACHE_TTL seconds, since
+  artifacts are registered without a state version bump, and are dropped as
+  soon as this process writes the run's state (update_run_state -> notify).
+
+The log tail is not part of the document; the last full tail of each run is
+kept next to it, keyed by the log's size.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.events import on_state_change
+from app.run_store import TERMINAL_STATUSES, artifact_generation, read_run, read_run_events, read_run_version
+from app.storage import list_artifacts
+
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "1.0"))
+STATUS_CACHE_MAX_ENTRIES = int(os.getenv("STATUS_CACHE_MAX_ENTRIES", "1024"))
+
+
+class StatusCache:
+    def __init__(self, ttl: float = STATUS_CACHE_TTL, max_entries: int = STATUS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, run_id: str):
+        with self._lock:
+            self._entries.pop(run_id, None)
+
+    def _build(self, run_id: str) -> Optional[Dict[str, Any]]:
+        r = read_run(run_id)
+        if not r:
+            return None
+        r["artifacts"] = list_artifacts(run_id)
+        r["history"] = [
+            {"seq": e["seq"], "ts": e["ts"], "status": e["status"], "phase": e["patch"].get("phase")}
+            for e in read_run_events(run_id)
+        ]
+        return r
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """The run's document (shared: do not modify it), or None if the run does not exist."""
+        current = read_run_version(run_id)
+        if current is None:
+            self.invalidate(run_id)
+            return None
+        generation = artifact_generation()
+        current = current + (generation,)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(run_id)
+            if entry is not None and entry["version"] == current and (entry["expires"] is None or entry["expires"] > now):
+                self._entries.move_to_end(run_id)
+                self.hits += 1
+                return entry["doc"]
+        self.misses += 1
+        doc = self._build(run_id)
+        if doc is None:
+            return None
+        # the version the document was actually read at (the run may have moved on meanwhile)
+        version = (doc["status"], doc["state_version"], generation)
+        entry = {
+            "version": version,
+            "doc": doc,
+            "expires": None if doc["status"] in TERMINAL_STATUSES else now + self.ttl,
+            "tail": None,
+        }
+        with self._lock:
+            self._entries[run_id] = entry
+            self._entries.move_to_end(run_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return doc
+
+    def cached_tail(self, run_id: str, size: int) -> Optional[Tuple[str, int]]:
+        """The (log_tail, log_offset) stored for a log of `size` bytes, if any."""
+        with self._lock:
+            entry = self._entries.get(run_id)
+            tail = entry and entry["tail"]
+            return tail[1:] if tail and tail[0] == size else None
+
+    def store_tail(self, run_id: str, size: int, tail: str, offset: int):
+        with self._lock:
+            entry = self._entries.get(run_id)
+            if entry is not None:
+                entry["tail"] = (size, tail, offset)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "ttl": self.ttl}
+
+
+status_cache = StatusCache()
+on_state_change(status_cache.invalidate)
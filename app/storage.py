@@ -19,12 +19,35 @@
 
 # app/storage.py
 import os
+import re
 import shutil
-from typing import Union
+import threading
+from typing import Dict, List, Optional, Union
+
+from app.artifact_store import ArtifactStore, make_artifact_store
+from app.run_store import all_run_ids, get_meta, set_meta
 
 ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "artifacts")
 DATA_DIR = os.environ.get("DATA_DIR", "data")
 
+# Every file written for a run goes through the artifact store (app.artifact_store):
+# it is recorded in the run store's artifact manifest (name, size, sha256, type),
+# so listing a run's artifacts never scans ARTIFACT_DIR, and identical content
+# is stored once.
+_UUID_PREFIX = re.compile(r"^([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12})_")
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store() -> ArtifactStore:
+    """The configured artifact store (ARTIFACT_STORE), rooted at ARTIFACT_DIR."""
+    global _store
+    with _store_lock:
+        if _store is None or _store.root != ARTIFACT_DIR:
+            _store = make_artifact_store(ARTIFACT_DIR)
+        return _store
+
 
 def ensure_dirs():
     """Create necessary directories if they don't exist"""
@@ -32,6 +55,14 @@ def ensure_dirs():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
+def artifact_path(run_id: str, name: str) -> str:
+    """
+    Path an agent should write artifact `name` of `run_id` to, e.g.
+    artifact_path(run_id, "train.npz"). Call register_artifact() once written.
+    """
+    return get_artifact_store().path_for(run_id, name)
+
+
 def save_artifact(run_id: str, name: str, content: Union[str, bytes]) -> str:
     """
     Save artifact to disk.
@@ -45,20 +76,59 @@ def save_artifact(run_id: str, name: str, content: Union[str, bytes]) -> str:
         Path to saved artifact
     """
     ensure_dirs()
-    path = os.path.join(ARTIFACT_DIR, f"{run_id}_{name}")
-    
+    data = content if isinstance(content, bytes) else content.encode("utf-8")
     try:
-        if isinstance(content, bytes):
-            with open(path, "wb") as f:
-                f.write(content)
-        else:
-            with open(path, "w", encoding="utf-8") as f:
-                f.write(content)
-        return path
+        return get_artifact_store().put_bytes(run_id, name, data)["path"]
     except Exception as e:
         raise IOError(f"Failed to save artifact {name}: {e}")
 
 
+def register_artifact(run_id: str, path: str, kind: Optional[str] = None) -> Optional[Dict]:
+    """
+    Hand a file an agent wrote for `run_id` to the artifact store: it is recorded
+    in the manifest and shares storage with identical files of other runs.
+    Logs are registered without a checksum since they keep growing.
+    Never raises: a failed registration must not fail the stage.
+    """
+    try:
+        return get_artifact_store().put(run_id, path, kind)
+    except Exception as e:
+        print(f"Error registering artifact {path}: {e}")
+        return None
+
+
+def dedupe_file(path: str) -> Optional[str]:
+    """
+    Share storage for a non-artifact file (e.g. a dataset CSV) with identical
+    files. Never raises. The file becomes a hardlink to a shared blob: replace
+    it (save_dataset_csv, unlink first), never rewrite it in place.
+    """
+    try:
+        return get_artifact_store().dedupe(path)
+    except Exception as e:
+        print(f"Error deduplicating {path}: {e}")
+        return None
+
+
+def save_dataset_csv(df, path: str) -> str:
+    """
+    Write a DataFrame to `path` and share its storage (dedupe_file). The CSV is
+    written next to it and renamed over it, so an earlier version of the file,
+    possibly a hardlink shared with other runs, is replaced rather than
+    overwritten.
+    """
+    tmp = f"{path}.{os.getpid()}-{threading.get_ident()}.part"
+    try:
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    dedupe_file(path)
+    return path
+
+
 def get_artifact_path(run_id: str, name: str) -> str:
     """Get path to artifact file"""
     return os.path.join(ARTIFACT_DIR, f"{run_id}_{name}")
@@ -66,45 +136,85 @@ def get_artifact_path(run_id: str, name: str) -> str:
 
 def artifact_exists(run_id: str, name: str) -> bool:
     """Check if artifact exists"""
-    path = get_artifact_path(run_id, name)
-    return os.path.exists(path)
+    return get_artifact_store().fetch(get_artifact_path(run_id, name))
 
 
 def list_artifacts(run_id: str) -> list:
-    """List all artifacts for a run"""
-    ensure_dirs()
-    prefix = f"{run_id}_"
-    artifacts = []
-    
+    """List all artifacts for a run (file names, from the manifest)"""
     try:
-        for fname in os.listdir(ARTIFACT_DIR):
-            if fname.startswith(prefix):
-                artifacts.append(fname)
-        return sorted(artifacts)
+        return [a["name"] for a in get_artifact_store().list(run_id)]
     except Exception as e:
         print(f"Error listing artifacts: {e}")
         return []
 
 
+def list_artifact_details(run_id: str) -> List[Dict]:
+    """Manifest rows of a run; log sizes are refreshed since logs keep growing."""
+    rows = get_artifact_store().list(run_id)
+    for row in rows:
+        if row["kind"] == "log":
+            try:
+                row["size"] = os.path.getsize(row["path"])
+            except OSError:
+                pass
+    return rows
+
+
 def cleanup_run_artifacts(run_id: str):
     """Delete all artifacts for a specific run"""
-    artifacts = list_artifacts(run_id)
-    for artifact in artifacts:
-        try:
-            os.remove(os.path.join(ARTIFACT_DIR, artifact))
-        except Exception as e:
-            print(f"Error deleting {artifact}: {e}")
+    get_artifact_store().delete_run(run_id)
+
+
+def run_id_for_file(fname: str, known: List[str]) -> Optional[str]:
+    """The run a `<run_id>_...` file name belongs to: UUIDs directly, other ids by the first match in `known` (sort it longest first)."""
+    m = _UUID_PREFIX.match(fname)
+    if m:
+        return m.group(1)
+    return next((r for r in known if fname.startswith(r + "_")), None)
+
+
+def migrate_flat_artifacts(force: bool = False) -> int:
+    """
+    One-time import of files written before the manifest existed. Each file in
+    ARTIFACT_DIR is attributed to the run whose id prefixes its name (UUIDs
+    directly, other ids by longest match against the runs table).
+    Returns the number of files recorded; 0 if already migrated.
+    """
+    if not force and get_meta("artifacts_migrated"):
+        return 0
+    ensure_dirs()
+    known = sorted(all_run_ids(), key=len, reverse=True)
+    count = 0
+    with os.scandir(ARTIFACT_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            run_id = run_id_for_file(entry.name, known)
+            if run_id and register_artifact(run_id, entry.path):
+                count += 1
+    set_meta("artifacts_migrated", str(count))
+    return count
 
 
 def get_disk_usage() -> dict:
     """Get disk usage statistics for artifact directory"""
     try:
         total, used, free = shutil.disk_usage(ARTIFACT_DIR)
-        return {
+        usage = {
             "total_gb": total / (1024**3),
             "used_gb": used / (1024**3),
             "free_gb": free / (1024**3),
             "percent_used": (used / total) * 100
         }
+        if hasattr(os, "statvfs"):
+            st = os.statvfs(ARTIFACT_DIR)
+            # some filesystems (btrfs, overlay on top of them) report no inode limit
+            if st.f_files:
+                usage.update({
+                    "inodes_total": st.f_files,
+                    "inodes_free": st.f_favail,
+                    "inodes_percent_used": (st.f_files - st.f_favail) / st.f_files * 100,
+                })
+        return usage
     except Exception as e:
         return {"error": str(e)}
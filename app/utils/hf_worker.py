@@ -0,0 +1,202 @@
+# app/utils/hf_worker.py
+"""
+Local HuggingFace inference worker for LLM_MODE=hf.
+
+One daemon thread ("hf-worker") owns the model; every other thread only queues
+prompts, so the pipeline is never entered concurrently. Prompts queued by
+different runs within HF_BATCH_WAIT_MS of each other are generated together in
+one batch of up to HF_BATCH_SIZE (prompts with the same max_tokens only, so a
+batched answer is the one the prompt would get alone).
+
+The model is loaded by warm_up(), which the API calls at startup in hf mode
+(HF_PRELOAD=1), so no run pays for the load. Stage worker processes
+(EXECUTION_BACKEND=process/spawn) start their own worker on first use. A
+failed load (e.g. the model download timed out) is retried when the next
+batch arrives, at most every HF_LOAD_RETRY_SECONDS, doubling up to
+HF_LOAD_RETRY_MAX_SECONDS; batches in between fail at once.
+
+HF_BACKEND picks the runtime for CPU throughput:
+  torch - transformers as before; HF_QUANTIZE=1 applies dynamic int8
+          quantization to the Linear layers
+  onnx  - an ONNX export through optimum.onnxruntime (optional dependency)
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("hf_worker")
+
+HF_MODEL = os.environ.get("HF_MODEL", "google/flan-t5-small")
+HF_BACKEND = os.getenv("HF_BACKEND", "torch").lower()
+HF_QUANTIZE = os.getenv("HF_QUANTIZE", "0") == "1"
+HF_BATCH_SIZE = int(os.getenv("HF_BATCH_SIZE", "8"))
+HF_BATCH_WAIT_MS = float(os.getenv("HF_BATCH_WAIT_MS", "20"))
+HF_PRELOAD = os.getenv("HF_PRELOAD", "1") == "1"
+HF_LOAD_RETRY_SECONDS = float(os.getenv("HF_LOAD_RETRY_SECONDS", "10"))
+HF_LOAD_RETRY_MAX_SECONDS = float(os.getenv("HF_LOAD_RETRY_MAX_SECONDS", "300"))
+
+# (prompt, max_tokens, future)
+_Request = Tuple[str, int, Future]
+
+
+def _load_pipeline(model_name: str, backend: str, quantize: bool):
+    from transformers import AutoTokenizer, pipeline
+
+    tok = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+    else:
+        from transformers import AutoModelForSeq2SeqLM
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            import torch
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return pipeline("text2text-generation", model=model, tokenizer=tok)
+
+
+class HFWorker:
+    def __init__(self, model_name: str = HF_MODEL, backend: str = HF_BACKEND, quantize: bool = HF_QUANTIZE,
+                 batch_size: int = HF_BATCH_SIZE, batch_wait: float = HF_BATCH_WAIT_MS / 1000.0):
+        self.model_name = model_name
+        self.backend = backend
+        self.quantize = quantize
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait
+        self._queue: "queue.Queue[_Request]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread: Optional[threading.Thread] = None
+        self._loaded = threading.Event()
+        self._pipe = None
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.load_attempts = 0
+        self._retry_at = 0.0
+        self._retry_delay = HF_LOAD_RETRY_SECONDS
+        self.batches = 0
+        self.prompts = 0
+        self.busy_seconds = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                # first use, or a forked child: the parent's thread is not running here
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._loaded = threading.Event()
+                self._pipe = None
+                self.load_error = None
+                self._retry_at = 0.0
+                self._retry_delay = HF_LOAD_RETRY_SECONDS
+                self._thread = threading.Thread(target=self._run, daemon=True, name="hf-worker")
+                self._thread.start()
+
+    def warm_up(self, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        """Start the worker and load the model; with wait=True, block until it is loaded."""
+        self._ensure_started()
+        if wait:
+            self._loaded.wait(timeout)
+        return self._pipe is not None
+
+    def submit(self, prompt: str, max_tokens: int = 256) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((prompt, max_tokens, future))
+        return future
+
+    def generate(self, prompt: str, max_tokens: int = 256, timeout: Optional[float] = None) -> str:
+        return self.submit(prompt, max_tokens).result(timeout)
+
+    def _load(self):
+        start = time.time()
+        self.load_attempts += 1
+        try:
+            self._pipe = _load_pipeline(self.model_name, self.backend, self.quantize)
+            self.load_seconds = round(time.time() - start, 2)
+            self.load_error = None
+            logger.info(f"HF model {self.model_name} loaded ({self.backend}) in {self.load_seconds}s")
+        except Exception as e:
+            self.load_error = str(e)
+            self._retry_at = time.time() + self._retry_delay
+            logger.error(f"HF init failed: {e}; retrying in {self._retry_delay:.0f}s at the earliest")
+            self._retry_delay = min(self._retry_delay * 2, HF_LOAD_RETRY_MAX_SECONDS)
+        finally:
+            self._loaded.set()
+
+    def _next_batch(self, carry: List[_Request]) -> List[_Request]:
+        """The oldest request plus whatever arrives within batch_wait with the same max_tokens."""
+        first = carry.pop(0) if carry else self._queue.get()
+        batch = [first]
+        for req in list(carry):
+            if len(batch) >= self.batch_size:
+                break
+            if req[1] == first[1]:
+                carry.remove(req)
+                batch.append(req)
+        deadline = time.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                req = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            (batch if req[1] == first[1] else carry).append(req)
+        return batch
+
+    def _run(self):
+        self._load()
+        carry: List[_Request] = []
+        while True:
+            batch = self._next_batch(carry)
+            # drop requests whose caller gave up (timeout or a hedge won)
+            batch = [req for req in batch if req[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self._pipe is None and time.time() >= self._retry_at:
+                self._load()
+            if self._pipe is None:
+                for _, _, future in batch:
+                    future.set_exception(RuntimeError(f"HF pipeline not available: {self.load_error}"))
+                continue
+            start = time.time()
+            try:
+                outputs = self._pipe([req[0] for req in batch], max_new_tokens=batch[0][1], batch_size=len(batch))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                self.busy_seconds += time.time() - start
+            self.batches += 1
+            self.prompts += len(batch)
+            for (_, _, future), out in zip(batch, outputs):
+                if isinstance(out, list):
+                    out = out[0]
+                future.set_result(out["generated_text"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "quantized": self.quantize and self.backend == "torch",
+            "loaded": self._pipe is not None and self._pid == os.getpid(),
+            "load_seconds": self.load_seconds,
+            "load_error": self.load_error,
+            "load_attempts": self.load_attempts,
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "prompts": self.prompts,
+            "avg_batch": round(self.prompts / self.batches, 2) if self.batches else None,
+            "busy_seconds": round(self.busy_seconds, 2),
+        }
+
+
+hf_worker = HFWorker()
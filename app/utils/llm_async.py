@@ -0,0 +1,249 @@
+# app/utils/llm_async.py
+"""
+Asyncio transport for the LLM providers.
+
+All provider calls run on one event loop in a daemon thread ("llm-loop"), which
+owns a long-lived httpx.AsyncClient per provider, so TLS connections to
+OpenAI, Anthropic, Gemini and Ollama are reused across calls, threads and runs
+instead of being set up again for every prompt. Providers are called over
+their HTTP APIs directly; the SDKs are not needed.
+
+- The provider coroutines (openai_chat(), anthropic_messages(), ...) must run
+  on that loop: await them through wrap() from any other event loop, use
+  run_sync() from threads.
+- run_sync() is what the synchronous helpers in llm_clients use, so existing
+  callers keep blocking calls while sharing the pooled connections.
+- A forked stage worker process starts its own loop and clients on first use.
+- The *_stream() variants are async generators of text chunks; closing one
+  early closes the response, which stops the generation server-side.
+"""
+import os
+import json
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional
+
+import httpx
+
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "90"))
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+ANTHROPIC_BASE_URL = os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com/v1")
+ANTHROPIC_VERSION = "2023-06-01"
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+
+
+class LLMLoop:
+    """The event loop thread and the pooled HTTP clients living on it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.requests = 0
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                # first use, or a forked child: the parent's thread and sockets are not ours
+                self._pid = os.getpid()
+                self._clients = {}
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, daemon=True, name="llm-loop")
+                self._thread.start()
+            return self._loop
+
+    def client(self, provider: str) -> httpx.AsyncClient:
+        """The provider's pooled client; only call from the loop thread."""
+        client = self._clients.get(provider)
+        if client is None:
+            client = self._clients[provider] = httpx.AsyncClient(
+                timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+                ),
+            )
+        self.requests += 1
+        return client
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run_sync(self, coro: Awaitable[Any]) -> Any:
+        """Run `coro` on the LLM loop and wait for its result (from any thread but the loop's own)."""
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError("run_sync() called from the LLM loop; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    async def wrap(self, coro: Awaitable[Any]) -> Any:
+        """Await `coro` (which must run on the LLM loop) from another event loop."""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def close(self, timeout: float = 5.0):
+        with self._lock:
+            loop, thread, clients = self._loop, self._thread, list(self._clients.values())
+            if loop is None or self._pid != os.getpid():
+                return
+            self._loop, self._clients = None, {}
+
+        async def _close():
+            for client in clients:
+                await client.aclose()
+
+        try:
+            asyncio.run_coroutine_threadsafe(_close(), loop).result(timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"running": self._loop is not None and self._pid == os.getpid(),
+                "clients": sorted(self._clients), "requests": self.requests}
+
+
+llm_loop = LLMLoop()
+
+
+# ===============================
+# PROVIDERS (coroutines on the LLM loop)
+# ===============================
+async def openai_chat(prompt: str, max_tokens: int, api_key: str, model: str, temperature: float = 0.7) -> str:
+    resp = await llm_loop.client("openai").post(
+        f"{OPENAI_BASE_URL}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"model": model, "messages": [{"role": "user", "content": prompt}],
+              "max_tokens": max_tokens, "temperature": temperature},
+    )
+    resp.raise_for_status()
+    return (resp.json()["choices"][0]["message"]["content"] or "").strip()
+
+
+async def anthropic_messages(prompt: str, max_tokens: int, api_key: str, model: str) -> str:
+    resp = await llm_loop.client("anthropic").post(
+        f"{ANTHROPIC_BASE_URL}/messages",
+        headers={"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION},
+        json={"model": model, "max_tokens": max_tokens, "messages": [{"role": "user", "content": prompt}]},
+    )
+    resp.raise_for_status()
+    blocks = resp.json().get("content") or []
+    return "".join(b.get("text", "") for b in blocks if b.get("type") == "text").strip()
+
+
+async def gemini_generate(prompt: str, max_tokens: int, api_key: str, model: str, temperature: float = 0.7) -> str:
+    resp = await llm_loop.client("gemini").post(
+        f"{GEMINI_BASE_URL}/models/{model}:generateContent",
+        headers={"x-goog-api-key": api_key},
+        json={"contents": [{"parts": [{"text": prompt}]}],
+              "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature}},
+    )
+    resp.raise_for_status()
+    candidates = resp.json().get("candidates") or []
+    parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+    return "".join(p.get("text", "") for p in parts).strip()
+
+
+async def ollama_generate(prompt: str, max_tokens: int, url: str, model: str) -> str:
+    # one JSON document instead of a stream of per-token lines
+    resp = await llm_loop.client("ollama").post(
+        url, json={"model": model, "prompt": prompt, "max_tokens": max_tokens, "stream": False}
+    )
+    resp.raise_for_status()
+    return (resp.json().get("response") or "").strip()
+
+
+# ===============================
+# STREAMING PROVIDERS (async generators of text chunks)
+# ===============================
+async def _sse_data(resp: httpx.Response) -> AsyncIterator[Dict[str, Any]]:
+    """The JSON payloads of a server-sent event stream."""
+    async for line in resp.aiter_lines():
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if not data or data == "[DONE]":
+            continue
+        yield json.loads(data)
+
+
+async def openai_chat_stream(prompt: str, max_tokens: int, api_key: str, model: str,
+                             temperature: float = 0.7) -> AsyncIterator[str]:
+    async with llm_loop.client("openai").stream(
+        "POST",
+        f"{OPENAI_BASE_URL}/chat/completions",
+        headers={"Authorization": f"Bearer {api_key}"},
+        json={"model": model, "messages": [{"role": "user", "content": prompt}],
+              "max_tokens": max_tokens, "temperature": temperature, "stream": True},
+    ) as resp:
+        resp.raise_for_status()
+        async for data in _sse_data(resp):
+            choices = data.get("choices") or []
+            text = choices and (choices[0].get("delta") or {}).get("content")
+            if text:
+                yield text
+
+
+async def anthropic_messages_stream(prompt: str, max_tokens: int, api_key: str, model: str) -> AsyncIterator[str]:
+    async with llm_loop.client("anthropic").stream(
+        "POST",
+        f"{ANTHROPIC_BASE_URL}/messages",
+        headers={"x-api-key": api_key, "anthropic-version": ANTHROPIC_VERSION},
+        json={"model": model, "max_tokens": max_tokens, "stream": True,
+              "messages": [{"role": "user", "content": prompt}]},
+    ) as resp:
+        resp.raise_for_status()
+        async for data in _sse_data(resp):
+            if data.get("type") == "content_block_delta":
+                text = (data.get("delta") or {}).get("text")
+                if text:
+                    yield text
+            elif data.get("type") == "error":
+                raise RuntimeError(f"Anthropic stream error: {data.get('error')}")
+
+
+async def gemini_generate_stream(prompt: str, max_tokens: int, api_key: str, model: str,
+                                 temperature: float = 0.7) -> AsyncIterator[str]:
+    async with llm_loop.client("gemini").stream(
+        "POST",
+        f"{GEMINI_BASE_URL}/models/{model}:streamGenerateContent",
+        params={"alt": "sse"},
+        headers={"x-goog-api-key": api_key},
+        json={"contents": [{"parts": [{"text": prompt}]}],
+              "generationConfig": {"maxOutputTokens": max_tokens, "temperature": temperature}},
+    ) as resp:
+        resp.raise_for_status()
+        async for data in _sse_data(resp):
+            candidates = data.get("candidates") or []
+            parts = (candidates[0].get("content") or {}).get("parts", []) if candidates else []
+            text = "".join(p.get("text", "") for p in parts)
+            if text:
+                yield text
+
+
+async def ollama_generate_stream(prompt: str, max_tokens: int, url: str, model: str) -> AsyncIterator[str]:
+    # one JSON document per line, the last one with "done": true
+    async with llm_loop.client("ollama").stream(
+        "POST", url, json={"model": model, "prompt": prompt, "max_tokens": max_tokens, "stream": True}
+    ) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            if data.get("error"):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                break
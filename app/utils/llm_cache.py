@@ -0,0 +1,204 @@
+# app/utils/llm_cache.py
+"""
+Prompt -> response cache for llm_generate().
+
+Entries are keyed by a hash of (provider, model, prompt, max_tokens, and for
+llm_generate_json's extracted objects the form "json") and kept
+in two tiers: an in-process LRU (LLM_CACHE_MEMORY_ENTRIES) in front of a
+SQLite table (LLM_CACHE_DB, shared by every worker and stage process) that is
+trimmed to LLM_CACHE_MAX_ROWS by last use.
+
+Each call site names itself (`site=`) and gets its own TTL from
+LLM_CACHE_SITE_TTLS (override with LLM_CACHE_TTL_<SITE>=seconds). Empty
+responses (every provider failed) are never stored. Hits, misses and the
+latency saved (the original call's latency, counted again on every hit) are
+kept per site; see stats().
+"""
+import os
+import time
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.run_store import get_conn, transaction
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "20000"))
+LLM_CACHE_DEFAULT_TTL = float(os.getenv("LLM_CACHE_DEFAULT_TTL", "86400"))
+
+_DEFAULT_SITE_TTLS = {
+    # option lists for a hint: the same popular hints come back all the time
+    "ps_options": 7 * 86400,
+    "ps_parse": 86400,
+    "search_queries": 86400,
+    "synthetic_schema": 86400,
+    "model_plan": 86400,
+    "model_card": 86400,
+    # a health probe should notice an outage within a minute
+    "checkllm": 60,
+}
+LLM_CACHE_SITE_TTLS = {
+    site: float(os.getenv(f"LLM_CACHE_TTL_{site.upper()}", str(ttl))) for site, ttl in _DEFAULT_SITE_TTLS.items()
+}
+
+# trim the table after this many inserts
+_TRIM_EVERY = 200
+
+
+def cache_key(provider: str, model: str, prompt: str, max_tokens: int, form: str = "text") -> str:
+    """`form` tells apart entries holding different renderings of an answer (full text, extracted JSON)."""
+    parts = [provider, model, prompt, max_tokens] + ([] if form == "text" else [form])
+    raw = json.dumps(parts, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def site_ttl(site: str) -> float:
+    return LLM_CACHE_SITE_TTLS.get(site, LLM_CACHE_DEFAULT_TTL)
+
+
+class LLMCache:
+    def __init__(self, db_path: str = LLM_CACHE_DB, memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+                 max_rows: int = LLM_CACHE_MAX_ROWS):
+        self.db_path = db_path
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        # key -> (response, expires_at, latency of the original call)
+        self._memory: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._inserts = 0
+        self._db_ready: Optional[Tuple[int, str]] = None
+
+    def _conn(self):
+        conn = get_conn(self.db_path)
+        # once per process and path (connections are per thread, the schema is per file)
+        if self._db_ready != (os.getpid(), self.db_path):
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    site TEXT,
+                    response TEXT NOT NULL,
+                    created_at REAL,
+                    expires_at REAL,
+                    last_used REAL,
+                    latency REAL
+                ) WITHOUT ROWID"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used)")
+            self._db_ready = (os.getpid(), self.db_path)
+        return conn
+
+    def _count(self, site: str, field: str, amount: float = 1):
+        with self._lock:
+            counters = self._stats.setdefault(site, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0})
+            counters[field] += amount
+
+    def _remember(self, key: str, value: Tuple[str, float, float]):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str, site: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                else:
+                    del self._memory[key]
+                    entry = None
+        if entry is not None:
+            self._count(site, "memory_hits")
+            self._count(site, "saved_seconds", entry[2])
+            return entry[0]
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT response, expires_at, latency FROM llm_cache WHERE key=? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET last_used=? WHERE key=?", (now, key))
+        except Exception as e:
+            print(f"LLM cache read failed: {e}")
+            row = None
+        if row is None:
+            self._count(site, "misses")
+            return None
+        self._remember(key, (row[0], row[1], row[2] or 0.0))
+        self._count(site, "disk_hits")
+        self._count(site, "saved_seconds", row[2] or 0.0)
+        return row[0]
+
+    def put(self, key: str, site: str, response: str, latency: float, ttl: Optional[float] = None):
+        if not response:
+            return
+        now = time.time()
+        expires_at = now + (site_ttl(site) if ttl is None else ttl)
+        self._remember(key, (response, expires_at, latency))
+        try:
+            self._conn().execute(
+                """INSERT OR REPLACE INTO llm_cache (key, site, response, created_at, expires_at, last_used, latency)
+                   VALUES (?,?,?,?,?,?,?)""",
+                (key, site, response, now, expires_at, now, latency),
+            )
+            with self._lock:
+                self._inserts += 1
+                trim = self._inserts % _TRIM_EVERY == 0
+            if trim:
+                self.trim()
+        except Exception as e:
+            print(f"LLM cache write failed: {e}")
+
+    def invalidate(self, key: str):
+        """Forget a response, e.g. one that turned out not to parse."""
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            self._conn().execute("DELETE FROM llm_cache WHERE key=?", (key,))
+        except Exception as e:
+            print(f"LLM cache invalidate failed: {e}")
+
+    def bypassed(self, site: str):
+        self._count(site, "bypassed")
+
+    def trim(self):
+        """Drop expired rows, then the least recently used ones beyond max_rows."""
+        conn = self._conn()
+        with transaction(self.db_path):
+            conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                """DELETE FROM llm_cache WHERE key IN (
+                       SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                (self.max_rows,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        self._conn().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sites = {site: dict(c) for site, c in self._stats.items()}
+            memory = len(self._memory)
+        totals = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "saved_seconds": 0.0}
+        for counters in sites.values():
+            for field in totals:
+                totals[field] += counters[field]
+            lookups = counters["memory_hits"] + counters["disk_hits"] + counters["misses"]
+            counters["hit_rate"] = round((counters["memory_hits"] + counters["disk_hits"]) / lookups, 3) if lookups else None
+            counters["saved_seconds"] = round(counters["saved_seconds"], 3)
+        lookups = totals["memory_hits"] + totals["disk_hits"] + totals["misses"]
+        totals["hit_rate"] = round((totals["memory_hits"] + totals["disk_hits"]) / lookups, 3) if lookups else None
+        totals["saved_seconds"] = round(totals["saved_seconds"], 3)
+        return {"enabled": LLM_CACHE_ENABLED, "memory_entries": memory, "totals": totals, "sites": sites}
+
+
+llm_cache = LLMCache()
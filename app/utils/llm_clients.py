@@ -75,10 +75,25 @@
 import os
 import json
 import re
+import asyncio
 import logging
 import time
-import requests
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Iterator, List
+
+from app.utils.hf_worker import HF_MODEL, hf_worker
+from app.utils.llm_async import (
+    anthropic_messages,
+    anthropic_messages_stream,
+    gemini_generate,
+    gemini_generate_stream,
+    llm_loop,
+    ollama_generate,
+    ollama_generate_stream,
+    openai_chat,
+    openai_chat_stream,
+)
+from app.utils.llm_cache import LLM_CACHE_ENABLED, cache_key, llm_cache
+from app.utils.llm_policy import llm_policy
 
 logger = logging.getLogger("llm_clients")
 
@@ -103,76 +118,29 @@ GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash-exp")
 OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "mistral:latest")
 
-# HF settings
-HF_MODEL = os.environ.get("HF_MODEL", "google/flan-t5-small")
-
-# Retry settings
+# Retry settings: passes over the whole provider chain
 MAX_RETRIES = 3
 RETRY_BACKOFF = [1, 2, 4]  # seconds
 
-_hf_pipe = None
-
 
 # ===============================
 # HUGGINGFACE LLM
 # ===============================
-def _init_hf():
-    """Initialize HF pipeline once."""
-    global _hf_pipe
-    if _hf_pipe:
-        return
-    try:
-        from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-        tok = AutoTokenizer.from_pretrained(HF_MODEL)
-        model = AutoModelForSeq2SeqLM.from_pretrained(HF_MODEL)
-        _hf_pipe = pipeline("text2text-generation", model=model, tokenizer=tok)
-        logger.info("HF model loaded OK")
-    except Exception as e:
-        logger.error(f"HF init failed: {e}")
-        _hf_pipe = None
-
-
 def _call_hf(prompt, max_length=256):
-    _init_hf()
-    if _hf_pipe is None:
-        raise RuntimeError("HF pipeline not available")
-    out = _hf_pipe(prompt, max_new_tokens=max_length)[0]["generated_text"]
-    return out
+    """Runs on the local worker (app/utils/hf_worker.py), batched with concurrent prompts."""
+    return hf_worker.generate(prompt, max_length)
 
 
 # ===============================
-# OLLAMA LLM (STREAMING FIXED)
+# OLLAMA LLM
 # ===============================
 def _call_ollama(prompt, model=OLLAMA_MODEL, max_tokens=256):
     """
-    Calls Ollama and combines stream chunks into a clean final string.
+    Calls Ollama (non-streaming) over the pooled connection.
+    Returns "" on failure.
     """
     try:
-        resp = requests.post(
-            OLLAMA_URL,
-            json={"model": model, "prompt": prompt, "max_tokens": max_tokens},
-            stream=True,
-            timeout=60
-        )
-
-        resp.raise_for_status()
-
-        final_text = ""
-
-        # Ollama returns EACH TOKEN as a JSON line!
-        for line in resp.iter_lines():
-            if not line:
-                continue
-            try:
-                chunk = json.loads(line.decode("utf-8"))
-                part = chunk.get("response", "")
-                final_text += part
-            except json.JSONDecodeError:
-                # Ignore malformed chunks
-                continue
-
-        return final_text.strip()
-
+        return llm_loop.run_sync(ollama_generate(prompt, max_tokens, OLLAMA_URL, model))
     except Exception as e:
         logger.error(f"Ollama call failed: {e}")
         return ""
@@ -184,16 +152,7 @@ def _call_ollama(prompt, model=OLLAMA_MODEL, max_tokens=256):
 def _call_openai(prompt: str, max_tokens: int = 256) -> str:
     """Call OpenAI API"""
     try:
-        import openai
-        openai.api_key = OPENAI_API_KEY
-        
-        response = openai.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=max_tokens,
-            temperature=0.7
-        )
-        return response.choices[0].message.content.strip()
+        return llm_loop.run_sync(openai_chat(prompt, max_tokens, OPENAI_API_KEY, OPENAI_MODEL))
     except Exception as e:
         logger.error(f"OpenAI call failed: {e}")
         raise
@@ -205,15 +164,7 @@ def _call_openai(prompt: str, max_tokens: int = 256) -> str:
 def _call_anthropic(prompt: str, max_tokens: int = 256) -> str:
     """Call Anthropic Claude API"""
     try:
-        import anthropic
-        client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-        
-        message = client.messages.create(
-            model=ANTHROPIC_MODEL,
-            max_tokens=max_tokens,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return message.content[0].text.strip()
+        return llm_loop.run_sync(anthropic_messages(prompt, max_tokens, ANTHROPIC_API_KEY, ANTHROPIC_MODEL))
     except Exception as e:
         logger.error(f"Anthropic call failed: {e}")
         raise
@@ -225,109 +176,376 @@ def _call_anthropic(prompt: str, max_tokens: int = 256) -> str:
 def _call_gemini(prompt: str, max_tokens: int = 256) -> str:
     """Call Google Gemini API"""
     try:
-        import google.generativeai as genai
-        genai.configure(api_key=GOOGLE_API_KEY)
-        
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=max_tokens,
-                temperature=0.7
-            )
-        )
-        return response.text.strip()
+        return llm_loop.run_sync(gemini_generate(prompt, max_tokens, GOOGLE_API_KEY, GEMINI_MODEL))
     except Exception as e:
         logger.error(f"Gemini call failed: {e}")
         raise
 
 
 # ===============================
-# RETRY WITH EXPONENTIAL BACKOFF
+# ASYNC PROVIDER CALLS (on the LLM loop)
 # ===============================
-def _retry_with_backoff(func, *args, **kwargs) -> Optional[str]:
-    """
-    Retry function with exponential backoff.
-    Returns None if all attempts fail.
-    """
-    for attempt in range(MAX_RETRIES):
-        try:
-            result = func(*args, **kwargs)
-            if result:
-                return result
-        except Exception as e:
-            logger.warning(f"Attempt {attempt + 1}/{MAX_RETRIES} failed: {e}")
-            if attempt < MAX_RETRIES - 1:
-                delay = RETRY_BACKOFF[attempt]
-                logger.info(f"Retrying in {delay} seconds...")
-                time.sleep(delay)
-    
-    logger.error(f"All {MAX_RETRIES} attempts failed")
-    return None
+async def _acall_ollama(prompt: str, max_tokens: int = 256) -> str:
+    return await ollama_generate(prompt, max_tokens, OLLAMA_URL, OLLAMA_MODEL)
+
+
+async def _acall_openai(prompt: str, max_tokens: int = 256) -> str:
+    return await openai_chat(prompt, max_tokens, OPENAI_API_KEY, OPENAI_MODEL)
+
+
+async def _acall_anthropic(prompt: str, max_tokens: int = 256) -> str:
+    return await anthropic_messages(prompt, max_tokens, ANTHROPIC_API_KEY, ANTHROPIC_MODEL)
+
+
+async def _acall_gemini(prompt: str, max_tokens: int = 256) -> str:
+    return await gemini_generate(prompt, max_tokens, GOOGLE_API_KEY, GEMINI_MODEL)
+
+
+async def _acall_hf(prompt: str, max_tokens: int = 256) -> str:
+    # cancelling (timeout, hedge won) drops the prompt if its batch has not started yet
+    return await asyncio.wrap_future(hf_worker.submit(prompt, max_tokens))
+
+
+def _astream_ollama(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    return ollama_generate_stream(prompt, max_tokens, OLLAMA_URL, OLLAMA_MODEL)
+
+
+def _astream_openai(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    return openai_chat_stream(prompt, max_tokens, OPENAI_API_KEY, OPENAI_MODEL)
+
+
+def _astream_anthropic(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    return anthropic_messages_stream(prompt, max_tokens, ANTHROPIC_API_KEY, ANTHROPIC_MODEL)
+
+
+def _astream_gemini(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    return gemini_generate_stream(prompt, max_tokens, GOOGLE_API_KEY, GEMINI_MODEL)
+
+
+async def _astream_hf(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    # batched generation has no token stream: the answer comes in one piece
+    yield await _acall_hf(prompt, max_tokens)
 
 
 # ===============================
 # GENERIC LLM CALL WITH FALLBACK
 # ===============================
-def llm_generate(prompt: str, max_tokens: int = 256) -> str:
+_MODELS = {"openai": OPENAI_MODEL, "anthropic": ANTHROPIC_MODEL, "gemini": GEMINI_MODEL, "ollama": OLLAMA_MODEL, "hf": HF_MODEL}
+
+# provider -> (display name, async call, async stream)
+_PROVIDERS = {
+    "openai": ("OpenAI", _acall_openai, _astream_openai),
+    "anthropic": ("Anthropic", _acall_anthropic, _astream_anthropic),
+    "gemini": ("Gemini", _acall_gemini, _astream_gemini),
+    "hf": ("HuggingFace", _acall_hf, _astream_hf),
+    "ollama": ("Ollama", _acall_ollama, _astream_ollama),
+}
+
+
+def _provider_chain() -> List[str]:
+    """Providers in the order llm_generate tries them: LLM_MODE first, then the fallbacks."""
+    keys = {"openai": OPENAI_API_KEY, "anthropic": ANTHROPIC_API_KEY, "gemini": GOOGLE_API_KEY}
+    chain = []
+    if LLM_MODE in _PROVIDERS and (LLM_MODE not in keys or keys[LLM_MODE]):
+        chain.append(LLM_MODE)
+    for provider in ("openai", "anthropic", "gemini"):
+        if LLM_MODE != provider and keys[provider]:
+            chain.append(provider)
+    if LLM_MODE != "ollama":
+        chain.append("ollama")
+    return chain
+
+
+async def _astream_json_value(provider: str, prompt: str, max_tokens: int) -> str:
     """
-    Generate text from LLM with automatic fallback.
-    Tries primary provider, then falls back to others if available.
+    Streams `provider`'s answer and stops the generation as soon as a complete
+    JSON object has arrived. Returns that JSON text, or everything received if
+    none was complete.
     """
-    # Try primary provider based on LLM_MODE
-    if LLM_MODE == "openai" and OPENAI_API_KEY:
-        result = _retry_with_backoff(_call_openai, prompt, max_tokens)
-        if result:
-            return result
-        logger.warning("OpenAI failed, trying fallback...")
-    
-    if LLM_MODE == "anthropic" and ANTHROPIC_API_KEY:
-        result = _retry_with_backoff(_call_anthropic, prompt, max_tokens)
-        if result:
-            return result
-        logger.warning("Anthropic failed, trying fallback...")
-    
-    if LLM_MODE == "gemini" and GOOGLE_API_KEY:
-        result = _retry_with_backoff(_call_gemini, prompt, max_tokens)
-        if result:
-            return result
-        logger.warning("Gemini failed, trying fallback...")
-    
-    if LLM_MODE == "hf":
-        result = _retry_with_backoff(_call_hf, prompt, max_tokens)
-        if result:
-            return result
-        logger.warning("HuggingFace failed, trying fallback...")
-    
-    if LLM_MODE == "ollama":
-        result = _retry_with_backoff(_call_ollama, prompt, max_tokens=max_tokens)
-        if result:
-            return result
-        logger.warning("Ollama failed...")
-    
-    # Try fallback providers if primary failed
-    fallback_providers = []
-    
-    if LLM_MODE != "openai" and OPENAI_API_KEY:
-        fallback_providers.append(("OpenAI", _call_openai))
-    if LLM_MODE != "anthropic" and ANTHROPIC_API_KEY:
-        fallback_providers.append(("Anthropic", _call_anthropic))
-    if LLM_MODE != "gemini" and GOOGLE_API_KEY:
-        fallback_providers.append(("Gemini", _call_gemini))
-    if LLM_MODE != "ollama":
-        fallback_providers.append(("Ollama", lambda p, m: _call_ollama(p, max_tokens=m)))
-    
-    for provider_name, provider_func in fallback_providers:
-        logger.info(f"Trying fallback provider: {provider_name}")
-        result = _retry_with_backoff(provider_func, prompt, max_tokens)
+    extractor = _JSONExtractor()
+    stream = _PROVIDERS[provider][2](prompt, max_tokens)
+    try:
+        async for chunk in stream:
+            found = extractor.feed(chunk)
+            if found is not None:
+                return found
+    finally:
+        await stream.aclose()
+    return extractor.text
+
+
+async def _acall_provider(provider: str, prompt: str, max_tokens: int, json_value: bool = False) -> str:
+    """
+    One call to `provider` under its timeout, reported to llm_policy. Returns
+    "" on failure. With json_value the answer is streamed and cut short after
+    its first JSON object (_astream_json_value).
+    """
+    name, acall, _ = _PROVIDERS[provider]
+    call = _astream_json_value(provider, prompt, max_tokens) if json_value else acall(prompt, max_tokens)
+    start = time.time()
+    try:
+        result = await asyncio.wait_for(call, llm_policy.timeout(provider))
+    except asyncio.CancelledError:
+        llm_policy.abandoned(provider, time.time() - start)
+        raise
+    except asyncio.TimeoutError:
+        logger.warning(f"{name} timed out after {llm_policy.timeout(provider):.0f}s")
+        llm_policy.failure(provider, "timeout")
+        return ""
+    except Exception as e:
+        logger.warning(f"{name} call failed: {e}")
+        llm_policy.failure(provider, str(e) or type(e).__name__)
+        return ""
+    if not result:
+        logger.warning(f"{name} returned an empty response")
+        llm_policy.failure(provider, "empty response")
+        return ""
+    llm_policy.success(provider, time.time() - start)
+    return result
+
+
+async def _arace_providers(chain: List[str], prompt: str, max_tokens: int, json_value: bool = False) -> Optional[str]:
+    """
+    One pass over the chain. A provider that fails hands over to the next one
+    at once; one that is slower than its hedge delay gets the next one started
+    alongside it. The first answer wins and the other calls are cancelled.
+
+    Returns None if every provider was skipped by its circuit breaker.
+    """
+    waiting = list(chain)
+    running: Dict[asyncio.Task, str] = {}
+    tried = False
+    last = None  # (provider, started) of the newest call, the one a hedge would back up
+
+    def start_next() -> bool:
+        nonlocal tried, last
+        while waiting:
+            provider = waiting.pop(0)
+            if not llm_policy.acquire(provider):
+                logger.info(f"Skipping {_PROVIDERS[provider][0]}: circuit open")
+                continue
+            if tried:
+                logger.info(f"Trying fallback provider: {_PROVIDERS[provider][0]}")
+            tried = True
+            running[asyncio.ensure_future(_acall_provider(provider, prompt, max_tokens, json_value))] = provider
+            last = (provider, time.time())
+            return True
+        return False
+
+    start_next()
+    try:
+        while running:
+            timeout = None
+            delay = llm_policy.hedge_delay(last[0]) if waiting else None
+            if delay is not None:
+                timeout = max(0.0, last[1] + delay - time.time())
+            done, _ = await asyncio.wait(list(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"{_PROVIDERS[last[0]][0]} slower than {delay:.1f}s, hedging with the next provider")
+                llm_policy.hedged(last[0])
+                # a hedge that finds every remaining breaker open just keeps waiting
+                start_next()
+                continue
+            for task in done:
+                provider = running.pop(task)
+                result = task.result()
+                if result:
+                    return result
+                logger.warning(f"{_PROVIDERS[provider][0]} failed, trying fallback...")
+            if not running:
+                start_next()
+    finally:
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    return "" if tried else None
+
+
+async def _agenerate(prompt: str, max_tokens: int, json_value: bool = False) -> str:
+    """
+    The uncached llm_generate(): passes over the provider chain, with backoff
+    in between. With json_value each provider's answer ends at its first JSON
+    object, and the first provider to deliver one wins the race.
+    """
+    chain = _provider_chain()
+    for attempt in range(MAX_RETRIES):
+        result = await _arace_providers(chain, prompt, max_tokens, json_value)
+        if result is None:
+            logger.error("All LLM providers are unavailable (circuit open)")
+            return ""
         if result:
-            logger.info(f"Fallback to {provider_name} succeeded")
             return result
-    
+        if attempt < MAX_RETRIES - 1:
+            logger.info(f"Retrying in {RETRY_BACKOFF[attempt]} seconds...")
+            await asyncio.sleep(RETRY_BACKOFF[attempt])
+
     logger.error("All LLM providers failed")
     return ""
 
 
+async def _astream(prompt: str, max_tokens: int) -> AsyncIterator[str]:
+    """
+    The answer's text chunks, as the provider streams them. Providers are
+    tried in chain order (breakers apply, no hedging) until one produces
+    output; the provider's timeout bounds the whole answer, as for
+    llm_generate(). Once a provider has produced output there is no
+    fallback, so a failure after that ends the stream early.
+    """
+    chain = _provider_chain()
+    for attempt in range(MAX_RETRIES):
+        tried = False
+        for provider in chain:
+            if not llm_policy.acquire(provider):
+                continue
+            tried = True
+            name, _, astream = _PROVIDERS[provider]
+            timeout = llm_policy.timeout(provider)
+            deadline = time.time() + timeout
+            stream = astream(prompt, max_tokens)
+            produced = False
+            try:
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(stream.__anext__(), max(0.0, deadline - time.time()))
+                    except StopAsyncIteration:
+                        break
+                    if chunk:
+                        produced = True
+                        yield chunk
+            except GeneratorExit:
+                # the consumer has what it needs
+                llm_policy.success(provider)
+                raise
+            except Exception as e:
+                error = f"timed out after {timeout:.0f}s" if isinstance(e, asyncio.TimeoutError) else (str(e) or type(e).__name__)
+                logger.warning(f"{name} stream failed: {error}")
+                llm_policy.failure(provider, error)
+                if produced:
+                    return
+                continue
+            finally:
+                try:
+                    await stream.aclose()
+                except Exception:
+                    pass
+            if produced:
+                llm_policy.success(provider)
+                return
+            logger.warning(f"{name} returned an empty response")
+            llm_policy.failure(provider, "empty response")
+        if not tried:
+            logger.error("All LLM providers are unavailable (circuit open)")
+            return
+        if attempt < MAX_RETRIES - 1:
+            logger.info(f"Retrying in {RETRY_BACKOFF[attempt]} seconds...")
+            await asyncio.sleep(RETRY_BACKOFF[attempt])
+
+    logger.error("All LLM providers failed")
+
+
+_END = object()
+
+
+async def _anext(stream: AsyncIterator[str]) -> Any:
+    # a coroutine for run_sync()/wrap(); _END instead of StopAsyncIteration crossing the loop
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+async def _aclose(stream) -> None:
+    await stream.aclose()
+
+
+def llm_stream(prompt: str, max_tokens: int = 256) -> Iterator[str]:
+    """
+    Generate text as a stream of chunks (uncached). Stopping the iteration
+    early (break, close()) stops the generation.
+    """
+    stream = _astream(prompt, max_tokens)
+    try:
+        while True:
+            chunk = llm_loop.run_sync(_anext(stream))
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        llm_loop.run_sync(_aclose(stream))
+
+
+async def allm_stream(prompt: str, max_tokens: int = 256) -> AsyncIterator[str]:
+    """llm_stream() for async code on any event loop."""
+    stream = _astream(prompt, max_tokens)
+    try:
+        while True:
+            chunk = await llm_loop.wrap(_anext(stream))
+            if chunk is _END:
+                return
+            yield chunk
+    finally:
+        await llm_loop.wrap(_aclose(stream))
+
+
+def _cache_key(prompt: str, max_tokens: int, form: str = "text") -> str:
+    # keyed by the configured primary provider (a fallback's answer is stored under it too);
+    # llm_generate_json stores only the JSON object of an answer, under form="json"
+    return cache_key(LLM_MODE, _MODELS.get(LLM_MODE, ""), prompt, max_tokens, form)
+
+
+def llm_generate(prompt: str, max_tokens: int = 256, site: str = "default",
+                 cache: bool = True, cache_ttl: Optional[float] = None) -> str:
+    """
+    Generate text from LLM with automatic fallback.
+    Tries primary provider, then falls back to others if available.
+    Timeouts, hedging to the next provider and circuit breakers are set per
+    provider in app/utils/llm_policy.py.
+
+    Responses are cached (app/utils/llm_cache.py) with the TTL of the calling
+    `site` unless cache_ttl is given; cache=False bypasses the cache.
+    """
+    if not (cache and LLM_CACHE_ENABLED):
+        llm_cache.bypassed(site)
+        return _llm_generate_uncached(prompt, max_tokens)
+    key = _cache_key(prompt, max_tokens)
+    cached = llm_cache.get(key, site)
+    if cached is not None:
+        return cached
+    start = time.time()
+    result = _llm_generate_uncached(prompt, max_tokens)
+    llm_cache.put(key, site, result, time.time() - start, cache_ttl)
+    return result
+
+
+def _llm_generate_uncached(prompt: str, max_tokens: int) -> str:
+    return llm_loop.run_sync(_agenerate(prompt, max_tokens))
+
+
+async def _allm_generate(prompt: str, max_tokens: int, site: str, cache: bool, cache_ttl: Optional[float],
+                         form: str = "text") -> str:
+    """llm_generate() as a coroutine on the LLM loop; form="json" is llm_generate_json()'s answer."""
+    use_cache = cache and LLM_CACHE_ENABLED
+    key = _cache_key(prompt, max_tokens, form)
+    if use_cache:
+        cached = llm_cache.get(key, site)
+        if cached is not None:
+            return cached
+    else:
+        llm_cache.bypassed(site)
+    start = time.time()
+    result = await _agenerate(prompt, max_tokens, json_value=form == "json")
+    if use_cache:
+        llm_cache.put(key, site, result, time.time() - start, cache_ttl)
+    return result
+
+
+async def allm_generate(prompt: str, max_tokens: int = 256, site: str = "default",
+                        cache: bool = True, cache_ttl: Optional[float] = None) -> str:
+    """Async llm_generate(), awaitable from any event loop (e.g. a FastAPI handler)."""
+    return await llm_loop.wrap(_allm_generate(prompt, max_tokens, site, cache, cache_ttl))
+
+
 # ===============================
 # JSON OUTPUT HANDLING WITH VALIDATION
 # ===============================
@@ -358,7 +576,59 @@ def _sanitize_json_string(text: str) -> str:
     return clean
 
 
-def llm_generate_json(prompt: str, max_tokens: int = 512, safe: bool = True) -> Optional[Dict[str, Any]]:
+class _JSONExtractor:
+    """
+    Finds the first complete top-level JSON object in text fed chunk by chunk.
+    Arrays and scalars (e.g. "Step [1]" in prose) never end the answer early:
+    every caller expects an object.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Add a chunk; returns the JSON text once a balanced object that parses has been seen."""
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text):
+            c = text[self._pos]
+            if self._start is None:
+                if c == "{":
+                    self._start, self._depth, self._in_string, self._escaped = self._pos, 1, False, False
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in "{[":
+                self._depth += 1
+            elif c in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos + 1]
+                    try:
+                        json.loads(candidate)
+                        self._pos += 1
+                        return candidate
+                    except ValueError:
+                        # e.g. "{see below}" in prose: look for the next opening brace
+                        self._pos, self._start = self._start + 1, None
+                        continue
+            self._pos += 1
+        return None
+
+
+def llm_generate_json(prompt: str, max_tokens: int = 512, safe: bool = True, site: str = "default",
+                      cache: bool = True, cache_ttl: Optional[float] = None) -> Optional[Dict[str, Any]]:
     """
     Generate JSON response from LLM with validation and sanitization.
     
@@ -366,11 +636,21 @@ def llm_generate_json(prompt: str, max_tokens: int = 512, safe: bool = True) ->
         prompt: The prompt to send to LLM
         max_tokens: Maximum tokens in response
         safe: If True, return None on error; if False, raise exception
+        site, cache, cache_ttl: response caching, see llm_generate()
     
     Returns:
         Parsed JSON dict/list or None if parsing fails
+
+    The answer is streamed and generation stops at the end of the first
+    complete top-level JSON object; only that object is cached (apart from
+    llm_generate()'s entries for the same prompt). Timeouts,
+    hedging and circuit breakers apply as in llm_generate().
     """
-    text = llm_generate(prompt, max_tokens=max_tokens)
+    text = llm_loop.run_sync(_allm_generate(prompt, max_tokens, site, cache, cache_ttl, "json"))
+    return _parse_json_response(text, prompt, max_tokens, safe)
+
+
+def _parse_json_response(text: str, prompt: str, max_tokens: int, safe: bool) -> Optional[Dict[str, Any]]:
     if not text:
         logger.warning("LLM returned empty response")
         return None
@@ -380,6 +660,8 @@ def llm_generate_json(prompt: str, max_tokens: int = 512, safe: bool = True) ->
     
     if not clean_text:
         logger.warning("No JSON found in LLM response")
+        # do not serve the same unusable answer again
+        llm_cache.invalidate(_cache_key(prompt, max_tokens, "json"))
         return None
     
     # Try to parse JSON
@@ -395,6 +677,7 @@ def llm_generate_json(prompt: str, max_tokens: int = 512, safe: bool = True) ->
         
     except json.JSONDecodeError as e:
         logger.warning(f"Failed to parse JSON from LLM output: {e}")
+        llm_cache.invalidate(_cache_key(prompt, max_tokens, "json"))
         logger.debug(f"Raw LLM output: {text[:500]}")
         logger.debug(f"Cleaned text: {clean_text[:500]}")
         
@@ -0,0 +1,164 @@
+# app/utils/llm_policy.py
+"""
+Per-provider health for llm_generate(): timeouts, hedging delays and circuit
+breakers.
+
+- Every provider call gets LLM_TIMEOUT seconds (120 for the local hf and
+  ollama backends; LLM_TIMEOUT_<PROVIDER> to override).
+- Hedging: if a provider has not answered after the LLM_HEDGE_PERCENTILE of
+  its recent latencies, the next provider in the chain is started as well and
+  the first answer wins. Until LLM_HEDGE_MIN_SAMPLES latencies are known the
+  delay is LLM_HEDGE_DEFAULT_DELAY.
+- Circuit breaker: after LLM_BREAKER_FAILURES failures in a row a provider is
+  skipped for LLM_BREAKER_COOLDOWN seconds. Then one call probes it ("half
+  open"); if that fails too the cooldown doubles, up to LLM_BREAKER_MAX_COOLDOWN.
+
+The state is per process (each stage worker process learns on its own).
+"""
+import os
+import time
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv("LLM_BREAKER_MAX_COOLDOWN", "600"))
+
+# local models answer slower than the hosted APIs
+_DEFAULT_TIMEOUTS = {"hf": 120.0, "ollama": 120.0}
+
+# latencies kept per provider for the hedging percentile
+_LATENCY_WINDOW = 100
+
+
+class ProviderHealth:
+    def __init__(self, name: str):
+        self.name = name
+        self.timeout = float(os.getenv(f"LLM_TIMEOUT_{name.upper()}", str(_DEFAULT_TIMEOUTS.get(name, LLM_TIMEOUT))))
+        self.latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self.failures = 0
+        self.cooldown = LLM_BREAKER_COOLDOWN
+        self.open_until = 0.0
+        self.probing = False
+        self.calls = 0
+        self.successes = 0
+        self.errors = 0
+        self.hedges = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def state(self) -> str:
+        if self.failures < LLM_BREAKER_FAILURES:
+            return "closed"
+        return "open" if time.time() < self.open_until or self.probing else "half_open"
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return min(LLM_HEDGE_DEFAULT_DELAY, self.timeout)
+        ordered = sorted(self.latencies)
+        p = ordered[min(len(ordered) - 1, int(LLM_HEDGE_PERCENTILE * len(ordered)))]
+        return min(max(p, LLM_HEDGE_MIN_DELAY), self.timeout)
+
+
+class LLMPolicy:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers: Dict[str, ProviderHealth] = {}
+
+    def _get(self, provider: str) -> ProviderHealth:
+        health = self._providers.get(provider)
+        if health is None:
+            health = self._providers[provider] = ProviderHealth(provider)
+        return health
+
+    def timeout(self, provider: str) -> float:
+        with self._lock:
+            return self._get(provider).timeout
+
+    def hedge_delay(self, provider: str) -> Optional[float]:
+        """Seconds to wait on `provider` before hedging, or None to not hedge."""
+        if not LLM_HEDGE_ENABLED:
+            return None
+        with self._lock:
+            return self._get(provider).hedge_delay()
+
+    def acquire(self, provider: str) -> bool:
+        """May `provider` be called now? Claims the probe call of a half-open breaker."""
+        with self._lock:
+            health = self._get(provider)
+            state = health.state
+            if state == "closed":
+                health.calls += 1
+                return True
+            if state == "half_open":
+                health.probing = True
+                health.calls += 1
+                return True
+            health.skipped += 1
+            return False
+
+    def success(self, provider: str, latency: Optional[float] = None):
+        with self._lock:
+            health = self._get(provider)
+            # streamed answers (possibly cut short) say nothing about the full-call latency
+            if latency is not None:
+                health.latencies.append(latency)
+            health.successes += 1
+            health.failures = 0
+            health.cooldown = LLM_BREAKER_COOLDOWN
+            health.probing = False
+
+    def failure(self, provider: str, error: str):
+        with self._lock:
+            health = self._get(provider)
+            health.errors += 1
+            health.last_error = error.splitlines()[0][:200] if error else None
+            if health.probing:
+                # the probe failed: stay open, for longer
+                health.cooldown = min(health.cooldown * 2, LLM_BREAKER_MAX_COOLDOWN)
+            health.failures += 1
+            health.probing = False
+            if health.failures >= LLM_BREAKER_FAILURES:
+                health.open_until = time.time() + health.cooldown
+
+    def hedged(self, provider: str):
+        """`provider` was too slow: the next one is started alongside it."""
+        with self._lock:
+            self._get(provider).hedges += 1
+
+    def abandoned(self, provider: str, elapsed: float):
+        """A call cancelled because another provider answered first."""
+        with self._lock:
+            health = self._get(provider)
+            # at least this slow: keeps the percentile honest for a provider that keeps losing
+            health.latencies.append(elapsed)
+            health.probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for name, h in self._providers.items():
+                out[name] = {
+                    "state": h.state,
+                    "calls": h.calls,
+                    "successes": h.successes,
+                    "errors": h.errors,
+                    "skipped": h.skipped,
+                    "hedged": h.hedges,
+                    "timeout": h.timeout,
+                    "hedge_delay": round(h.hedge_delay(), 3) if LLM_HEDGE_ENABLED else None,
+                    "open_for": max(0.0, round(h.open_until - time.time(), 1)) if h.failures >= LLM_BREAKER_FAILURES else 0.0,
+                    "last_error": h.last_error,
+                }
+            return out
+
+
+llm_policy = LLMPolicy()
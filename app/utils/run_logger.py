@@ -25,15 +25,34 @@
 #
 
 import os
+import json
+import time
+import atexit
 import threading
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.events import notify
 
 ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "artifacts")
 os.makedirs(ARTIFACT_DIR, exist_ok=True)
 
-# Thread-safe logging
-_log_lock = threading.Lock()
+# Background log writer: agent_log() only buffers the line; a writer thread
+# appends buffered lines every LOG_FLUSH_INTERVAL seconds, or as soon as
+# LOG_FLUSH_LINES are pending. At most LOG_QUEUE_SIZE lines wait in memory.
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_FLUSH_INTERVAL = float(os.getenv("LOG_FLUSH_INTERVAL", "0.1"))
+LOG_FLUSH_LINES = int(os.getenv("LOG_FLUSH_LINES", "512"))
+LOG_MAX_OPEN_FILES = int(os.getenv("LOG_MAX_OPEN_FILES", "128"))
+
+# Structured events: every agent_log() line and every log_event() record is also
+# appended to artifacts/<run_id>_events.jsonl. Events other than plain log lines
+# (stage timings, retries, failures) and ERROR lines are indexed in the run store.
+EVENT_LOG_JSONL = os.getenv("EVENT_LOG_JSONL", "1").lower() not in ("0", "false", "no")
+
+# Agents that write per-run log files (artifacts/<run_id>_<agent>_log.txt)
+RUN_LOG_AGENTS = ("orchestrator", "ps_agent", "data_agent", "prep_agent", "automl_agent", "eval_agent")
 
 
 def agent_log(run_id: str, message: str, agent: str = "system", level: str = "INFO"):
@@ -46,24 +65,298 @@ def agent_log(run_id: str, message: str, agent: str = "system", level: str = "IN
         agent: Agent name (system, orchestrator, ps_agent, data_agent, etc.)
         level: Log level (INFO, WARNING, ERROR, DEBUG)
     """
+    log_event(run_id, "log", agent=agent, level=level, message=message)
+
+
+def log_event(
+    run_id: str,
+    event: str,
+    agent: str = "orchestrator",
+    stage: Optional[str] = None,
+    level: str = "INFO",
+    duration: Optional[float] = None,
+    message: Optional[str] = None,
+    **payload: Any,
+) -> Dict[str, Any]:
+    """
+    Record a structured run event, e.g. log_event(run_id, "stage_end", stage="prep_agent",
+    duration=12.3, attempt=1). The record goes to the run's events.jsonl, is indexed
+    unless it is a plain log line, and is rendered as a line of the agent's text log.
+    Serialisation and I/O happen on the writer thread.
+    """
     if not run_id:
         run_id = "no_run"
-    
-    fname = f"{run_id}_{agent}_log.txt"
-    path = os.path.join(ARTIFACT_DIR, fname)
-    
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_line = f"[{timestamp}] [{level}] {message}\n"
-    
+    record = {
+        "ts": time.time(),
+        "run_id": run_id,
+        "agent": agent,
+        "stage": stage,
+        "event": event,
+        "level": level,
+        "duration": round(duration, 3) if duration is not None else None,
+        "message": message,
+        "payload": payload,
+    }
     try:
-        with _log_lock:
-            with open(path, "a", encoding="utf-8") as f:
-                f.write(log_line)
-                f.flush()
+        log_writer.write(record)
     except Exception as e:
         # Fallback to console if file logging fails
-        print(f"[LOGGER ERROR] Failed to write to {path}: {e}")
-        print(f"[{timestamp}] [{level}] {message}")
+        print(f"[LOGGER ERROR] Failed to write log for {run_id}: {e}")
+        print(render_event(record), end="")
+    return record
+
+
+_ts_cache: Tuple[int, str] = (-1, "")
+
+
+def _format_ts(ts: float) -> str:
+    # one strftime per second of log output rather than per line
+    global _ts_cache
+    second = int(ts)
+    if _ts_cache[0] != second:
+        _ts_cache = (second, datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S"))
+    return _ts_cache[1]
+
+
+def render_event(record: Dict[str, Any]) -> str:
+    """The text-log line of an event record."""
+    timestamp = _format_ts(record["ts"])
+    message = record.get("message")
+    if message is None:
+        fields = [record["event"]]
+        if record.get("stage"):
+            fields.append(f"stage={record['stage']}")
+        if record.get("duration") is not None:
+            fields.append(f"duration={record['duration']}s")
+        fields.extend(f"{k}={v}" for k, v in (record.get("payload") or {}).items())
+        message = " ".join(fields)
+    return f"[{timestamp}] [{record['level']}] {message}\n"
+
+
+def read_events(run_id: str, event: Optional[str] = None, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+    """All event records of a run from its events.jsonl, optionally filtered."""
+    path = os.path.join(ARTIFACT_DIR, f"{run_id}_events.jsonl")
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # a line cut short by a crash
+                    continue
+                if (event is None or record.get("event") == event) and (agent is None or record.get("agent") == agent):
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class LogWriter:
+    """
+    Writes event records from a bounded in-memory buffer on one background thread.
+
+    Callers only append the record to a deque. The writer wakes every flush
+    interval, or as soon as LOG_FLUSH_LINES are pending, renders the batch into
+    text-log and events.jsonl lines, and appends each file's lines with a single
+    write() on a cached O_APPEND descriptor: one syscall per file per batch, and
+    lines from other processes writing the same file never interleave mid-line.
+    Indexed events go to the run store in one transaction per batch.
+    Subscribers of a run are notified once its lines are on disk.
+    """
+
+    _FLUSH = "flush"
+    _STOP = "stop"
+
+    def __init__(
+        self,
+        maxsize: int = LOG_QUEUE_SIZE,
+        flush_interval: float = LOG_FLUSH_INTERVAL,
+        flush_lines: int = LOG_FLUSH_LINES,
+        max_open_files: int = LOG_MAX_OPEN_FILES,
+    ):
+        self.maxsize = max(1, maxsize)
+        self.flush_interval = flush_interval
+        self.flush_lines = max(1, flush_lines)
+        self.max_open_files = max(1, max_open_files)
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._pending: deque = deque()
+        self._wake = threading.Event()
+        self._drained = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._fds: "OrderedDict[str, int]" = OrderedDict()
+        # files already recorded in the artifact manifest by this process
+        self._registered: set = set()
+        self._io_lock = threading.Lock()
+        self.lines_written = 0
+        self.events_indexed = 0
+        self.batches = 0
+
+    def _running(self) -> bool:
+        """Start the writer thread on first use (again in a forked child). False once stopped."""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # a forked child inherits neither the thread nor the parent's descriptors' ownership
+                    self._pending = deque()
+                    self._fds = OrderedDict()
+                    self._thread = threading.Thread(target=self._loop, daemon=True, name="log-writer")
+                    self._thread.start()
+                    self._pid = os.getpid()
+        return self._thread.is_alive()
+
+    def write(self, record: Dict[str, Any]):
+        if self._running():
+            pending = len(self._pending)
+            if pending >= self.maxsize:
+                # backpressure: wait for the writer to drain the buffer, briefly
+                self._wake.set()
+                with self._drained:
+                    self._drained.wait(1.0)
+                pending = len(self._pending)
+            if pending < self.maxsize:
+                self._pending.append(record)
+                if pending + 1 >= self.flush_lines:
+                    self._wake.set()
+                return
+        # writer stopped or stuck: write synchronously rather than drop the line
+        with self._io_lock:
+            self._write_records([record])
+
+    def _control(self, kind: str, timeout: Optional[float]) -> bool:
+        if self._pid != os.getpid() or self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._pending.append((kind, done))
+        self._wake.set()
+        return done.wait(timeout)
+
+    def flush(self, timeout: Optional[float] = 5.0) -> bool:
+        """Block until every line buffered before this call is on disk."""
+        return self._control(self._FLUSH, timeout)
+
+    def shutdown(self, timeout: Optional[float] = 5.0):
+        """Drain the buffer, close cached descriptors and stop the writer thread."""
+        thread = self._thread
+        if self._control(self._STOP, timeout) and thread is not None:
+            thread.join(timeout)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            records: List[Dict[str, Any]] = []
+            waiters = []
+            stop = False
+            while self._pending:
+                item = self._pending.popleft()
+                if isinstance(item, tuple):
+                    kind, done = item
+                    waiters.append(done)
+                    if kind == self._STOP:
+                        stop = True
+                        break
+                    continue
+                records.append(item)
+            with self._drained:
+                self._drained.notify_all()
+            if records:
+                try:
+                    with self._io_lock:
+                        self._write_records(records)
+                except Exception as e:
+                    print(f"[LOGGER ERROR] Failed to write log batch: {e}")
+            if stop:
+                self._close_all()
+            for event in waiters:
+                event.set()
+            if stop:
+                return
+
+    def _fd(self, path: str) -> int:
+        fd = self._fds.pop(path, None)
+        if fd is not None and os.fstat(fd).st_nlink == 0:
+            # the file was deleted (cleanup / retention); start a new one
+            os.close(fd)
+            fd = None
+        if fd is None:
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            while len(self._fds) >= self.max_open_files:
+                os.close(self._fds.popitem(last=False)[1])
+        self._fds[path] = fd
+        return fd
+
+    def _write_records(self, records: List[Dict[str, Any]]):
+        by_path: Dict[str, Tuple[str, List[str]]] = {}
+        indexed = []
+        for record in records:
+            run_id = record["run_id"]
+            text_path = os.path.join(ARTIFACT_DIR, f"{run_id}_{record['agent']}_log.txt")
+            by_path.setdefault(text_path, (run_id, []))[1].append(render_event(record))
+            if EVENT_LOG_JSONL:
+                jsonl_path = os.path.join(ARTIFACT_DIR, f"{run_id}_events.jsonl")
+                by_path.setdefault(jsonl_path, (run_id, []))[1].append(json.dumps(record, default=str) + "\n")
+            if (record["event"] != "log" or record["level"] == "ERROR") and run_id != "no_run":
+                indexed.append(record)
+        self._append(by_path, indexed)
+
+    def _append(self, by_path: Dict[str, Tuple[str, List[str]]], records: List[Dict[str, Any]]):
+        for path, (run_id, lines) in by_path.items():
+            try:
+                fd = self._fd(path)
+                data = "".join(lines).encode("utf-8")
+                while data:
+                    data = data[os.write(fd, data):]
+                self.lines_written += len(lines)
+            except Exception as e:
+                print(f"[LOGGER ERROR] Failed to write to {path}: {e}")
+                continue
+            if path not in self._registered:
+                self._registered.add(path)
+                if run_id != "no_run":
+                    from app.storage import register_artifact
+                    register_artifact(run_id, path, kind="log")
+        if records:
+            try:
+                from app.run_store import index_events
+                index_events(records)
+                self.events_indexed += len(records)
+            except Exception as e:
+                print(f"[LOGGER ERROR] Failed to index {len(records)} events: {e}")
+        self.batches += 1
+        for run_id in {run_id for run_id, _ in by_path.values()}:
+            notify(run_id)
+
+    def _close_all(self):
+        with self._io_lock:
+            while self._fds:
+                try:
+                    os.close(self._fds.popitem()[1])
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "open_files": len(self._fds),
+            "lines_written": self.lines_written,
+            "events_indexed": self.events_indexed,
+            "batches": self.batches,
+        }
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.shutdown)
+
+
+def flush_logs(timeout: Optional[float] = 5.0) -> bool:
+    """Wait until everything agent_log() has queued in this process is written."""
+    return log_writer.flush(timeout)
+
+
+def shutdown_logging(timeout: Optional[float] = 5.0):
+    log_writer.shutdown(timeout)
 
 
 def get_log_tail(run_id: str, agent: str = "orchestrator", lines: int = 200) -> str:
@@ -85,13 +378,78 @@ def get_log_tail(run_id: str, agent: str = "orchestrator", lines: int = 200) ->
         return ""
     
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            all_lines = f.readlines()
-            return "".join(all_lines[-lines:])
+        return tail_file(path, lines)[0]
     except Exception as e:
         return f"Error reading log: {e}"
 
 
+def tail_file(path: str, lines: int = 200, block_size: int = 64 * 1024) -> Tuple[str, int]:
+    """
+    Last `lines` lines of a file, read by seeking backward from the end in blocks,
+    so the cost depends on the size of the tail rather than of the file.
+    Also returns the end offset, a cursor for read_log_from().
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        end = f.tell()
+        pos = end
+        blocks: List[bytes] = []
+        newlines = 0
+        # one newline more than requested guarantees the first kept line is whole
+        while pos > 0 and newlines <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+    if lines <= 0 or end == 0:
+        return "", end
+    parts = b"".join(reversed(blocks)).split(b"\n")
+    trailing = parts[-1] == b""
+    if trailing:
+        parts.pop()
+    tail = b"\n".join(parts[-lines:]) + (b"\n" if trailing else b"")
+    return tail.decode("utf-8", errors="replace"), end
+
+
+def get_log_since(run_id: str, agent: str = "orchestrator", offset: int = 0, max_bytes: int = 256 * 1024) -> Tuple[str, int]:
+    """
+    New log text after byte `offset` and the offset to pass next time, so pollers
+    only transfer what was appended since their last read.
+    """
+    lines, new_offset = read_log_from(run_id, agent, offset, max_bytes)
+    return "".join(line + "\n" for line in lines), new_offset
+
+
+def read_log_from(run_id: str, agent: str = "orchestrator", offset: int = 0, max_bytes: int = 256 * 1024) -> Tuple[List[str], int]:
+    """
+    Complete lines written to a run's log after byte `offset`, and the offset to
+    resume from. A partial last line is left for the next read. If the file is
+    shorter than `offset` (it was recreated) reading restarts from the beginning.
+    """
+    path = os.path.join(ARTIFACT_DIR, f"{run_id}_{agent}_log.txt")
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return [], offset
+    if offset > size:
+        offset = 0
+    if offset == size:
+        return [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        chunk = f.read(max_bytes)
+    end = chunk.rfind(b"\n")
+    if end < 0:
+        # a single line longer than max_bytes: hand it out as is
+        if len(chunk) < max_bytes:
+            return [], offset
+        end = len(chunk) - 1
+    data = chunk[: end + 1]
+    return data.decode("utf-8", errors="replace").splitlines(), offset + len(data)
+
+
 def clear_old_logs(days: int = 90):
     """
     Delete log files older than specified days.
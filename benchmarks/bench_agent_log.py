@@ -0,0 +1,72 @@
+"""
+Micro-benchmark for agent_log() (app/utils/run_logger.py).
+
+Compares the previous synchronous logger (global lock, open / write / flush /
+close per line) with the background LogWriter, with several threads logging
+to their own run's files at once, as concurrent runs do. The LogWriter also
+writes each line's structured record to the run's events.jsonl.
+
+Usage:
+    python -m benchmarks.bench_agent_log [--threads 8] [--lines 20000]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from app.utils import run_logger
+
+_legacy_lock = threading.Lock()
+
+
+def legacy_log(run_id: str, message: str, agent: str = "system", level: str = "INFO"):
+    path = os.path.join(run_logger.ARTIFACT_DIR, f"{run_id}_{agent}_log.txt")
+    line = f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] [{level}] {message}\n"
+    with _legacy_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+
+
+def run(label: str, log, threads: int, lines: int):
+    def worker(i: int):
+        run_id = f"bench{i}"
+        for n in range(lines):
+            log(run_id, f"iteration {n}, current learner lgbm, best loss 0.123456", agent="automl_agent")
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    logged = time.perf_counter() - start
+    run_logger.flush_logs(timeout=None)
+    written = time.perf_counter() - start
+    total = threads * lines
+    print(f"  {label:<22} callers blocked {logged * 1e6 / total:>7.2f} us/line   all on disk after {written:>6.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--lines", type=int, default=20000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_agent_log_")
+    run_logger.ARTIFACT_DIR = tmp
+    # keep the benchmark out of the run store's artifact manifest
+    for i in range(args.threads):
+        run_logger.log_writer._registered.add(os.path.join(tmp, f"bench{i}_automl_agent_log.txt"))
+        run_logger.log_writer._registered.add(os.path.join(tmp, f"bench{i}_events.jsonl"))
+    print(f"{args.threads} threads x {args.lines} lines")
+    run("sync open/write/close", legacy_log, args.threads, args.lines)
+    run("LogWriter", run_logger.agent_log, args.threads, args.lines)
+    print(f"  writer: {run_logger.log_writer.stats()}")
+    shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+    main()
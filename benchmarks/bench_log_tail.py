@@ -0,0 +1,90 @@
+"""
+Micro-benchmark for log tailing (app/utils/run_logger.py).
+
+Writes a throw-away log of the given size and compares the old readlines()
+tail used by get_status / get_log_tail with the seek-based tail_file(), and
+measures incremental reads from a byte-offset cursor while the log grows.
+
+Usage:
+    python -m benchmarks.bench_log_tail [--size-mb 500] [--lines 200] [--repeat 5]
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.utils import run_logger
+
+
+def write_log(path: str, size_mb: int):
+    line = "[2025-01-01 12:00:00] [INFO] [automl_agent] iteration 12345, current learner lgbm, best loss 0.123456\n"
+    block = (line * (1024 * 1024 // len(line) + 1)).encode()[: 1024 * 1024]
+    # end the block on a line boundary
+    block = block[: block.rfind(b"\n") + 1]
+    with open(path, "wb") as f:
+        written = 0
+        while written < size_mb * 1024 * 1024:
+            f.write(block)
+            written += len(block)
+
+
+def legacy_tail(path: str, lines: int) -> str:
+    with open(path, "r", encoding="utf-8") as f:
+        all_lines = f.readlines()
+        return "".join(all_lines[-lines:])
+
+
+def measure(label: str, fn, repeat: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} {elapsed * 1000:>10.2f} ms/call   peak {peak / 1e6:>9.2f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=500)
+    parser.add_argument("--lines", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--skip-legacy", action="store_true", help="skip the readlines() baseline (needs RAM ~ several x log size)")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_log_tail_")
+    run_logger.ARTIFACT_DIR = tmp
+    path = os.path.join(tmp, "bench_orchestrator_log.txt")
+
+    print(f"Writing a {args.size_mb} MB log in {tmp} ...")
+    write_log(path, args.size_mb)
+
+    print(f"\ntail of last {args.lines} lines")
+    if not args.skip_legacy:
+        old = measure("readlines() tail", lambda: legacy_tail(path, args.lines), max(1, args.repeat // 5))
+    new, offset = measure("seek-based tail_file()", lambda: run_logger.tail_file(path, args.lines), args.repeat)
+    if not args.skip_legacy:
+        print(f"  identical output: {old == new}")
+
+    print("\nincremental reads from a byte-offset cursor (100 new lines each)")
+    chunk = "".join(f"[2025-01-01 12:00:01] [INFO] new line {i}\n" for i in range(100))
+
+    def append_and_read():
+        nonlocal offset
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(chunk)
+        text, offset = run_logger.get_log_since("bench", "orchestrator", offset)
+        assert text == chunk
+        return text
+
+    measure("append + get_log_since()", append_and_read, args.repeat * 20)
+
+    os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
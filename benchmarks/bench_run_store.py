@@ -0,0 +1,121 @@
+"""
+Micro-benchmark for the run store (app/run_store.py).
+
+Seeds a throw-away database with historical runs and measures status reads,
+status writes and queue scans per second, comparing the pooled WAL store with
+the old connect-per-statement helpers on an unindexed table.
+
+Usage:
+    python -m benchmarks.bench_run_store [--runs 100000] [--ops 5000]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from app import run_store
+
+
+def seed(path: str, n_runs: int, indexed: bool):
+    if indexed:
+        run_store.init_db(path)
+        conn = run_store.get_conn(path)
+    else:
+        conn = sqlite3.connect(path, isolation_level=None)
+        conn.execute(
+            """CREATE TABLE runs (run_id TEXT PRIMARY KEY, created_at REAL, status TEXT,
+               last_error TEXT, state_json TEXT, worker_id TEXT, lease_expires REAL)"""
+        )
+    now = time.time()
+    rows = []
+    ids = []
+    for i in range(n_runs):
+        run_id = str(uuid.uuid4())
+        ids.append(run_id)
+        status = "queued" if i % 1000 == 0 else random.choice(["completed", "completed", "completed", "failed"])
+        rows.append((run_id, now - n_runs + i, status, "", json.dumps({"phase": "done", "metrics": {"f1": 0.9}})))
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO runs (run_id, created_at, status, last_error, state_json) VALUES (?,?,?,?,?)", rows)
+    conn.execute("COMMIT")
+    if not indexed:
+        conn.close()
+    return ids
+
+
+# ----------------------
+# Old helpers: one connection per statement, no indexes
+# ----------------------
+def legacy_read(path, run_id):
+    conn = sqlite3.connect(path)
+    row = conn.execute(
+        "SELECT run_id, created_at, status, last_error, state_json FROM runs WHERE run_id=?", (run_id,)
+    ).fetchone()
+    conn.close()
+    return json.loads(row[4])
+
+
+def legacy_update(path, run_id):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "UPDATE runs SET status=?, last_error=?, state_json=? WHERE run_id=?",
+        ("running", "", json.dumps({"phase": "training"}), run_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_queue_scan(path):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT run_id, state_json FROM runs WHERE status='queued' ORDER BY created_at ASC LIMIT 10"
+    ).fetchall()
+    conn.close()
+    return rows
+
+
+def timed(label, fn, ops):
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<28} {ops / elapsed:>12,.0f} ops/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=5_000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_run_store_")
+    legacy_db = os.path.join(tmp, "legacy.db")
+    pooled_db = os.path.join(tmp, "pooled.db")
+
+    print(f"Seeding {args.runs:,} historical runs in {tmp} ...")
+    legacy_ids = seed(legacy_db, args.runs, indexed=False)
+    pooled_ids = seed(pooled_db, args.runs, indexed=True)
+
+    print("\nlegacy (connect per call, no index)")
+    timed("status read", lambda: legacy_read(legacy_db, random.choice(legacy_ids)), args.ops)
+    timed("status write", lambda: legacy_update(legacy_db, random.choice(legacy_ids)), args.ops)
+    timed("queue scan", lambda: legacy_queue_scan(legacy_db), max(1, args.ops // 10))
+
+    run_store.DB_PATH = pooled_db
+    print("\npooled WAL store")
+    timed("status read", lambda: run_store.read_run(random.choice(pooled_ids)), args.ops)
+    timed(
+        "status write",
+        lambda: run_store.update_run_state(random.choice(pooled_ids), "running", {"phase": "training"}),
+        args.ops,
+    )
+    timed("queue scan", lambda: run_store.fetch_claimable_runs(limit=10), max(1, args.ops // 10))
+
+    run_store.close_all()
+
+
+if __name__ == "__main__":
+    main()
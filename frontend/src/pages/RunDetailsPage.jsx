@@ -11,6 +11,7 @@ export default function RunDetailsPage() {
   
   useEffect(() => {
     let interval
+    let source
     
     const fetchStatus = async () => {
       try {
@@ -25,14 +26,26 @@ export default function RunDetailsPage() {
         setError(err.message)
         setLoading(false)
         if (interval) clearInterval(interval)
+        if (source) source.close()
       }
     }
     
     fetchStatus()
-    interval = setInterval(fetchStatus, 2000)
+    if (window.EventSource) {
+      // refresh on each phase change instead of polling (state only: the page re-fetches the log tail)
+      source = new EventSource(mlApi.runEventsUrl(runId, 'none'))
+      source.addEventListener('state', fetchStatus)
+      source.addEventListener('end', () => {
+        source.close()
+        fetchStatus()
+      })
+    } else {
+      interval = setInterval(fetchStatus, 2000)
+    }
     
     return () => {
       if (interval) clearInterval(interval)
+      if (source) source.close()
     }
   }, [runId])
   
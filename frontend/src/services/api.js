@@ -36,6 +36,11 @@ export const mlApi = {
     return response.data
   },
   
+  // Server-Sent Events stream of a run's state changes and log lines
+  runEventsUrl: (runId, logsFrom = 'start') => {
+    return `${API_BASE_URL}/runs/${runId}/events?logs_from=${logsFrom}`
+  },
+  
   // List all runs
   listRuns: async () => {
     const response = await api.get('/runs')
@@ -0,0 +1,28 @@
+"""
+Shared setup for the pytest suite.
+
+The app reads its paths from the environment at import time, so they are
+pointed at a scratch directory here, before any test imports app modules.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_SCRATCH = tempfile.mkdtemp(prefix="automl-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_SCRATCH, "runs.db"))
+os.environ.setdefault("ARTIFACT_DIR", os.path.join(_SCRATCH, "artifacts"))
+os.environ.setdefault("DATA_DIR", os.path.join(_SCRATCH, "data"))
+os.environ.setdefault("LLM_CACHE_DB", os.path.join(_SCRATCH, "llm_cache.db"))
+os.environ.setdefault("RETENTION_INTERVAL", "0")
+os.environ["LLM_MODE"] = "none"
+for key in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "GOOGLE_API_KEY"):
+    os.environ.pop(key, None)
+os.makedirs(os.environ["ARTIFACT_DIR"], exist_ok=True)
+os.makedirs(os.environ["DATA_DIR"], exist_ok=True)
+
+from app.run_store import init_db  # noqa: E402
+
+init_db()
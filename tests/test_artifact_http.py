@@ -0,0 +1,82 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.artifact_http import choose_encoding, parse_range
+from app.storage import save_artifact
+
+client = TestClient(main.app)
+
+REPORT = "".join(f'{{"row": {i}, "value": "{"v" * 20}"}}\n' for i in range(200))
+
+
+@pytest.fixture(scope="module")
+def report_url():
+    save_artifact("http-run", "report.json", REPORT)
+    return "/artifacts/http-run_report.json"
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-99", 1000) == (0, 99)
+    assert parse_range("bytes=900-", 1000) == (900, 999)
+    assert parse_range("bytes=-100", 1000) == (900, 999)
+    assert parse_range("bytes=990-2000", 1000) == (990, 999)
+    # ignored: the whole file is sent
+    for header in ("items=0-1", "bytes=0-1,5-6", "bytes=5-1", "bytes=a-b", "bytes=-"):
+        assert parse_range(header, 1000) is None
+    for header in ("bytes=1000-", "bytes=-0"):
+        with pytest.raises(ValueError):
+            parse_range(header, 1000)
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, identity") is None
+    assert choose_encoding(None) is None
+
+
+def test_full_and_conditional_get(report_url):
+    full = client.get(report_url, headers={"Accept-Encoding": "identity"})
+    assert full.status_code == 200
+    assert full.text == REPORT
+    etag = full.headers["etag"]
+    # strong validator from the manifest checksum
+    assert not etag.startswith("W/")
+    assert full.headers["content-type"].startswith("application/json")
+
+    assert client.get(report_url, headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(report_url, headers={"If-Modified-Since": full.headers["last-modified"]}).status_code == 304
+    head = client.head(report_url, headers={"Accept-Encoding": "identity"})
+    assert head.status_code == 200 and head.headers["content-length"] == str(len(REPORT))
+
+
+def test_ranges(report_url):
+    etag = client.head(report_url, headers={"Accept-Encoding": "identity"}).headers["etag"]
+    part = client.get(report_url, headers={"Range": "bytes=10-19", "Accept-Encoding": "identity"})
+    assert part.status_code == 206
+    assert part.content == REPORT.encode()[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(REPORT)}"
+
+    assert client.get(report_url, headers={"Range": "bytes=-5"}).content == REPORT.encode()[-5:]
+    unsatisfiable = client.get(report_url, headers={"Range": f"bytes={len(REPORT)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(REPORT)}"
+
+    # a resumed download of a file that has changed gets the whole file
+    assert client.get(report_url, headers={"Range": "bytes=10-19", "If-Range": '"other"'}).status_code == 200
+    assert client.get(report_url, headers={"Range": "bytes=10-19", "If-Range": etag}).status_code == 206
+
+
+def test_gzip_is_cached_and_has_its_own_etag(report_url):
+    first = client.get(report_url, headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip"
+    assert first.headers["vary"] == "Accept-Encoding"
+    assert first.text == REPORT
+    assert first.headers["etag"].endswith('-gzip"')
+    assert int(first.headers["content-length"]) < len(REPORT)
+    assert client.get(report_url, headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]}).status_code == 304
+
+
+def test_path_traversal_is_rejected():
+    assert client.get("/artifacts/..%2Fruns.db").status_code in (400, 404)
+    assert client.get("/artifacts/.blobs").status_code == 400
@@ -0,0 +1,53 @@
+import os
+import uuid
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app import storage
+from app.run_store import list_run_artifacts, write_run_db
+from app.storage import artifact_path, list_artifacts, migrate_flat_artifacts, register_artifact, run_id_for_file
+
+client = TestClient(main.app)
+
+
+def test_registered_files_are_listed_from_the_manifest():
+    write_run_db("manifest-run", "running", {})
+    model = artifact_path("manifest-run", "model.joblib")
+    with open(model, "wb") as f:
+        f.write(b"model bytes")
+    log = artifact_path("manifest-run", "automl_agent_log.txt")
+    with open(log, "w") as f:
+        f.write("line\n")
+
+    assert register_artifact("manifest-run", model)["kind"] == "model"
+    assert register_artifact("manifest-run", log)["sha256"] is None
+    assert list_artifacts("manifest-run") == ["manifest-run_automl_agent_log.txt", "manifest-run_model.joblib"]
+
+    # logs keep growing: the listing reports their current size
+    with open(log, "a") as f:
+        f.write("another line\n")
+    listed = {a["name"]: a for a in client.get("/runs/manifest-run/artifacts").json()["artifacts"]}
+    assert listed["manifest-run_automl_agent_log.txt"]["size"] == os.path.getsize(log)
+    assert listed["manifest-run_model.joblib"]["url"] == "/artifacts/manifest-run_model.joblib"
+    assert listed["manifest-run_model.joblib"]["sha256"]
+
+
+def test_run_id_for_file():
+    run = str(uuid.uuid4())
+    assert run_id_for_file(f"{run}_plan.json", []) == run
+    known = sorted(["run", "run_2"], key=len, reverse=True)
+    assert run_id_for_file("run_2_plan.json", known) == "run_2"
+    assert run_id_for_file("run_plan.json", known) == "run"
+    assert run_id_for_file("other_plan.json", known) is None
+
+
+def test_flat_files_are_migrated_once():
+    write_run_db("manifest-old", "completed", {})
+    path = os.path.join(storage.ARTIFACT_DIR, "manifest-old_evaluation.json")
+    with open(path, "w") as f:
+        f.write("{}")
+
+    assert migrate_flat_artifacts(force=True) >= 1
+    assert [a["name"] for a in list_run_artifacts("manifest-old")] == ["manifest-old_evaluation.json"]
+    assert migrate_flat_artifacts() == 0
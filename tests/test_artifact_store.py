@@ -0,0 +1,120 @@
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.artifact_store import ArtifactStore, S3ArtifactStore
+
+
+class _NotFound(Exception):
+    response = {"Error": {"Code": "404"}}
+
+
+class FakeS3:
+    """The boto3 client calls S3ArtifactStore makes, against a dict."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = 0
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _NotFound()
+        return {}
+
+    def upload_file(self, path, bucket, key):
+        with open(path, "rb") as f:
+            self.objects[(bucket, key)] = (f.read(), datetime.now(timezone.utc))
+        self.uploads += 1
+
+    def download_file(self, bucket, key, path):
+        with open(path, "wb") as f:
+            f.write(self.objects[(bucket, key)][0])
+
+    def delete_object(self, Bucket, Key):
+        del self.objects[(Bucket, Key)]
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        yield {"Contents": [
+            {"Key": key, "Size": len(data), "LastModified": modified}
+            for (bucket, key), (data, modified) in self.objects.items()
+            if bucket == Bucket and key.startswith(Prefix)
+        ]}
+
+    def age(self, seconds):
+        for k, (data, modified) in self.objects.items():
+            self.objects[k] = (data, modified - timedelta(seconds=seconds))
+
+
+@pytest.fixture
+def s3(tmp_path):
+    client = FakeS3()
+    return S3ArtifactStore(str(tmp_path), "bucket", prefix="test/", client=client), client
+
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        ArtifactStore("artifacts")
+
+
+def test_put_uploads_each_blob_once(s3, tmp_path):
+    store, client = s3
+    a = store.put_bytes("s3-run-a", "split.csv", b"s3 put test\n1,2\n")
+    b = store.put_bytes("s3-run-b", "split.csv", b"s3 put test\n1,2\n")
+
+    assert a["sha256"] == b["sha256"]
+    assert client.uploads == 1
+    assert list(client.objects) == [("bucket", f"test/blobs/{a['sha256']}")]
+    # the two runs share one local copy
+    assert os.stat(a["path"]).st_ino == os.stat(b["path"]).st_ino == os.stat(store.blob_path(a["sha256"])).st_ino
+
+    # another process (no memory of its uploads) finds the object in the bucket
+    other = S3ArtifactStore(str(tmp_path), "bucket", prefix="test/", client=client)
+    other.put_bytes("s3-run-c", "split.csv", b"s3 put test\n1,2\n")
+    assert client.uploads == 1
+
+
+def test_dedupe_stays_local(s3, tmp_path):
+    store, client = s3
+    first, second = tmp_path / "one.csv", tmp_path / "two.csv"
+    first.write_bytes(b"s3 dedupe test\n")
+    second.write_bytes(b"s3 dedupe test\n")
+
+    assert store.dedupe(str(first)) == store.dedupe(str(second))
+    assert os.stat(first).st_ino == os.stat(second).st_ino
+    assert client.uploads == 0
+
+
+def test_fetch_restores_from_the_bucket(s3, tmp_path):
+    store, client = s3
+    art = store.put_bytes("s3-run-fetch", "model.joblib", b"s3 fetch test")
+    os.remove(art["path"])
+    shutil.rmtree(tmp_path / ".blobs")
+
+    assert store.fetch(art["path"])
+    with open(art["path"], "rb") as f:
+        assert f.read() == b"s3 fetch test"
+
+
+def test_gc_removes_unreferenced_blobs(s3):
+    store, client = s3
+    kept = store.put_bytes("s3-run-kept", "report.json", b'{"s3": "kept"}')
+    dropped = store.put_bytes("s3-run-dropped", "report.json", b'{"s3": "dropped"}')
+    client.age(7200)
+    recent = store.put_bytes("s3-run-recent", "report.json", b'{"s3": "recent"}')
+
+    store.delete_run("s3-run-dropped")
+    store.delete_run("s3-run-recent")
+    result = store.gc()
+
+    assert result["blobs_removed"] == 2
+    assert result["remote_blobs_removed"] == 1
+    assert not os.path.exists(store.blob_path(dropped["sha256"]))
+    keys = {key for _, key in client.objects}
+    # an unreferenced object younger than an hour may still be about to be recorded
+    assert keys == {store.key(kept["sha256"]), store.key(recent["sha256"])}
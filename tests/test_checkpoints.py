@@ -0,0 +1,38 @@
+from app.checkpoints import StageCheckpoints
+from app.run_store import read_run, write_run_db
+
+
+def _resumed(run_id):
+    return StageCheckpoints(run_id, read_run(run_id)["state"])
+
+
+def test_checkpointed_stage_is_not_run_again():
+    write_run_db("cp-resume", "running", {})
+    calls = []
+    checkpoints = StageCheckpoints("cp-resume", {})
+    assert checkpoints.run("ps_agent", lambda: calls.append(1) or {"raw_text": "x"}) == {"raw_text": "x"}
+
+    # the run is retried: a fresh StageCheckpoints reads them from the run state
+    resumed = _resumed("cp-resume")
+    assert resumed.completed() == ["ps_agent"]
+    assert resumed.run("ps_agent", lambda: calls.append(2)) == {"raw_text": "x"}
+    assert calls == [1]
+
+
+def test_missing_output_file_reruns_the_stage_and_drops_downstream(tmp_path):
+    write_run_db("cp-stale", "running", {})
+    dataset = tmp_path / "data.csv"
+    dataset.write_text("a,b\n1,2\n")
+    checkpoints = StageCheckpoints("cp-stale", {})
+    checkpoints.run("data_agent", lambda: {"dataset_path": str(dataset)})
+    checkpoints.run("model_plan", lambda: {"models": ["lgbm"]})
+    checkpoints.run("prep_agent", lambda: {"train_path": None})
+
+    dataset.unlink()
+    resumed = _resumed("cp-stale")
+    assert resumed.run("data_agent", lambda: {"dataset_path": "new.csv"}) == {"dataset_path": "new.csv"}
+    # everything built from the old dataset goes, the result just saved stays
+    state = read_run("cp-stale")["state"]["checkpoints"]
+    assert state["model_plan"] is None and state["prep_agent"] is None
+    assert state["data_agent"]["result"] == {"dataset_path": "new.csv"}
+    assert _resumed("cp-stale").completed() == ["data_agent"]
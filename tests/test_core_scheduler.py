@@ -0,0 +1,35 @@
+import threading
+import time
+
+from app.scheduler import CoreScheduler
+
+
+def test_runs_are_admitted_by_free_cores():
+    sched = CoreScheduler(total_cores=8, cores_per_run=3)
+    assert sched.acquire() == 3
+    assert sched.acquire() == 3
+    # 2 cores left: a third run waits
+    assert sched.acquire(timeout=0.05) == 0
+    assert sched.acquire(2) == 2
+    assert sched.stats()["cores_free"] == 0
+
+
+def test_release_wakes_a_waiting_run():
+    sched = CoreScheduler(total_cores=4, cores_per_run=4)
+    assert sched.acquire() == 4
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(sched.acquire(timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    assert granted == []
+    sched.release(4)
+    waiter.join(5)
+    assert granted == [4]
+
+
+def test_budget_is_capped_at_the_machine():
+    sched = CoreScheduler(total_cores=2, cores_per_run=16)
+    assert sched.cores_per_run == 2
+    assert sched.acquire(64) == 2
+    sched.release(64)
+    assert sched.stats()["cores_in_use"] == 0
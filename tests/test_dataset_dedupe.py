@@ -0,0 +1,30 @@
+import os
+
+import pandas as pd
+
+from app.artifact_store import file_sha256
+from app.storage import DATA_DIR, get_artifact_store, save_dataset_csv
+
+
+def test_identical_datasets_share_one_blob():
+    df = pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]})
+    a = save_dataset_csv(df, os.path.join(DATA_DIR, "share-a_synthetic.csv"))
+    b = save_dataset_csv(df, os.path.join(DATA_DIR, "share-b_synthetic.csv"))
+    assert os.stat(a).st_ino == os.stat(b).st_ino
+
+
+def test_rewriting_a_dataset_leaves_other_runs_alone():
+    df = pd.DataFrame({"a": [1, 2, 3]})
+    a = save_dataset_csv(df, os.path.join(DATA_DIR, "rewrite-a_synthetic.csv"))
+    b = save_dataset_csv(df, os.path.join(DATA_DIR, "rewrite-b_synthetic.csv"))
+    sha = file_sha256(b)
+
+    # a retry of run A writes a different dataset to the same path
+    save_dataset_csv(pd.DataFrame({"a": [7, 8, 9, 10]}), a)
+
+    assert pd.read_csv(b)["a"].tolist() == [1, 2, 3]
+    assert file_sha256(b) == sha
+    blob = get_artifact_store().blob_path(sha)
+    assert file_sha256(blob) == sha
+    assert pd.read_csv(a)["a"].tolist() == [7, 8, 9, 10]
+    assert not [f for f in os.listdir(DATA_DIR) if f.endswith(".part")]
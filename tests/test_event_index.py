@@ -0,0 +1,48 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.run_store import query_events, stage_stats, write_run_db
+from app.utils.run_logger import agent_log, flush_logs, log_event, read_events
+
+client = TestClient(main.app)
+
+
+def test_structured_events_are_kept_in_jsonl_and_indexed():
+    start = time.time()
+    agent_log("events-run", "plain line", agent="prep_agent")
+    agent_log("events-run", "it broke", agent="prep_agent", level="ERROR")
+    log_event("events-run", "stage_end", stage="prep_agent", duration=1.25, attempt=1)
+    assert flush_logs()
+
+    # every record is in the run's events.jsonl
+    assert [r["event"] for r in read_events("events-run")] == ["log", "log", "stage_end"]
+    assert read_events("events-run", event="stage_end")[0]["payload"] == {"attempt": 1}
+
+    # plain log lines are not indexed, errors and other events are
+    indexed = query_events(run_id="events-run", since=start)
+    assert [(e["event"], e["level"]) for e in indexed] == [("stage_end", "INFO"), ("log", "ERROR")]
+    assert indexed[0]["duration"] == 1.25 and indexed[0]["payload"] == {"attempt": 1}
+    assert query_events(run_id="events-run", level="ERROR", limit=5)[0]["stage"] is None
+
+    # and rendered as a line of the text log
+    with open(f"{main.ARTIFACT_DIR}/events-run_orchestrator_log.txt") as f:
+        assert f.read().splitlines()[-1].endswith("stage_end stage=prep_agent duration=1.25s attempt=1")
+
+
+def test_stage_stats():
+    for run in ("events-stats-1", "events-stats-2", "events-stats-3"):
+        write_run_db(run, "completed", {})
+    log_event("events-stats-1", "stage_end", stage="stats_stage", duration=2.0)
+    log_event("events-stats-2", "stage_end", stage="stats_stage", duration=4.0)
+    log_event("events-stats-3", "stage_failed", stage="stats_stage", duration=1.0)
+    assert flush_logs()
+
+    stats = stage_stats(stage="stats_stage")["stats_stage"]
+    assert (stats["runs"], stats["completed"], stats["failures"]) == (3, 2, 1)
+    assert (stats["mean_seconds"], stats["p50_seconds"], stats["max_seconds"]) == (3.0, 3.0, 4.0)
+    # only the most recent run
+    assert stage_stats(last_runs=1, stage="stats_stage")["stats_stage"]["failures"] == 1
+    res = client.get("/events/stages", params={"stage": "stats_stage", "last_runs": 0})
+    assert res.json()["stages"]["stats_stage"]["completed"] == 2
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+import pytest
+
+from app import executors
+from app.executors import run_stage, shutdown_stage_executor
+from app.retry import TransientStageError, classify_error
+
+
+@pytest.fixture
+def spawn_backend(monkeypatch):
+    monkeypatch.setattr(executors, "EXECUTION_BACKEND", "spawn")
+    monkeypatch.setattr(executors, "STAGE_WORKERS", 1)
+    yield
+    shutdown_stage_executor()
+
+
+def test_thread_backend_runs_inline():
+    assert executors.get_stage_executor() is None
+    assert run_stage(os.getpid) == os.getpid()
+
+
+def test_process_backend_runs_stage_in_a_worker_with_its_core_budget(spawn_backend):
+    assert run_stage(os.getpid) != os.getpid()
+    assert run_stage(os.getenv, "OMP_NUM_THREADS", cores=3) == "3"
+
+
+def test_dead_worker_is_a_transient_error_and_the_pool_is_replaced(spawn_backend):
+    with pytest.raises(TransientStageError) as info:
+        run_stage(os._exit, 1)
+    assert classify_error(info.value) == "transient"
+    # the next stage gets a fresh pool
+    assert run_stage(os.getpid) != os.getpid()
+
+
+def test_second_failure_does_not_shut_down_the_replacement_pool(spawn_backend, monkeypatch):
+    """Two stages fail on the broken pool; the later reset must leave the new pool alone."""
+    reset = executors._reset_pool
+    both_failed = threading.Barrier(2, timeout=60)
+    first_reset, replacement_used = threading.Event(), threading.Event()
+
+    def ordered_reset(pool):
+        if both_failed.wait() == 0:
+            reset(pool)
+            first_reset.set()
+        else:
+            assert replacement_used.wait(60)
+            reset(pool)
+
+    monkeypatch.setattr(executors, "_reset_pool", ordered_reset)
+    broken = executors.get_stage_executor()
+    errors = []
+
+    def stage(*args):
+        try:
+            run_stage(*args)
+        except TransientStageError as e:
+            errors.append(e)
+
+    # whichever runs first kills the worker; the other fails with the pool
+    threads = [threading.Thread(target=stage, args=(os._exit, 1)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    assert first_reset.wait(60)
+
+    replacement = executors.get_stage_executor()
+    assert replacement is not broken
+    # with one worker, the second stage is still queued when the late reset runs
+    running = replacement.submit(time.sleep, 0.5)
+    queued = replacement.submit(os.getpid)
+    replacement_used.set()
+    for t in threads:
+        t.join(60)
+
+    assert len(errors) == 2
+    assert running.result(60) is None
+    assert queued.result(60) != os.getpid()
+    assert executors.get_stage_executor() is replacement
+
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setattr(executors, "EXECUTION_BACKEND", "gpu")
+    with pytest.raises(ValueError, match="Unknown EXECUTION_BACKEND"):
+        run_stage(os.getpid)
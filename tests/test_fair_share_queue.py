@@ -0,0 +1,67 @@
+import time
+
+from app.scheduler import FairShareQueue, run_priority
+
+
+def _drain(queue):
+    out = []
+    while len(queue):
+        out.append(queue.get(timeout=1)["run_id"])
+    return out
+
+
+def test_priority_class_goes_first():
+    queue = FairShareQueue(aging_seconds=0)
+    now = time.time()
+    queue.put("low", 2, "alice", now - 30)
+    queue.put("normal", 1, "alice", now - 20)
+    queue.put("high", 0, "alice", now - 10)
+    assert _drain(queue) == ["high", "normal", "low"]
+
+
+def test_user_with_fewer_runs_in_flight_goes_first():
+    queue = FairShareQueue(aging_seconds=0)
+    now = time.time()
+    for n in range(3):
+        queue.put(f"alice-{n}", 1, "alice", now - 10 + n)
+    queue.put("bob-0", 1, "bob", now)
+    queue.started("alice")
+    # bob has nothing running, so his later run goes before alice's batch
+    assert _drain(queue) == ["bob-0", "alice-0", "alice-1", "alice-2"]
+
+
+def test_waiting_runs_age_up_a_class():
+    queue = FairShareQueue(aging_seconds=60)
+    now = time.time()
+    queue.put("old-low", 2, "alice", now - 125)
+    queue.put("new-normal", 1, "bob", now)
+    assert _drain(queue) == ["old-low", "new-normal"]
+
+
+def test_backing_off_run_is_held_until_not_before():
+    queue = FairShareQueue()
+    queue.put("later", 0, "alice", not_before=time.time() + 0.2)
+    queue.put("now", 2, "bob")
+    assert queue.get(timeout=1)["run_id"] == "now"
+    assert queue.get(timeout=0.05) is None
+    assert queue.get(timeout=2)["run_id"] == "later"
+
+
+def test_position_and_duplicate_puts():
+    queue = FairShareQueue(concurrency=2)
+    queue.put("a", 1, "alice", time.time() - 2)
+    queue.put("b", 1, "bob", time.time() - 1)
+    queue.put("a", 0, "alice")
+    assert len(queue) == 2
+    queue.finished("nobody", duration=100)
+    assert queue.position("b") == {
+        "position": 2, "queued": 2, "priority": 1, "user_key": "bob",
+        "estimated_wait_seconds": 0.0, "not_before": None,
+    }
+    assert queue.position("missing") is None
+
+
+def test_run_priority_from_request():
+    assert run_priority({"id": 7, "priority": "low"}, {"priority": "high"}) == (0, "7")
+    assert run_priority({"email": "a@example.com"}, None) == (1, "a@example.com")
+    assert run_priority(None, {"priority": "urgent"}) == (1, "anonymous")
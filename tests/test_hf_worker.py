@@ -0,0 +1,44 @@
+import pytest
+
+from app.utils import hf_worker as hf_module
+from app.utils.hf_worker import HFWorker
+
+
+def test_failed_load_is_retried_with_backoff(monkeypatch):
+    attempts = []
+
+    def load_pipeline(model_name, backend, quantize):
+        attempts.append(model_name)
+        if len(attempts) < 3:
+            raise OSError("connection reset while downloading the model")
+        return lambda prompts, **kw: [{"generated_text": p.upper()} for p in prompts]
+
+    clock = [1000.0]
+    monkeypatch.setattr(hf_module, "_load_pipeline", load_pipeline)
+    monkeypatch.setattr(hf_module.time, "time", lambda: clock[0])
+    monkeypatch.setattr(hf_module, "HF_LOAD_RETRY_SECONDS", 10.0)
+    worker = HFWorker(model_name="test-model", batch_wait=0)
+
+    assert not worker.warm_up(wait=True, timeout=5)
+    assert worker.stats()["load_attempts"] == 1
+
+    # within the backoff the load is not tried again
+    with pytest.raises(RuntimeError, match="connection reset"):
+        worker.generate("a", timeout=5)
+    assert len(attempts) == 1
+
+    clock[0] += 10
+    with pytest.raises(RuntimeError, match="connection reset"):
+        worker.generate("b", timeout=5)
+    assert len(attempts) == 2
+
+    # the delay has doubled
+    clock[0] += 10
+    with pytest.raises(RuntimeError):
+        worker.generate("c", timeout=5)
+    assert len(attempts) == 2
+
+    clock[0] += 10
+    assert worker.generate("d", timeout=5) == "D"
+    assert len(attempts) == 3
+    assert worker.stats()["load_error"] is None
@@ -0,0 +1,44 @@
+import os
+import sys
+import types
+
+import pytest
+
+from app.agents import data_agent
+
+
+class _FakeKaggleApi:
+    # what the next download unzips
+    content = "a,b\n1,2\n"
+
+    def authenticate(self):
+        pass
+
+    def dataset_download_files(self, ref, path, unzip, quiet):
+        # unzip writes through whatever file is already at the path
+        with open(os.path.join(path, "train.csv"), "w") as f:
+            f.write(self.content)
+
+
+@pytest.fixture
+def fake_kaggle(monkeypatch):
+    module = types.ModuleType("kaggle.api.kaggle_api_extended")
+    module.KaggleApi = _FakeKaggleApi
+    monkeypatch.setitem(sys.modules, "kaggle", types.ModuleType("kaggle"))
+    monkeypatch.setitem(sys.modules, "kaggle.api", types.ModuleType("kaggle.api"))
+    monkeypatch.setitem(sys.modules, "kaggle.api.kaggle_api_extended", module)
+    return _FakeKaggleApi
+
+
+def test_redownload_does_not_rewrite_other_runs_copy(fake_kaggle):
+    a = data_agent._download_kaggle_dataset("kaggle-a", "owner/ds")
+    b = data_agent._download_kaggle_dataset("kaggle-b", "owner/ds")
+    assert os.stat(a).st_ino == os.stat(b).st_ino
+
+    fake_kaggle.content = "a,b\n3,4\n5,6\n"
+    assert data_agent._download_kaggle_dataset("kaggle-a", "owner/ds") == a
+
+    with open(b) as f:
+        assert f.read() == "a,b\n1,2\n"
+    with open(a) as f:
+        assert f.read() == "a,b\n3,4\n5,6\n"
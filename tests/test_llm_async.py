@@ -0,0 +1,93 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+import pytest
+
+from app.utils import llm_async, llm_clients
+from app.utils.llm_async import llm_loop
+from app.utils.llm_cache import LLMCache
+from app.utils.llm_policy import LLMPolicy
+
+
+@pytest.fixture
+def echo(monkeypatch, tmp_path):
+    """One provider answering "<prompt>!" after `delays[prompt]` seconds; returns the prompts it saw."""
+    seen = []
+    delays = {"slow": 0.4, "fast": 0.1, "mid": 0.3}
+
+    async def call(prompt, max_tokens):
+        seen.append((prompt, max_tokens, threading.current_thread().name))
+        await asyncio.sleep(delays.get(prompt, 0))
+        return prompt + "!"
+
+    async def stream(prompt, max_tokens):
+        yield await call(prompt, max_tokens)
+
+    monkeypatch.setattr(llm_clients, "_PROVIDERS", {"echo": ("echo", call, stream)})
+    monkeypatch.setattr(llm_clients, "_provider_chain", lambda: ["echo"])
+    monkeypatch.setattr(llm_clients, "llm_policy", LLMPolicy())
+    monkeypatch.setattr(llm_clients, "llm_cache", LLMCache(db_path=str(tmp_path / "cache.db")))
+    monkeypatch.setattr(llm_clients, "LLM_CACHE_ENABLED", True)
+    return seen
+
+
+def test_concurrent_calls_share_the_loop_and_keep_their_order(echo):
+    async def handler():
+        return await asyncio.gather(
+            llm_clients.allm_generate("slow"),
+            llm_clients.allm_generate("fast", max_tokens=512),
+            llm_clients.allm_generate("mid", site="search_queries"),
+        )
+
+    start = time.time()
+    results = asyncio.run(handler())
+    elapsed = time.time() - start
+
+    assert results == ["slow!", "fast!", "mid!"]
+    # one round trip of the slowest prompt, not the sum of all three
+    assert elapsed < 0.7
+    assert sorted((p, n) for p, n, _ in echo) == [("fast", 512), ("mid", 256), ("slow", 256)]
+    assert {thread for _, _, thread in echo} == {"llm-loop"}
+
+
+def test_async_and_blocking_calls_share_the_cache(echo):
+    assert llm_clients.llm_generate("fast", site="t") == "fast!"
+    assert asyncio.run(llm_clients.allm_generate("fast", site="t")) == "fast!"
+    assert asyncio.run(llm_clients.allm_generate("fast", site="t", cache=False)) == "fast!"
+    assert [p for p, _, _ in echo] == ["fast", "fast"]
+
+
+def test_run_sync_refuses_the_loop_thread():
+    async def nested():
+        return llm_loop.run_sync(asyncio.sleep(0))
+
+    with pytest.raises(RuntimeError):
+        llm_loop.run_sync(nested())
+
+
+def test_provider_calls_reuse_one_pooled_client(monkeypatch):
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f" answer {len(requests)} "}}]})
+
+    pooled = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    # starting the loop resets the clients: start it first
+    assert llm_loop.loop is not None
+    monkeypatch.setitem(llm_loop._clients, "openai", pooled)
+
+    async def two_calls():
+        first = await llm_async.openai_chat("hi", 16, api_key="key", model="m")
+        second = await llm_async.openai_chat("again", 16, api_key="key", model="m")
+        return first, second, llm_loop.client("openai")
+
+    first, second, client = llm_loop.run_sync(two_calls())
+    assert (first, second) == ("answer 1", "answer 2")
+    assert client is pooled
+    assert requests[0].headers["authorization"] == "Bearer key"
+    assert json.loads(requests[1].content)["messages"] == [{"role": "user", "content": "again"}]
+    assert "openai" in llm_loop.stats()["clients"]
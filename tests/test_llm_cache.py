@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app.utils import llm_cache as cache_module
+from app.utils.llm_cache import LLMCache, cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(db_path=str(tmp_path / "llm_cache.db"), memory_entries=2, max_rows=3)
+
+
+def test_keys():
+    base = cache_key("openai", "gpt", "prompt", 256)
+    assert base == cache_key("openai", "gpt", "prompt", 256, form="text")
+    assert len({
+        base,
+        cache_key("openai", "gpt", "prompt", 512),
+        cache_key("openai", "other", "prompt", 256),
+        cache_key("gemini", "gpt", "prompt", 256),
+        cache_key("openai", "gpt", "prompt", 256, form="json"),
+    }) == 5
+
+
+def test_memory_then_disk_then_shared(cache, tmp_path):
+    cache.put("k1", "model_plan", "answer", latency=2.5)
+    assert cache.get("k1", "model_plan") == "answer"
+
+    # evicted from the 2-entry LRU, still on disk
+    cache.put("k2", "model_plan", "b", latency=1)
+    cache.put("k3", "model_plan", "c", latency=1)
+    assert cache.get("k1", "model_plan") == "answer"
+
+    # another process sees the same table
+    other = LLMCache(db_path=cache.db_path)
+    assert other.get("k3", "model_plan") == "c"
+
+    stats = cache.stats()["sites"]["model_plan"]
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 0)
+    assert stats["saved_seconds"] == 5.0
+
+
+def test_expiry_empty_answers_and_invalidate(cache, monkeypatch):
+    monkeypatch.setitem(cache_module.LLM_CACHE_SITE_TTLS, "checkllm", 60)
+    cache.put("probe", "checkllm", "ok", latency=0.1)
+    cache.put("short", "ps_parse", "x", latency=0.1, ttl=-1)
+    cache.put("empty", "ps_parse", "", latency=0.1)
+
+    assert cache.get("short", "ps_parse") is None
+    assert cache.get("empty", "ps_parse") is None
+    real_time = time.time
+    monkeypatch.setattr(cache_module.time, "time", lambda: real_time() + 61)
+    assert cache.get("probe", "checkllm") is None
+    monkeypatch.undo()
+
+    cache.put("bad-json", "model_plan", "not json", latency=1)
+    cache.invalidate("bad-json")
+    assert cache.get("bad-json", "model_plan") is None
+
+
+def test_trim_keeps_the_most_recently_used_rows(cache):
+    for n in range(5):
+        cache.put(f"k{n}", "search_queries", str(n), latency=0)
+        time.sleep(0.01)
+    cache.trim()
+    rows = cache._conn().execute("SELECT key FROM llm_cache ORDER BY key").fetchall()
+    assert [r[0] for r in rows] == ["k2", "k3", "k4"]
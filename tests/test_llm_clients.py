@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import pytest
+
+from app.utils import llm_clients, llm_policy as policy_module
+from app.utils.llm_cache import LLMCache
+from app.utils.llm_policy import LLMPolicy
+
+
+def _stream_of(chunks, delay=0.0):
+    def make(prompt, max_tokens):
+        async def gen():
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield chunk
+        return gen()
+    return make
+
+
+def _call_of(text, delay=0.0):
+    async def call(prompt, max_tokens):
+        await asyncio.sleep(delay)
+        return text
+    return call
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """Replace the provider table; returns a function installing (name, call, stream) per provider."""
+    table = {}
+    monkeypatch.setattr(llm_clients, "_PROVIDERS", table)
+    monkeypatch.setattr(llm_clients, "_provider_chain", lambda: list(table))
+    monkeypatch.setattr(llm_clients, "llm_policy", LLMPolicy())
+    monkeypatch.setattr(llm_clients, "RETRY_BACKOFF", [0, 0, 0])
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_DEFAULT_DELAY", 0.1)
+
+    def install(provider, call=None, stream=None):
+        table[provider] = (provider, call or _call_of(""), stream or _stream_of([]))
+    return install
+
+
+def _run(coro):
+    return llm_clients.llm_loop.run_sync(coro)
+
+
+def test_json_calls_are_hedged(providers):
+    providers("slow", stream=_stream_of(['{"who": "slow"}'], delay=2.0))
+    providers("fast", stream=_stream_of(['{"who": ', '"fast"}']))
+
+    text = _run(llm_clients._agenerate("prompt", 64, json_value=True))
+
+    assert json.loads(text) == {"who": "fast"}
+    assert llm_clients.llm_policy.stats()["slow"]["hedged"] == 1
+
+
+def test_json_calls_stop_reading_after_the_object(providers):
+    read = []
+
+    def stream(prompt, max_tokens):
+        async def gen():
+            for chunk in ['Here: {"a": 1}', " and more", " and more"]:
+                read.append(chunk)
+                yield chunk
+        return gen()
+
+    providers("only", stream=stream)
+    assert _run(llm_clients._agenerate("prompt", 64, json_value=True)) == '{"a": 1}'
+    assert len(read) == 1
+
+
+def test_json_calls_fall_back_when_the_primary_fails(providers):
+    def broken(prompt, max_tokens):
+        async def gen():
+            raise RuntimeError("down")
+            yield  # pragma: no cover
+        return gen()
+
+    providers("primary", stream=broken)
+    providers("backup", stream=_stream_of(['{"ok": true}']))
+    assert _run(llm_clients._agenerate("prompt", 64, json_value=True)) == '{"ok": true}'
+    assert llm_clients.llm_policy.stats()["primary"]["errors"] == 1
+
+
+def test_stream_deadline_covers_the_whole_answer(providers, monkeypatch):
+    monkeypatch.setattr(llm_clients, "MAX_RETRIES", 1)
+    # every chunk arrives well within the timeout, the answer as a whole does not
+    providers("trickle", stream=_stream_of(["x"] * 50, delay=0.02))
+    llm_clients.llm_policy._get("trickle").timeout = 0.3
+
+    chunks = list(llm_clients.llm_stream("prompt"))
+
+    assert 0 < len(chunks) < 50
+    stats = llm_clients.llm_policy.stats()["trickle"]
+    assert stats["errors"] == 1
+    assert stats["last_error"].startswith("timed out")
+
+
+def _extract(text, size=3):
+    extractor = llm_clients._JSONExtractor()
+    for i in range(0, len(text), size):
+        found = extractor.feed(text[i:i + size])
+        if found is not None:
+            return found
+    return None
+
+
+def test_extractor_finds_the_first_object_across_chunks():
+    text = 'Sure! ```json\n{"a": [1, "}{"], "b": {"c": "x\\"y"}}\n``` and then {"second": 1}'
+    assert json.loads(_extract(text)) == {"a": [1, "}{"], "b": {"c": 'x"y'}}
+
+
+def test_extractor_ignores_arrays_scalars_and_prose_braces():
+    text = 'Step [1] then [2, 3] and {see below} 42: {"plan": ["a", "b"]}'
+    assert _extract(text) == '{"plan": ["a", "b"]}'
+    assert _extract('[{"a": 1}]') == '{"a": 1}'
+    assert _extract("no json here [1, 2]") is None
+
+
+def test_json_and_text_answers_have_separate_cache_entries(providers, monkeypatch, tmp_path):
+    cache = LLMCache(db_path=str(tmp_path / "cache.db"))
+    monkeypatch.setattr(llm_clients, "llm_cache", cache)
+    monkeypatch.setattr(llm_clients, "LLM_CACHE_ENABLED", True)
+    providers(
+        "only",
+        call=_call_of('Result: {"a": 1} -- explained at length'),
+        stream=_stream_of(['Result: {"a": 1}', " -- explained at length"]),
+    )
+
+    assert llm_clients.llm_generate_json("p", max_tokens=64, site="t") == {"a": 1}
+    # the full answer is not replaced by the extracted object
+    assert llm_clients.llm_generate("p", max_tokens=64, site="t") == 'Result: {"a": 1} -- explained at length'
+    assert cache.get(llm_clients._cache_key("p", 64, "json"), "t") == '{"a": 1}'
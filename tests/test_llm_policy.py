@@ -0,0 +1,85 @@
+import pytest
+
+from app.utils import llm_policy as policy_module
+from app.utils.llm_policy import LLMPolicy
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(policy_module.time, "time", lambda: now[0])
+    monkeypatch.setattr(policy_module, "LLM_BREAKER_FAILURES", 3)
+    monkeypatch.setattr(policy_module, "LLM_BREAKER_COOLDOWN", 30.0)
+    monkeypatch.setattr(policy_module, "LLM_BREAKER_MAX_COOLDOWN", 100.0)
+    return now
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    policy = LLMPolicy()
+    for _ in range(2):
+        assert policy.acquire("openai")
+        policy.failure("openai", "HTTP 503")
+    policy.success("openai", 1.0)
+    # a success resets the count
+    for _ in range(3):
+        assert policy.acquire("openai")
+        policy.failure("openai", "HTTP 503\ntraceback")
+    assert policy.stats()["openai"]["state"] == "open"
+    assert not policy.acquire("openai")
+    assert policy.stats()["openai"]["skipped"] == 1
+    assert policy.stats()["openai"]["last_error"] == "HTTP 503"
+
+
+def test_half_open_probe_and_doubling_cooldown(clock):
+    policy = LLMPolicy()
+    for _ in range(3):
+        policy.acquire("gemini")
+        policy.failure("gemini", "timeout")
+
+    clock[0] += 30
+    # one probe call only
+    assert policy.acquire("gemini")
+    assert not policy.acquire("gemini")
+    policy.failure("gemini", "timeout")
+
+    clock[0] += 30
+    assert not policy.acquire("gemini")
+    clock[0] += 30
+    assert policy.acquire("gemini")
+    policy.success("gemini", 2.0)
+    assert policy.stats()["gemini"]["state"] == "closed"
+    assert policy.acquire("gemini") and policy.acquire("gemini")
+
+
+def test_hedge_delay_follows_the_latency_percentile(monkeypatch):
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_MIN_SAMPLES", 10)
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_DEFAULT_DELAY", 10.0)
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_PERCENTILE", 0.9)
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_MIN_DELAY", 0.5)
+    policy = LLMPolicy()
+    assert policy.hedge_delay("openai") == 10.0
+
+    for latency in range(1, 11):
+        policy.success("openai", float(latency))
+    assert policy.hedge_delay("openai") == 10.0
+    for _ in range(95):
+        policy.success("openai", 0.1)
+    # of the last 100 calls 95 answered in 0.1s: hedge early, but not below the floor
+    assert policy.hedge_delay("openai") == 0.5
+
+    # a provider that keeps losing the race still records how slow it was
+    slow = LLMPolicy()
+    for _ in range(10):
+        slow.abandoned("ollama", 4.0)
+    assert slow.hedge_delay("ollama") == 4.0
+
+    monkeypatch.setattr(policy_module, "LLM_HEDGE_ENABLED", False)
+    assert policy.hedge_delay("openai") is None
+
+
+def test_provider_timeouts(monkeypatch):
+    monkeypatch.setenv("LLM_TIMEOUT_GROQ", "5")
+    policy = LLMPolicy()
+    assert policy.timeout("groq") == 5.0
+    assert policy.timeout("hf") == 120.0
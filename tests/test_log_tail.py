@@ -0,0 +1,65 @@
+import os
+
+from app.utils import run_logger
+from app.utils.run_logger import read_log_from, tail_file
+
+
+def _log(run_id, text):
+    path = os.path.join(run_logger.ARTIFACT_DIR, f"{run_id}_orchestrator_log.txt")
+    with open(path, "ab") as f:
+        f.write(text.encode())
+    return path
+
+
+def test_tail_matches_the_last_lines(tmp_path):
+    path = tmp_path / "log.txt"
+    lines = [f"line {i} " + "x" * (i % 50) for i in range(5000)]
+    path.write_text("\n".join(lines) + "\n")
+
+    # small blocks so the tail spans several of them
+    tail, end = tail_file(str(path), 200, block_size=1024)
+    assert tail == "\n".join(lines[-200:]) + "\n"
+    assert end == path.stat().st_size
+    assert tail_file(str(path), 10000)[0] == path.read_text()
+
+
+def test_tail_edge_cases(tmp_path):
+    empty = tmp_path / "empty.txt"
+    empty.write_bytes(b"")
+    assert tail_file(str(empty), 5) == ("", 0)
+
+    unterminated = tmp_path / "partial.txt"
+    unterminated.write_bytes(b"a\nb\nc")
+    assert tail_file(str(unterminated), 2)[0] == "b\nc"
+    assert tail_file(str(unterminated), 0)[0] == ""
+
+
+def test_read_from_offset_leaves_a_partial_line_for_later():
+    _log("tail-cursor", "first\nsecond\nthi")
+    lines, offset = read_log_from("tail-cursor", "orchestrator", 0)
+    assert lines == ["first", "second"]
+
+    assert read_log_from("tail-cursor", "orchestrator", offset) == ([], offset)
+    _log("tail-cursor", "rd\nfourth\n")
+    lines, offset = read_log_from("tail-cursor", "orchestrator", offset)
+    assert lines == ["third", "fourth"]
+    assert read_log_from("tail-cursor", "orchestrator", offset) == ([], offset)
+
+
+def test_read_from_restarts_on_a_recreated_file():
+    path = _log("tail-recreated", "a long line from the old file\n")
+    _, offset = read_log_from("tail-recreated", "orchestrator", 0)
+    os.remove(path)
+    _log("tail-recreated", "new\n")
+    assert read_log_from("tail-recreated", "orchestrator", offset) == (["new"], 4)
+
+
+def test_read_from_hands_out_an_overlong_line_in_pieces():
+    _log("tail-long", "y" * 100 + "\n")
+    lines, offset = read_log_from("tail-long", "orchestrator", 0, max_bytes=64)
+    assert lines == ["y" * 64] and offset == 64
+    assert read_log_from("tail-long", "orchestrator", offset, max_bytes=64) == (["y" * 36], 101)
+
+
+def test_missing_log():
+    assert read_log_from("tail-missing", "orchestrator", 7) == ([], 7)
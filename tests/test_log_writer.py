@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pytest
+
+from app.utils import run_logger
+from app.utils.run_logger import LogWriter, agent_log
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    w = LogWriter(flush_interval=0.05, flush_lines=100, max_open_files=2)
+    monkeypatch.setattr(run_logger, "log_writer", w)
+    yield w
+    w.shutdown()
+
+
+def _lines(run_id, agent="orchestrator"):
+    with open(os.path.join(run_logger.ARTIFACT_DIR, f"{run_id}_{agent}_log.txt")) as f:
+        return f.read().splitlines()
+
+
+def test_lines_from_many_threads_are_written_whole_and_in_order(writer):
+    def log(n):
+        for i in range(500):
+            agent_log("writer-threads", f"t{n} line {i}", agent="orchestrator")
+
+    threads = [threading.Thread(target=log, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert writer.flush()
+
+    lines = _lines("writer-threads")
+    assert len(lines) == 2000
+    for n in range(4):
+        mine = [line.split("] ", 2)[2] for line in lines if f"] t{n} line" in line]
+        assert mine == [f"t{n} line {i}" for i in range(500)]
+    # batched: far fewer writes than lines
+    assert writer.stats()["batches"] < 200
+
+
+def test_deleted_log_is_recreated_and_descriptors_are_capped(writer):
+    for agent in ("orchestrator", "prep_agent", "eval_agent"):
+        agent_log("writer-files", "first", agent=agent)
+    assert writer.flush()
+    assert writer.stats()["open_files"] <= 2
+
+    os.remove(os.path.join(run_logger.ARTIFACT_DIR, "writer-files_eval_agent_log.txt"))
+    agent_log("writer-files", "second", agent="eval_agent")
+    assert writer.flush()
+    assert [line.split("] ", 2)[2] for line in _lines("writer-files", "eval_agent")] == ["second"]
+
+
+def test_after_shutdown_lines_are_written_synchronously(writer):
+    agent_log("writer-stopped", "buffered", agent="orchestrator")
+    writer.shutdown()
+    agent_log("writer-stopped", "still logged", agent="orchestrator")
+    lines = _lines("writer-stopped")
+    assert lines[0].endswith("[INFO] buffered") and lines[1].endswith("[INFO] still logged")
@@ -0,0 +1,71 @@
+import threading
+import time
+
+import pytest
+
+from app.pipeline import Pipeline, Stage
+
+
+def _diamond(log, gate=None):
+    def step(name, value, delay=0.0):
+        def fn(**inputs):
+            log.append(("start", name))
+            if gate is not None and name in ("left", "right"):
+                # both branches must be running at once to get past this
+                gate.wait(timeout=5)
+            time.sleep(delay)
+            log.append(("end", name))
+            return value(**inputs)
+        return fn
+
+    return Pipeline([
+        Stage("root", step("root", lambda seed: seed + 1), inputs=("seed",)),
+        Stage("left", step("left", lambda root: root * 2, 0.05), inputs=("root",)),
+        Stage("right", step("right", lambda root: {"r": root * 3, "extra": "x"}), inputs=("root",), outputs=("r", "extra")),
+        Stage("join", step("join", lambda left, r: left + r), inputs=("left", "r")),
+    ])
+
+
+def test_independent_stages_run_concurrently():
+    log = []
+    pipeline = _diamond(log, gate=threading.Barrier(2))
+    out = pipeline.run({"seed": 1})
+
+    assert out["join"] == 2 * 2 + 2 * 3
+    assert out["extra"] == "x"
+    assert log[0] == ("start", "root") and log[-1] == ("end", "join")
+    assert pipeline.critical_path()["stages"] == ["root", "left", "join"]
+    assert set(pipeline.timings) == {"root", "left", "right", "join"}
+
+
+def test_downstream_and_order():
+    pipeline = _diamond([])
+    assert pipeline.order.index("root") < pipeline.order.index("left") < pipeline.order.index("join")
+    assert pipeline.downstream("root") == [s for s in pipeline.order if s != "root"]
+    assert pipeline.downstream("right") == ["join"]
+    assert pipeline.upstream("join") == ["left", "right"]
+
+
+def test_first_error_stops_stages_not_yet_started():
+    ran = []
+
+    def boom(root):
+        raise RuntimeError("left failed")
+
+    pipeline = Pipeline([
+        Stage("root", lambda: ran.append("root") or 1),
+        Stage("left", boom, inputs=("root",)),
+        Stage("after", lambda left: ran.append("after"), inputs=("left",)),
+    ])
+    with pytest.raises(RuntimeError, match="left failed"):
+        pipeline.run()
+    assert ran == ["root"]
+
+
+def test_invalid_graphs_are_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline([Stage("a", lambda b: b, inputs=("b",)), Stage("b", lambda a: a, inputs=("a",))])
+    with pytest.raises(ValueError, match="produced by both"):
+        Pipeline([Stage("a", lambda: 1, outputs=("x",)), Stage("b", lambda: 2, outputs=("x",))])
+    with pytest.raises(ValueError, match="not provided"):
+        Pipeline([Stage("a", lambda user: user, inputs=("user",))]).run()
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+from app import retention, run_store, storage
+from app.run_store import list_run_artifacts, set_run_pinned, update_run_state, write_run_db
+from app.storage import save_artifact
+
+YEAR = 365 * 86400
+
+
+def _run(run_id, status, f1=None):
+    write_run_db(run_id, "running", {})
+    save_artifact(run_id, "model.joblib", b"model " + run_id.encode())
+    save_artifact(run_id, "plot.png", b"plot " + run_id.encode())
+    if status != "running":
+        update_run_state(run_id, status, {"metrics": {"f1": f1}, "dataset_source_name": "retention.csv"})
+
+
+@pytest.fixture
+def runs(monkeypatch):
+    """Four runs on one dataset; retention only sees these."""
+    _run("ret-worse", "completed", f1=0.5)
+    _run("ret-best", "completed", f1=0.9)
+    _run("ret-pinned", "completed", f1=0.1)
+    _run("ret-active", "running")
+    assert set_run_pinned("ret-pinned", True)
+
+    monkeypatch.setattr(retention, "retention_runs", lambda: [r for r in run_store.retention_runs() if r["run_id"].startswith("ret-")])
+    monkeypatch.setattr(retention, "artifact_run_ids", lambda: [r for r in run_store.artifact_run_ids() if r.startswith("ret-")])
+    monkeypatch.setattr(retention, "_SERVICE_RUN_IDS", set())
+    monkeypatch.setattr(retention, "RETENTION_KEEP_LAST_RUNS", 0)
+    monkeypatch.setattr(storage, "get_disk_usage", lambda: {"total_gb": 100.0, "used_gb": 10.0, "free_gb": 90.0})
+
+
+def _planned(plan):
+    return {(item["run_id"], item["name"]): item["reason"] for item in plan["items"]}
+
+
+def test_ttl_spares_protected_runs_and_the_best_model(runs):
+    plan = retention.plan_retention(time.time() + YEAR)
+
+    assert not plan["watermark_triggered"]
+    assert plan["protected"] == {"active": 1, "pinned": 1, "recent": 0, "best": 1}
+    assert _planned(plan) == {
+        ("ret-worse", "ret-worse_model.joblib"): "ttl:model",
+        ("ret-worse", "ret-worse_plot.png"): "ttl:plot",
+        # the best run of the dataset keeps its model, not its plots
+        ("ret-best", "ret-best_plot.png"): "ttl:plot",
+    }
+
+
+def test_nothing_expires_before_its_ttl(runs):
+    assert retention.plan_retention(time.time())["items"] == []
+
+
+def test_watermark_deletes_unprotected_runs_whatever_their_age(runs, monkeypatch):
+    monkeypatch.setattr(storage, "get_disk_usage", lambda: {"total_gb": 100.0, "used_gb": 95.0, "free_gb": 5.0})
+    plan = retention.plan_retention(time.time())
+
+    assert plan["watermark_triggered"]
+    assert set(_planned(plan).values()) == {"watermark"}
+    assert {run_id for run_id, _ in _planned(plan)} == {"ret-worse", "ret-best"}
+    assert ("ret-best", "ret-best_model.joblib") not in _planned(plan)
+
+
+def test_run_retention_deletes_what_it_planned(runs, monkeypatch):
+    dry = retention.run_retention(dry_run=True)
+    assert dry["deleted"]["items"] == 0
+
+    monkeypatch.setattr(retention, "RETENTION_TTL_DAYS", {kind: 1e-9 for kind in retention.RETENTION_TTL_DAYS})
+    time.sleep(0.01)
+    preview = retention.run_retention(dry_run=True)
+    assert preview["deleted"]["by_reason"] == {"ttl:model": 1, "ttl:plot": 2}
+    assert len(list_run_artifacts("ret-worse")) == 2
+
+    report = retention.run_retention()
+    assert report["errors"] == []
+    assert report["deleted"]["runs"] == 2
+    assert list_run_artifacts("ret-worse") == []
+    assert [a["name"] for a in list_run_artifacts("ret-best")] == ["ret-best_model.joblib"]
+    assert len(list_run_artifacts("ret-pinned")) == 2
+    assert all(os.path.exists(a["path"]) for a in list_run_artifacts("ret-active"))
+    assert retention.retention_status()["last_report"] is report
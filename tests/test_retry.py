@@ -0,0 +1,89 @@
+import pytest
+
+from app import retry
+from app.retry import RetryPolicy, RetryTracker, TransientStageError, classify_error
+
+
+def _raised(fn):
+    try:
+        fn()
+    except Exception as e:
+        return e
+    raise AssertionError("nothing raised")
+
+
+def test_transient_errors():
+    assert classify_error(TimeoutError()) == "transient"
+    assert classify_error(ConnectionResetError()) == "transient"
+    assert classify_error(TransientStageError("flaky")) == "transient"
+    assert classify_error(RuntimeError("Read timed out")) == "transient"
+
+    class RateLimitError(Exception):
+        pass
+
+    assert classify_error(RateLimitError("slow down")) == "transient"
+
+    class HTTPError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert classify_error(HTTPError(503)) == "transient"
+    assert classify_error(HTTPError(404)) == "permanent"
+    assert classify_error(ValueError("could not convert string to float")) == "permanent"
+
+
+def test_follows_explicit_cause_only():
+    def wrapped():
+        try:
+            raise TimeoutError()
+        except TimeoutError as e:
+            raise RuntimeError("download failed") from e
+
+    def failed_while_handling():
+        # the fallback after a timeout has a bug of its own: retrying will not fix it
+        try:
+            raise TimeoutError()
+        except TimeoutError:
+            raise KeyError("target")
+
+    def suppressed():
+        try:
+            raise TimeoutError()
+        except TimeoutError:
+            raise ValueError("no usable dataset") from None
+
+    assert classify_error(_raised(wrapped)) == "transient"
+    assert classify_error(_raised(failed_while_handling)) == "permanent"
+    assert classify_error(_raised(suppressed)) == "permanent"
+
+
+@pytest.fixture
+def policies(monkeypatch):
+    monkeypatch.setattr(retry, "STAGE_RETRY_POLICIES", {
+        "fetch": RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=4.0),
+        "slow": RetryPolicy(max_attempts=5, base_delay=100.0, max_delay=100.0, deadline=50),
+    })
+
+
+def test_tracker_retries_transient_errors_within_the_attempt_limit(policies):
+    tracker = RetryTracker(budget=10)
+    first = tracker.next_delay("fetch", TimeoutError())
+    assert first["retry"] and 0 <= first["delay"] <= 1.0
+    second = tracker.next_delay("fetch", TimeoutError())
+    assert second["retry"] and 0 <= second["delay"] <= 2.0
+    assert tracker.next_delay("fetch", TimeoutError()) == {"retry": False, "kind": "transient", "reason": "3 attempts used"}
+
+    assert tracker.next_delay("other", ValueError("bad csv"))["reason"] == "permanent error"
+
+
+def test_tracker_budget_and_deadline_survive_a_requeue(policies, monkeypatch):
+    tracker = RetryTracker(budget=2)
+    tracker.next_delay("fetch", TimeoutError())
+    tracker.next_delay("fetch", TimeoutError())
+    # the run is requeued and resumed from the saved state
+    resumed = RetryTracker(tracker.snapshot(), budget=2)
+    assert resumed.retries_used() == 2
+    assert resumed.next_delay("slow", TimeoutError())["reason"] == "run retry budget of 2 used"
+
+    monkeypatch.setattr(retry.random, "uniform", lambda a, b: b)
+    assert RetryTracker(budget=10).next_delay("slow", TimeoutError())["reason"] == "deadline of 50s passed"
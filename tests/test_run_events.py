@@ -0,0 +1,44 @@
+import json
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.run_store import update_run_state, write_run_db
+from app.utils.run_logger import agent_log, flush_logs
+
+client = TestClient(main.app)
+
+
+def _events(body: str):
+    out = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            out.append((fields["event"], json.loads(fields["data"])))
+    return out
+
+
+def _finished_run(run_id):
+    write_run_db(run_id, "running", {})
+    agent_log(run_id, "training started", agent="orchestrator")
+    assert flush_logs()
+    update_run_state(run_id, "completed", {"phase": "completed"})
+
+
+def test_stream_sends_state_and_logs():
+    _finished_run("events-logs")
+    events = _events(client.get("/runs/events-logs/events").text)
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "end"
+    assert "state" in kinds
+    assert any(kind == "log" and "training started" in "".join(data["lines"]) for kind, data in events)
+
+
+def test_stream_without_logs_never_reads_them(monkeypatch):
+    _finished_run("events-no-logs")
+    read = []
+    monkeypatch.setattr(main, "read_log_from", lambda *args: read.append(args) or ([], 0))
+    events = _events(client.get("/runs/events-no-logs/events?logs_from=none").text)
+    assert [kind for kind, _ in events] == ["state", "end"]
+    assert events[-1][1] == {"status": "completed"}
+    assert read == []
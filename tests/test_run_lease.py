@@ -0,0 +1,66 @@
+import threading
+import time
+
+from app.run_store import claim_run, fetch_claimable_runs, get_conn, read_run, renew_lease, requeue_run, write_run_db
+
+
+def _claimable(run_id):
+    return [r for r in fetch_claimable_runs() if r["run_id"] == run_id]
+
+
+def test_exactly_one_worker_wins_a_race():
+    write_run_db("lease-race", "queued", {})
+    barrier = threading.Barrier(8)
+    won = []
+
+    def worker(n):
+        barrier.wait()
+        if claim_run("lease-race", f"worker-{n}", 60):
+            won.append(n)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(won) == 1
+    assert _claimable("lease-race") == []
+
+
+def test_lease_is_renewed_by_its_owner_only():
+    write_run_db("lease-renew", "queued", {})
+    assert claim_run("lease-renew", "worker-a", 60)
+    assert renew_lease("lease-renew", "worker-a", 60)
+    assert not renew_lease("lease-renew", "worker-b", 60)
+    assert not claim_run("lease-renew", "worker-b", 60)
+
+
+def test_expired_lease_can_be_reclaimed():
+    write_run_db("lease-expired", "queued", {})
+    assert claim_run("lease-expired", "worker-a", 60)
+    # worker-a died: its lease ran out
+    get_conn().execute("UPDATE runs SET lease_expires=? WHERE run_id='lease-expired'", (time.time() - 1,))
+
+    assert [r["run_id"] for r in _claimable("lease-expired")] == ["lease-expired"]
+    assert claim_run("lease-expired", "worker-b", 60)
+    assert not renew_lease("lease-expired", "worker-a", 60)
+
+
+def test_deferred_run_is_not_claimable_before_its_time():
+    write_run_db("lease-deferred", "queued", {})
+    get_conn().execute("UPDATE runs SET not_before=? WHERE run_id='lease-deferred'", (time.time() + 60,))
+    assert not claim_run("lease-deferred", "worker-a", 60)
+    get_conn().execute("UPDATE runs SET not_before=? WHERE run_id='lease-deferred'", (time.time() - 1,))
+    assert claim_run("lease-deferred", "worker-a", 60)
+
+
+def test_failed_run_is_requeued_with_a_patch():
+    write_run_db("lease-requeue", "queued", {"phase": "queued"})
+    assert claim_run("lease-requeue", "worker-a", 60)
+    get_conn().execute("UPDATE runs SET status='failed' WHERE run_id='lease-requeue'")
+
+    assert requeue_run("lease-requeue", {"phase": "retry"}) > 0
+    run = read_run("lease-requeue")
+    assert run["status"] == "queued"
+    assert run["state"]["phase"] == "retry"
+    assert claim_run("lease-requeue", "worker-b", 60)
@@ -0,0 +1,67 @@
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.run_store import get_conn, list_runs, update_run_state, write_run_db
+
+client = TestClient(main.app)
+
+
+def _runs(user, count):
+    ids = [f"{user}-{i}" for i in range(count)]
+    for run_id in ids:
+        write_run_db(run_id, "queued", {}, user_key=user)
+    return ids
+
+
+def test_pages_cover_every_run_once_newest_first():
+    ids = _runs("list-pages", 7)
+    seen, cursor = [], None
+    while True:
+        page = list_runs(3, cursor, user="list-pages")
+        assert len(page["runs"]) <= 3
+        seen += [r["run_id"] for r in page["runs"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+
+
+def test_cursor_is_stable_across_ties_and_inserts():
+    ids = _runs("list-ties", 4)
+    # same created_at: run_id breaks the tie
+    get_conn().execute("UPDATE runs SET created_at=100.0 WHERE user_key='list-ties'")
+    first = list_runs(2, user="list-ties")
+    assert [r["run_id"] for r in first["runs"]] == ids[:1:-1]
+
+    # a run submitted between pages shows up on the first page, not in the next one
+    write_run_db("list-ties-new", "queued", {}, user_key="list-ties")
+    rest = list_runs(2, first["next_cursor"], user="list-ties")
+    assert [r["run_id"] for r in rest["runs"]] == ids[1::-1]
+    assert rest["next_cursor"] is None
+
+
+def test_filters_and_fields():
+    done, queued = _runs("list-filters", 2)
+    update_run_state(done, "completed", {"best_model": "lgbm", "dataset_source": "kaggle", "metrics": {"f1": 0.8}})
+
+    page = list_runs(10, None, ["best_model", "metrics", "pinned", "user", "bogus"], user="list-filters", status="completed")
+    assert page["runs"] == [{
+        "run_id": done, "created_at": page["runs"][0]["created_at"], "status": "completed",
+        "best_model": "lgbm", "metrics": {"f1": 0.8}, "pinned": False, "user": "list-filters",
+    }]
+    assert [r["run_id"] for r in list_runs(10, user="list-filters", status="queued")["runs"]] == [queued]
+    assert list_runs(10, user="list-filters", best_model="rf")["runs"] == []
+
+
+def test_endpoint():
+    ids = _runs("list-http", 3)
+    body = client.get("/runs", params={"user": "list-http", "limit": 2, "fields": "user,priority"}).json()
+    assert [r["run_id"] for r in body["runs"]] == ids[:0:-1]
+    assert body["runs"][0]["user"] == "list-http" and body["runs"][0]["priority"] == 1
+
+    rest = client.get("/runs", params={"user": "list-http", "cursor": body["next_cursor"]}).json()
+    assert [r["run_id"] for r in rest["runs"]] == ids[:1]
+
+    assert client.get("/runs", params={"fields": "state_json"}).status_code == 400
+    assert client.get("/runs", params={"cursor": "not-a-cursor"}).status_code == 400
+    assert client.get("/runs", params={"limit": 0}).status_code == 422
@@ -0,0 +1,45 @@
+import app.main as main
+from app.run_store import claim_run, read_run, write_run_db
+
+
+def _stub_agents(monkeypatch, calls):
+    def parse_problem(run_id, text, preferences):
+        calls["ps"] = dict(preferences)
+        return {"raw_text": text}
+
+    monkeypatch.setattr(main, "parse_problem_or_generate", parse_problem)
+    monkeypatch.setattr(main, "plan_dataset_search", lambda run_id, ps, user: ["query"])
+    monkeypatch.setattr(main, "get_or_find_dataset", lambda run_id, ps, user, queries: {"dataset_path": "data.csv", "source": "test"})
+    monkeypatch.setattr(main, "suggest_model_plan", lambda run_id, ps, path: {"models": ["lgbm"]})
+    monkeypatch.setattr(main, "preprocess_dataset", lambda run_id, path, ps: {
+        "train_path": "train.npz", "test_path": "test.npz", "transformer_path": "t.joblib",
+    })
+
+    def run_automl(run_id, train_path, ps, preferences, llm_plan=None, n_jobs=None):
+        calls["automl"] = {"preferences": dict(preferences), "n_jobs": n_jobs, "llm_plan": llm_plan}
+        return {"model_path": "model.joblib", "task_type": "classification"}
+
+    monkeypatch.setattr(main, "run_automl", run_automl)
+    monkeypatch.setattr(main, "evaluate_model", lambda run_id, test, model, transformer, ps: {"metrics": {"accuracy": 1.0}})
+
+
+def test_core_budget_reaches_automl_without_touching_preferences(monkeypatch):
+    calls = {}
+    _stub_agents(monkeypatch, calls)
+    run_id = "test-pipeline-cores"
+    preferences = {"metric": "f1"}
+    payload = {"problem_statement": "predict churn", "preferences": preferences, "hint": "use recall"}
+    write_run_db(run_id, "queued", payload)
+    assert claim_run(run_id, main.WORKER_ID, 60)
+
+    assert main.orchestrate_run(run_id, payload, cores=3) is None
+
+    run = read_run(run_id)
+    assert run["status"] == "completed", run.get("last_error")
+    assert calls["automl"]["n_jobs"] == 3
+    assert calls["automl"]["llm_plan"] == {"models": ["lgbm"]}
+    # the core budget is not part of what the LLM agents (and their cache keys) see
+    assert calls["ps"] == {"metric": "f1", "hint": "use recall"}
+    assert calls["automl"]["preferences"] == {"metric": "f1", "hint": "use recall"}
+    # and the submitted request is left as it was
+    assert preferences == {"metric": "f1"}
@@ -0,0 +1,47 @@
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.run_store import get_conn, read_run, write_run_db
+from app.scheduler import FairShareQueue
+
+client = TestClient(main.app)
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    q = FairShareQueue()
+    monkeypatch.setattr(main, "run_queue", q)
+    return q
+
+
+def test_accepted_run_is_signalled_to_the_worker(queue):
+    res = client.post("/run", json={
+        "run_id": "queue-kickoff", "user": {"id": "u1"}, "problem_statement": "churn",
+        "preferences": {"priority": "high"},
+    })
+    assert res.status_code == 200
+    assert res.json()["queue"]["position"] == 1
+    assert read_run("queue-kickoff")["status"] == "queued"
+
+    entry = queue.get(timeout=1)
+    assert (entry["run_id"], entry["priority"], entry["user_key"]) == ("queue-kickoff", 0, "u1")
+
+
+def test_queued_runs_are_recovered_from_the_db(queue):
+    write_run_db("queue-recover", "queued", {}, priority=2, user_key="u2")
+    write_run_db("queue-backoff", "queued", {})
+    retry_at = time.time() + 60
+    get_conn().execute("UPDATE runs SET not_before=? WHERE run_id='queue-backoff'", (retry_at,))
+
+    assert main.recover_queued_runs() >= 2
+    recovered = queue.position("queue-recover")
+    assert (recovered["priority"], recovered["user_key"]) == (2, "u2")
+    # a run backing off is queued, but not handed out before its time
+    assert queue.position("queue-backoff")["not_before"] == retry_at
+    handed_out = []
+    while (entry := queue.get(timeout=0.05)) is not None:
+        handed_out.append(entry["run_id"])
+    assert "queue-recover" in handed_out and "queue-backoff" not in handed_out
@@ -0,0 +1,43 @@
+import json
+
+from app.run_store import get_conn, read_run, read_run_events, read_run_version, update_run_state, write_run_db
+
+
+def test_patches_merge_over_the_base_document():
+    write_run_db("state-merge", "queued", {"phase": "queued", "prep": {"train": "a.npz"}})
+    assert update_run_state("state-merge", "running", {"phase": "training", "prep": {"test": "b.npz"}}) == 1
+    assert update_run_state("state-merge", "running", {"timings": {"prep_agent": {"seconds": 1.5}}}) == 2
+
+    run = read_run("state-merge")
+    assert run["state_version"] == 2
+    assert run["state"] == {
+        "phase": "training",
+        "prep": {"train": "a.npz", "test": "b.npz"},
+        "timings": {"prep_agent": {"seconds": 1.5}},
+    }
+    assert [(e["seq"], e["patch"].get("phase")) for e in read_run_events("state-merge")] == [(1, "training"), (2, None)]
+    assert read_run_version("state-merge") == ("running", 2)
+    # writes only append: the base document is untouched until the run finishes
+    state_json, = get_conn().execute("SELECT state_json FROM runs WHERE run_id='state-merge'").fetchone()
+    assert json.loads(state_json) == {"phase": "queued", "prep": {"train": "a.npz"}}
+
+
+def test_finished_run_is_folded_into_its_base_document():
+    write_run_db("state-fold", "running", {"phase": "training"})
+    update_run_state("state-fold", "running", {"dataset_source": "kaggle"})
+    update_run_state("state-fold", "completed", {"best_model": "lgbm", "metrics": {"f1": 0.9}})
+
+    state_json, state_seq, best_model, source, metrics = get_conn().execute(
+        "SELECT state_json, state_seq, best_model, dataset_source, metrics_json FROM runs WHERE run_id='state-fold'"
+    ).fetchone()
+    assert state_seq == 2
+    assert json.loads(state_json) == {"phase": "training", "dataset_source": "kaggle", "best_model": "lgbm", "metrics": {"f1": 0.9}}
+    assert (best_model, source, json.loads(metrics)) == ("lgbm", "kaggle", {"f1": 0.9})
+    assert read_run("state-fold")["state"] == json.loads(state_json)
+    # the timeline is kept
+    assert len(read_run_events("state-fold")) == 2
+
+
+def test_update_of_unknown_run():
+    assert update_run_state("state-missing", "running", {"phase": "x"}) == 0
+    assert read_run("state-missing") is None
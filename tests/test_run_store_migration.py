@@ -0,0 +1,63 @@
+import json
+import sqlite3
+
+from app import run_store
+
+
+def _baseline_db(path, runs):
+    """A database as the first release created it: runs with five columns and nothing else."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        """CREATE TABLE runs (
+            run_id TEXT PRIMARY KEY,
+            created_at REAL,
+            status TEXT,
+            last_error TEXT,
+            state_json TEXT
+        )"""
+    )
+    conn.executemany("INSERT INTO runs VALUES (?,?,?,?,?)", runs)
+    conn.commit()
+    conn.close()
+
+
+def test_init_db_migrates_baseline_schema(tmp_path):
+    path = str(tmp_path / "baseline.db")
+    _baseline_db(path, [
+        ("done", 100.0, "completed", "", json.dumps({"best_model": "lgbm", "dataset_source": "kaggle", "metrics": {"f1": 0.9}})),
+        ("broken", 200.0, "failed", "boom", json.dumps({})),
+        ("busy", 300.0, "running", "", json.dumps({"best_model": "rf"})),
+    ])
+
+    run_store.init_db(path)
+
+    conn = run_store.get_conn(path)
+    rows = {
+        r[0]: r[1:]
+        for r in conn.execute("SELECT run_id, finished_at, best_model, dataset_source, metrics_json FROM runs")
+    }
+    assert rows["done"][:3] == (100.0, "lgbm", "kaggle")
+    assert json.loads(rows["done"][3]) == {"f1": 0.9}
+    assert rows["broken"][0] == 200.0
+    # runs in flight get their summary when they finish
+    assert rows["busy"] == (None, None, None, None)
+    assert conn.execute("SELECT value FROM meta WHERE key='schema_version'").fetchone() == (str(run_store.SCHEMA_VERSION),)
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    assert {"run_events", "artifacts", "meta", "event_index"} <= tables
+
+
+def test_init_db_heals_half_migrated_db(tmp_path):
+    # columns added by an earlier, interrupted start, but never backfilled
+    path = str(tmp_path / "half.db")
+    _baseline_db(path, [("done", 100.0, "completed", "", json.dumps({"best_model": "lgbm"}))])
+    conn = sqlite3.connect(path)
+    for col, decl in run_store._RUN_COLUMNS:
+        conn.execute(f"ALTER TABLE runs ADD COLUMN {col} {decl}")
+    conn.commit()
+    conn.close()
+
+    run_store.init_db(path)
+    run_store.init_db(path)
+
+    row = run_store.get_conn(path).execute("SELECT finished_at, best_model FROM runs").fetchone()
+    assert row == (100.0, "lgbm")
@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from app.run_store import close_all, get_conn, init_db, read_run, transaction, write_run_db
+
+
+def test_one_wal_connection_per_thread(tmp_path):
+    path = str(tmp_path / "pool.db")
+    init_db(path)
+    conn = get_conn(path)
+    assert get_conn(path) is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(get_conn(path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_close_all_reopens_on_next_use(tmp_path):
+    path = str(tmp_path / "reopen.db")
+    init_db(path)
+    before = get_conn(path)
+    close_all()
+    after = get_conn(path)
+    assert after is not before
+    assert after.execute("SELECT COUNT(*) FROM runs").fetchone()[0] == 0
+
+
+def test_transaction_rolls_back_on_error():
+    write_run_db("pool-rollback", "queued", {"step": 1})
+    with pytest.raises(RuntimeError):
+        with transaction() as conn:
+            conn.execute("UPDATE runs SET status='running' WHERE run_id='pool-rollback'")
+            raise RuntimeError("boom")
+    assert read_run("pool-rollback")["status"] == "queued"
+    assert not get_conn().in_transaction
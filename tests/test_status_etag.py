@@ -0,0 +1,61 @@
+import re
+import time
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app import run_store
+from app.run_store import update_run_state, write_run_db
+from app.scheduler import FairShareQueue
+from app.storage import get_artifact_store, save_artifact
+
+# RFC 9110 entity-tag: optional W/ and a quoted string of %x21 / %x23-7E
+ENTITY_TAG = re.compile(r'^(W/)?"[\x21\x23-\x7e]*"$')
+
+client = TestClient(main.app)
+
+
+def test_queued_run_gets_304_while_its_place_is_unchanged(monkeypatch):
+    queue = FairShareQueue()
+    monkeypatch.setattr(main, "run_queue", queue)
+    write_run_db("etag-ahead", "queued", {})
+    write_run_db("etag-queued", "queued", {})
+    queue.put("etag-ahead", 1, "alice", time.time() - 10)
+    # the wait estimate counts down to not_before, so it differs between calls
+    queue.put("etag-queued", 1, "bob", time.time(), not_before=time.time() + 100)
+
+    first = client.get("/status/etag-queued")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert ENTITY_TAG.match(etag), etag
+    assert first.json()["queue"]["position"] == 2
+
+    time.sleep(0.2)
+    again = client.get("/status/etag-queued", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+
+    # moving up the queue is a change
+    assert queue.get(timeout=1)["run_id"] == "etag-ahead"
+    moved = client.get("/status/etag-queued", headers={"If-None-Match": etag})
+    assert moved.status_code == 200
+    assert moved.json()["queue"]["position"] == 1
+    assert moved.headers["etag"] != etag
+
+
+def test_finished_run_drops_artifacts_deleted_by_retention(monkeypatch):
+    run_id = "etag-retention"
+    write_run_db(run_id, "running", {})
+    save_artifact(run_id, "notes.txt", "hello")
+    update_run_state(run_id, "completed", {"phase": "completed"})
+
+    first = client.get(f"/status/{run_id}")
+    assert first.json()["artifacts"] == [f"{run_id}_notes.txt"]
+    assert client.get(f"/status/{run_id}").json()["artifacts"] == [f"{run_id}_notes.txt"]
+
+    # deleted by a retention pass in another process: no in-process notification
+    monkeypatch.setattr(run_store, "notify", lambda *a, **kw: None)
+    get_artifact_store().delete_run(run_id, [f"{run_id}_notes.txt"])
+
+    after = client.get(f"/status/{run_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert after.status_code == 200
+    assert after.json()["artifacts"] == []